@@ -1,105 +1,190 @@
-from flask import Flask, request, jsonify, render_template
-import nltk
-from sklearn.feature_extraction.text import TfidfVectorizer
-import joblib
-from nltk.tokenize import word_tokenize
-from nltk.corpus import stopwords
-from nltk.stem import WordNetLemmatizer
-from nltk.tag import pos_tag
-import string
+import time
+_import_started = time.perf_counter()
+
+from flask import Flask, Response, g, request, jsonify, render_template
+import atexit
+import logging
+import os
+import threading
+from datetime import datetime
 import numpy as np
+import requests
+import config
+import metrics
+from cache import create_cache, model_version_from_files
+from compact_model import COMPACT_DIR, MANIFEST_FILE
 from database import Database
-from models.lstm_model import LSTMModel
+from inference import score_batch
+from lstm_serving import LABELS as LSTM_LABELS, NUMPY_DIR, MANIFEST_FILE as LSTM_MANIFEST_FILE, lstm_paths
+from micro_batch import MicroBatcher
+from model_registry import create_registry
+from near_duplicates import IndexSync, create_index
+from review_fetcher import FetchError, create_fetcher
+from write_behind import WriteBehindQueue
+
+# Leveled logging instead of unconditional prints; the per-call lines on the request path are
+# DEBUG, so the default INFO level keeps them off the hot path
+logging.basicConfig(level=config.LOG_LEVEL, format='%(asctime)s %(levelname)s [%(process)d] %(name)s: %(message)s')
+logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
-db = Database()
+
+# Upper bound on reviews accepted by a single batch /analyze call
+MAX_BATCH_REVIEWS = 1000
 
 # --- Load TF-IDF Vectorizer and Models ---
-vectorizer = None
-svm_model = None
-lr_model = None
-lstm_model = None
-
-try:
-    vectorizer = joblib.load('models/tfidf_vectorizer.pkl')
-    print("TF-IDF Vectorizer lo-aded successfully.")
-except FileNotFoundError:
-    print("Warning: 'models/tfidf_vectorizer.pkl' not found. TF-IDF will be non-functional or mock.")
-except Exception as e:
-    print(f"Error loading TF-IDF vectorizer: {e}")
-
-try:
-    svm_model = joblib.load('models/svm_model.pkl')
-    print("SVM model loaded successfully.")
-except FileNotFoundError:
-    print("Warning: 'models/svm_model.pkl' not found. SVM predictions will be unavailable.")
-except Exception as e:
-    print(f"Error loading SVM model: {e}")
-
-try:
-    lr_model = joblib.load('models/logistic_regression_model.pkl')
-    print("Logistic Regression model loaded successfully.")
-except FileNotFoundError:
-    print("Warning: 'models/logistic_regression_model.pkl' not found. Logistic Regression predictions will be unavailable.")
-except Exception as e:
-    print(f"Error loading Logistic Regression model: {e}")
-
-try:
-    lstm_model = LSTMModel.load('models/lstm_model', 'models/lstm_tokenizer.json')
-    print("LSTM model loaded successfully.")
-except FileNotFoundError:
-    print("Warning: LSTM model files not found. LSTM predictions will be unavailable.")
-except Exception as e:
-    print(f"Error loading LSTM model: {e}")
-
-lemmatizer = WordNetLemmatizer()
-stop_words_english = set(stopwords.words('english'))
-
-def get_wordnet_pos(treebank_tag):
-    if treebank_tag.startswith('J'):
-        return nltk.corpus.wordnet.ADJ
-    elif treebank_tag.startswith('V'):
-        return nltk.corpus.wordnet.VERB
-    elif treebank_tag.startswith('N'):
-        return nltk.corpus.wordnet.NOUN
-    elif treebank_tag.startswith('R'):
-        return nltk.corpus.wordnet.ADV
-    else:
-        return nltk.corpus.wordnet.NOUN
+# All artifacts load in parallel through the registry. Under gunicorn with preload_app this
+# runs once in the master and the forked workers share the loaded models copy-on-write.
+# With FAST_START each process loads them in the background instead and /readyz reports
+# when they are in.
+models = create_registry(config)
+if not config.FAST_START:
+    models.load_all()
+
+# Versions the inference cache, so retraining invalidates it
+MODEL_FILES = [
+    os.path.join(config.MODEL_DIR, name)
+    for name in ('tfidf_vectorizer.pkl', 'svm_model.pkl', 'logistic_regression_model.pkl',
+                 os.path.join(COMPACT_DIR, MANIFEST_FILE))
+]
+if config.LSTM_IN_ENSEMBLE:
+    MODEL_FILES += lstm_paths(config.MODEL_DIR) + [os.path.join(config.MODEL_DIR, NUMPY_DIR, LSTM_MANIFEST_FILE)]
+
+# --- Per-process resources ---
+# Database connections, the write-behind thread and the shared cache's SQLite handle must
+# not cross a fork, so every worker creates its own on first use (or from gunicorn's post_fork)
+db = None
+analysis_writer = None
+inference_cache = None
+duplicate_sync = None
+micro_batcher = None
+review_fetcher = None
+_worker_pid = None
+_worker_lock = threading.Lock()
+
+def init_worker():
+    global db, analysis_writer, inference_cache, duplicate_sync, micro_batcher, review_fetcher, _worker_pid
+    with _worker_lock:
+        if _worker_pid == os.getpid():
+            return
+
+        db = Database()
+
+        # Responses no longer wait on the database; a background thread writes records in batches
+        analysis_writer = None
+        if config.WRITE_BEHIND_ENABLED:
+            analysis_writer = WriteBehindQueue(
+                db.save_analyses,
+                config.WRITE_BEHIND_MAX_QUEUE,
+                config.WRITE_BEHIND_BATCH_SIZE,
+                config.WRITE_BEHIND_FLUSH_INTERVAL,
+                config.WRITE_BEHIND_PUT_TIMEOUT
+            )
+            atexit.register(analysis_writer.close, config.WRITE_BEHIND_SHUTDOWN_TIMEOUT)
+
+        # Keyed on the normalized review text plus the model version
+        inference_cache = None
+        if config.CACHE_ENABLED:
+            inference_cache = create_cache(config, config.MODEL_VERSION or model_version_from_files(MODEL_FILES))
+
+        # Built from the reviews table in the background; until the first pass finishes,
+        # cluster sizes only count the reviews indexed so far
+        duplicate_sync = None
+        if config.NEAR_DUP_ENABLED:
+            duplicate_sync = IndexSync(
+                create_index(config), db, config.NEAR_DUP_SYNC_INTERVAL, config.NEAR_DUP_SYNC_BATCH
+            )
+            atexit.register(duplicate_sync.close, 1)
+
+        # With several request threads per worker (GUNICORN_THREADS), concurrent requests
+        # share one batched model call instead of each scoring a single review
+        micro_batcher = None
+        if config.MICRO_BATCH_ENABLED:
+            micro_batcher = MicroBatcher(
+                score_texts,
+                config.MICRO_BATCH_MAX_SIZE,
+                config.MICRO_BATCH_MAX_WAIT_MS / 1000,
+                config.MICRO_BATCH_MAX_QUEUE,
+                config.MICRO_BATCH_TIMEOUT
+            )
+            atexit.register(micro_batcher.close, config.MICRO_BATCH_TIMEOUT)
+
+        # Its keep-alive connections and fetch threads belong to this process
+        review_fetcher = None
+        if config.FETCH_ENABLED:
+            review_fetcher = create_fetcher(config)
+            atexit.register(review_fetcher.close)
+
+        _worker_pid = os.getpid()
+        register_gauges()
+
+    models.load_in_background()
+
+def register_gauges():
+    # Bound to this process's resources, so re-registered by each worker
+    metrics.REGISTRY.gauge('models_ready', 'Whether every required model artifact is loaded',
+                           lambda: int(models.ready))
+    if analysis_writer is not None:
+        metrics.REGISTRY.gauge('write_behind_queued', 'Analysis records waiting for the write-behind thread',
+                               lambda: analysis_writer.stats()['queued'])
+    metrics.REGISTRY.gauge('db_pool_in_use', 'Database connections checked out of the pool',
+                           lambda: (lambda stats: stats['open'] - stats['idle'])(db.pool.stats()))
+    if micro_batcher is not None:
+        metrics.REGISTRY.gauge('micro_batch_queued', 'Requests waiting for the micro-batcher',
+                               lambda: micro_batcher.stats()['queued'])
+    if duplicate_sync is not None:
+        metrics.REGISTRY.gauge('near_duplicate_index_reviews', 'Reviews in the near-duplicate index',
+                               lambda: len(duplicate_sync.index))
+
+@app.before_request
+def ensure_worker_initialized():
+    g.request_started = time.perf_counter()
+    init_worker()
+
+@app.after_request
+def record_request(response):
+    # Labelled by route pattern rather than path, so the series stay bounded
+    endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+    metrics.REQUESTS.inc(endpoint, str(response.status_code))
+    started = g.get('request_started')
+    if started is not None:
+        metrics.REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint)
+    return response
 
 def preprocess_text(text):
     if not isinstance(text, str):
-        print(f"Warning: preprocess_text received non-string input: {type(text)}. Returning empty string.")
+        logger.warning("preprocess_text received non-string input: %s. Returning empty string.", type(text))
         return ""
-        
-    text = text.lower()
-    text = text.translate(str.maketrans('', '', string.punctuation))
-    tokens = word_tokenize(text)
-    pos_tags = pos_tag(tokens)
-    
-    lemmatized_tokens = []
-    for word, tag in pos_tags:
-        if word.isalpha() and word not in stop_words_english:
-            wordnet_tag = get_wordnet_pos(tag)
-            lemma = lemmatizer.lemmatize(word, pos=wordnet_tag)
-            lemmatized_tokens.append(lemma)
-            
-    processed_text = " ".join(lemmatized_tokens)
-    print(f"Original: {text[:100]}... | Processed: {processed_text[:100]}...")
-    return processed_text
+    # NLTK is only imported by the code paths that preprocess
+    from preprocessing import get_preprocessor
+    return get_preprocessor().preprocess(text)
+
+def preprocess_texts(texts):
+    # Batched variant: one POS tagging pass over the whole list of documents
+    from preprocessing import get_preprocessor
+    return get_preprocessor().preprocess_many(texts)
 
 def apply_tf_idf(texts):
+    vectorizer = models.get('vectorizer')
     if vectorizer:
-        print("Applying loaded TF-IDF vectorizer...")
+        logger.debug("Applying loaded TF-IDF vectorizer...")
         if isinstance(texts, str):
             texts = [texts]
         return vectorizer.transform(texts)
     else:
-        print("TF-IDF vectorizer not loaded. Using mock TF-IDF.")
+        logger.warning("TF-IDF vectorizer not loaded. Using mock TF-IDF.")
+        metrics.FALLBACKS.inc('vectorizer')
         return [[0.1, 0.5, 0.3] for _ in texts]
 
+def row_count(features):
+    # Sparse matrices have no len(); None (nothing vectorized) has no rows
+    if features is None:
+        return 0
+    return features.shape[0] if hasattr(features, 'shape') else len(features)
+
 def predict_svm(features):
-    print("Attempting SVM prediction...")
+    logger.debug("Attempting SVM prediction...")
+    svm_model = models.get('svm')
     if svm_model and features is not None:
         try:
             pred = svm_model.predict(features)
@@ -107,13 +192,16 @@ def predict_svm(features):
             confidence = np.max(proba, axis=1)
             return pred, confidence
         except Exception as e:
-            print(f"Error during SVM prediction: {e}")
-            return ["SVM_ERROR" for _ in range(len(features))], [0.0 for _ in range(len(features))]
-    print("SVM model not loaded or no features. Returning unavailable.")
-    return ["SVM_UNAVAILABLE" for _ in range(len(features))], [0.0 for _ in range(len(features))]
+            logger.error("Error during SVM prediction: %s", e)
+            metrics.ERRORS.inc('svm')
+            return ["SVM_ERROR"] * row_count(features), [0.0] * row_count(features)
+    logger.warning("SVM model not loaded or no features. Returning unavailable.")
+    metrics.FALLBACKS.inc('svm')
+    return ["SVM_UNAVAILABLE"] * row_count(features), [0.0] * row_count(features)
 
 def predict_logistic_regression(features):
-    print("Attempting Logistic Regression prediction...")
+    logger.debug("Attempting Logistic Regression prediction...")
+    lr_model = models.get('lr')
     if lr_model and features is not None:
         try:
             pred = lr_model.predict(features)
@@ -121,26 +209,63 @@ def predict_logistic_regression(features):
             confidence = np.max(proba, axis=1)
             return pred, confidence
         except Exception as e:
-            print(f"Error during LR prediction: {e}")
-            return ["LR_ERROR" for _ in range(len(features))], [0.0 for _ in range(len(features))]
-    print("LR model not loaded or no features. Returning unavailable.")
-    return ["LR_UNAVAILABLE" for _ in range(len(features))], [0.0 for _ in range(len(features))]
+            logger.error("Error during LR prediction: %s", e)
+            metrics.ERRORS.inc('lr')
+            return ["LR_ERROR"] * row_count(features), [0.0] * row_count(features)
+    logger.warning("LR model not loaded or no features. Returning unavailable.")
+    metrics.FALLBACKS.inc('lr')
+    return ["LR_UNAVAILABLE"] * row_count(features), [0.0] * row_count(features)
 
 def predict_lstm(text):
-    print("Attempting LSTM prediction...")
+    logger.debug("Attempting LSTM prediction...")
+    lstm_model = models.get('lstm')
     if lstm_model:
         try:
             classes, confidence = lstm_model.predict([text])
             # Convert numeric predictions back to labels
-            label_mapping = {0: 'negative', 1: 'neutral', 2: 'positive'}
-            predictions = [label_mapping[cls] for cls in classes]
+            predictions = [LSTM_LABELS[int(cls)] for cls in classes]
             return predictions, confidence
         except Exception as e:
-            print(f"Error during LSTM prediction: {e}")
+            logger.error("Error during LSTM prediction: %s", e)
+            metrics.ERRORS.inc('lstm')
             return ["LSTM_ERROR"], [0.0]
-    print("LSTM model not loaded. Returning unavailable.")
+    logger.warning("LSTM model not loaded. Returning unavailable.")
+    metrics.FALLBACKS.inc('lstm')
     return ["LSTM_UNAVAILABLE"], [0.0]
 
+def score_texts(texts):
+    vectorizer, svm_model, lr_model = models.get('vectorizer'), models.get('svm'), models.get('lr')
+    # None when the fused scorer is disabled, was not exported or is stale
+    scorer = models.get('ensemble')
+    lstm = models.get('lstm') if config.LSTM_IN_ENSEMBLE else None
+    return score_batch(texts, vectorizer, svm_model, lr_model, scorer, lstm)
+
+def classify_reviews(texts):
+    score = micro_batcher.score if micro_batcher is not None else score_texts
+    if inference_cache is None:
+        return score(texts)
+
+    with metrics.span('cache_lookup'):
+        keys = [inference_cache.key(text) for text in texts]
+        results = [inference_cache.get(key) for key in keys]
+
+    # Only texts missing from the cache reach the models, each distinct text once
+    pending = {}
+    for i, result in enumerate(results):
+        if result is None:
+            pending.setdefault(keys[i], []).append(i)
+    misses = sum(len(indices) for indices in pending.values())
+    metrics.CACHE_LOOKUPS.inc('hit', amount=len(texts) - misses)
+    metrics.CACHE_LOOKUPS.inc('miss', amount=misses)
+    if pending:
+        positions = list(pending.values())
+        scored = score([texts[p[0]] for p in positions])
+        for key, indices, result in zip(pending.keys(), positions, scored):
+            inference_cache.set(key, result)
+            for i in indices:
+                results[i] = result
+    return [dict(result) for result in results]
+
 @app.route('/')
 def home():
     return render_template('wlc.html', title='Welcome')
@@ -155,62 +280,184 @@ def result():
 
 @app.route('/analyze', methods=['POST'])
 def analyze_reviews():
+    if not models.ready:
+        error = 'Models are still loading' if not models.loaded else 'Models unavailable'
+        return jsonify({'error': error}), 503
     try:
-        data = request.get_json()
-        url = data.get('url', '')
+        with metrics.span('parse'):
+            data = request.get_json()
+            url = data.get('url', '')
+            reviews = data.get('reviews')
+
+        if reviews is not None:
+            return analyze_batch(url, reviews)
+
         review_text = data.get('review_text', '')
-        
+        if not review_text and url and review_fetcher is not None:
+            return analyze_url(url)
+
         # Use either URL or review text
         text_to_analyze = review_text if review_text else url
         
         if not text_to_analyze:
             return jsonify({'error': 'No text to analyze'}), 400
-            
-        # Vectorize the text
-        text_vector = vectorizer.transform([text_to_analyze])
-        
-        # Get predictions
-        svm_pred = 'Real' if svm_model.predict(text_vector)[0] == 1 else 'Fake'
-        lr_pred = 'Real' if lr_model.predict(text_vector)[0] == 1 else 'Fake'
-        
-        # Calculate final prediction
-        predictions = [svm_pred, lr_pred]
-        final_pred = 'Real' if predictions.count('Real') >= len(predictions)/2 else 'Fake'
-        
-        # Calculate confidence
-        svm_prob = svm_model.predict_proba(text_vector)[0]
-        lr_prob = lr_model.predict_proba(text_vector)[0]
-        
-        confidence = np.mean([
-            svm_prob.max() * 100,
-            lr_prob.max() * 100
-        ])
-        
-        # Save to database
-        db.save_analysis(
-            review_text=text_to_analyze,
-            url=url,
-            svm_pred=svm_pred,
-            lr_pred=lr_pred,
-            final_pred=final_pred,
-            accuracy=confidence
-        )
 
-        return jsonify({
-            'prediction': final_pred,
-            'accuracy': confidence,
-            'svm_prediction': svm_pred,
-            'lr_prediction': lr_pred
-        })
+        result = classify_reviews([text_to_analyze])[0]
+        add_duplicate_signal([text_to_analyze], [result])
+        save_result(text_to_analyze, url, result)
+
+        return jsonify(result)
         
     except Exception as e:
-        print('Error:', str(e))
+        logger.exception("Error analyzing reviews")
+        metrics.ERRORS.inc('analyze')
         return jsonify({'error': str(e)}), 500
 
+def analyze_batch(url, reviews):
+    if not isinstance(reviews, list) or not all(isinstance(r, str) for r in reviews):
+        return jsonify({'error': "'reviews' must be a list of strings"}), 400
+    if not reviews:
+        return jsonify({'error': 'No text to analyze'}), 400
+    if len(reviews) > MAX_BATCH_REVIEWS:
+        return jsonify({'error': f'Too many reviews in one request (max {MAX_BATCH_REVIEWS})'}), 413
+
+    # Vectorize and score every review in one pass; results keep the input order
+    results = classify_reviews(reviews)
+    add_duplicate_signal(reviews, results)
+    for review_text, result in zip(reviews, results):
+        save_result(review_text, url, result)
+
+    return jsonify({'results': results, 'count': len(results)})
+
+def analyze_url(url):
+    # Scores the reviews on the product's review pages as one batch
+    try:
+        with metrics.span('fetch'):
+            reviews = review_fetcher.fetch_reviews(url)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except (requests.RequestException, FetchError) as e:
+        logger.warning("Fetching reviews from %s failed: %s", url, e)
+        metrics.ERRORS.inc('fetch')
+        return jsonify({'error': f'Could not fetch reviews: {e}'}), 502
+    if not reviews:
+        return jsonify({'error': 'No reviews found at this url'}), 422
+    return analyze_batch(url, reviews[:MAX_BATCH_REVIEWS])
+
+def add_duplicate_signal(texts, results):
+    # Not part of the cached result: the count grows as matching reviews are stored
+    if duplicate_sync is None:
+        return
+    with metrics.span('near_duplicates'):
+        for text, result in zip(texts, results):
+            result['duplicate_cluster_size'] = duplicate_sync.index.cluster_size(text)
+
+def save_result(review_text, url, result):
+    record = {
+        'review_text': review_text,
+        'url': url,
+        'svm_pred': result['svm_prediction'],
+        'lr_pred': result['lr_prediction'],
+        'final_pred': result['prediction'],
+        'accuracy': result['accuracy']
+    }
+    # Falls back to a direct write when write-behind is off or its queue stays full
+    with metrics.span('db_write'):
+        if analysis_writer is None or not analysis_writer.submit(record):
+            db.save_analyses([record])
+
 @app.route('/history')
 def get_history():
-    history = db.get_analysis_history()
-    return jsonify(history)
+    args = request.args
+    try:
+        limit = int(args.get('limit', 10))
+        if not 1 <= limit <= config.HISTORY_MAX_LIMIT:
+            raise ValueError(f"limit must be between 1 and {config.HISTORY_MAX_LIMIT}")
+        fields = args.get('fields')
+        rows, next_cursor = db.get_analysis_history_page(
+            limit=limit,
+            cursor=args.get('cursor'),
+            prediction=args.get('prediction'),
+            url=args.get('url'),
+            platform=args.get('platform'),
+            since=parse_datetime_arg(args.get('since')),
+            until=parse_datetime_arg(args.get('until')),
+            fields=fields.split(',') if fields else None
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'items': rows, 'next_cursor': next_cursor})
+
+@app.route('/product')
+def get_product():
+    url = request.args.get('url')
+    if not url:
+        return jsonify({'error': "'url' is required"}), 400
+    stats = db.get_product_stats(url)
+    if stats is None:
+        return jsonify({'error': 'Unknown product'}), 404
+    return jsonify(stats)
+
+def parse_datetime_arg(value):
+    if value is None:
+        return None
+    return datetime.fromisoformat(value)
+
+@app.route('/healthz')
+def healthz():
+    # Liveness: the process is up and serving, models or not
+    return jsonify({'status': 'ok'})
+
+@app.route('/readyz')
+def readyz():
+    # Readiness: every required model artifact is loaded
+    body = {
+        'ready': models.ready,
+        'import_seconds': IMPORT_SECONDS,
+        'models': models.timings()
+    }
+    return jsonify(body), 200 if models.ready else 503
+
+@app.route('/cache/stats')
+def get_cache_stats():
+    if inference_cache is None:
+        return jsonify({'enabled': False})
+    return jsonify(dict(inference_cache.stats(), enabled=True))
+
+@app.route('/batch/stats')
+def get_batch_stats():
+    if micro_batcher is None:
+        return jsonify({'enabled': False})
+    return jsonify(dict(micro_batcher.stats(), enabled=True))
+
+@app.route('/db/stats')
+def get_db_stats():
+    stats = {'pool': db.pool_stats()}
+    if analysis_writer is not None:
+        stats['write_behind'] = analysis_writer.stats()
+    return jsonify(stats)
+
+@app.route('/duplicates/stats')
+def get_duplicate_stats():
+    if duplicate_sync is None:
+        return jsonify({'enabled': False})
+    return jsonify(dict(duplicate_sync.stats(), enabled=True))
+
+@app.route('/fetch/stats')
+def get_fetch_stats():
+    if review_fetcher is None:
+        return jsonify({'enabled': False})
+    return jsonify(dict(review_fetcher.stats(), enabled=True))
+
+@app.route('/metrics')
+def get_metrics():
+    if not config.METRICS_ENABLED:
+        return jsonify({'error': 'Metrics are disabled'}), 404
+    return Response(metrics.REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+IMPORT_SECONDS = time.perf_counter() - _import_started
+logger.info("App module imported in %.3fs", IMPORT_SECONDS)
 
 if __name__ == '__main__':
+    init_worker()
     app.run(debug=True, port=5000) 
\ No newline at end of file
@@ -0,0 +1,256 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager, redirect_stdout
+
+import numpy as np
+import pandas as pd
+
+# Microbenchmarks for the request path (preprocessing, TF-IDF, both classifiers, the database
+# write) and an end-to-end load run against /analyze through Flask's test client. Every run
+# writes one JSON file; --compare reports the change against an earlier one.
+RESULTS_DIR = 'benchmark_results'
+# Latency stats compared by --compare; lower is better for all of them
+COMPARED_STATS = ('p50_ms', 'p99_ms')
+
+
+def summarize(timings, items_per_call):
+    timings = np.asarray(timings) * 1000
+    seconds = timings.sum() / 1000
+    return {
+        'calls': len(timings),
+        'items_per_call': items_per_call,
+        'mean_ms': float(timings.mean()),
+        'p50_ms': float(np.percentile(timings, 50)),
+        'p95_ms': float(np.percentile(timings, 95)),
+        'p99_ms': float(np.percentile(timings, 99)),
+        'max_ms': float(timings.max()),
+        'items_per_second': len(timings) * items_per_call / seconds if seconds else None
+    }
+
+
+@contextmanager
+def quiet():
+    # The app prints on every call; terminal output would dominate the timings
+    with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+        yield
+
+
+def measure(fn, calls, warmup, items_per_call=1):
+    # fn gets the call number, so each call can take a different input
+    with quiet():
+        for i in range(warmup):
+            fn(i)
+        timings = []
+        for i in range(calls):
+            started = time.perf_counter()
+            fn(i)
+            timings.append(time.perf_counter() - started)
+    return summarize(timings, items_per_call)
+
+
+def load_run(client, texts, requests_per_thread, threads, batch_size):
+    # Threads share the app the way a threaded server would; each has its own test client
+    def worker(offset, timings, errors):
+        thread_client = client.application.test_client()
+        for i in range(requests_per_thread):
+            start = (offset + i * batch_size) % len(texts)
+            batch = texts[start:start + batch_size]
+            body = {'review_text': batch[0]} if batch_size == 1 else {'reviews': batch}
+            started = time.perf_counter()
+            response = thread_client.post('/analyze', json=body)
+            timings.append(time.perf_counter() - started)
+            if response.status_code != 200:
+                errors.append(response.status_code)
+
+    timings, errors = [], []
+    with quiet():
+        workers = [
+            threading.Thread(target=worker, args=(t * requests_per_thread * batch_size, timings, errors))
+            for t in range(threads)
+        ]
+        started = time.perf_counter()
+        for w in workers:
+            w.start()
+        for w in workers:
+            w.join()
+        wall = time.perf_counter() - started
+
+    stats = summarize(timings, batch_size)
+    # Wall-clock throughput across all threads, not the sum of per-request times
+    stats['items_per_second'] = len(timings) * batch_size / wall
+    stats.update(threads=threads, errors=len(errors))
+    return stats
+
+
+def run(args, texts):
+    import app
+    from inference import PREDICTION_LABELS
+    app.init_worker()
+    if not app.models.ready:
+        raise SystemExit(f"Models are not loaded from {app.config.MODEL_DIR}: {app.models.timings()}")
+    results = {}
+    rng = np.random.default_rng(args.seed)
+
+    def record(name, stats):
+        results[name] = stats
+        print(f"  {name:<34} p50 {stats['p50_ms']:>9.3f} ms   p99 {stats['p99_ms']:>9.3f} ms   "
+              f"{stats['items_per_second']:>10.0f} items/s")
+
+    def skip(name, reason):
+        results[name] = {'skipped': reason}
+        print(f"  {name} skipped: {reason}")
+
+    def pick(i, size):
+        start = (i * size) % len(texts)
+        return texts[start:start + size]
+
+    print("Microbenchmarks:")
+    try:
+        with quiet():
+            app.preprocess_text(texts[0])
+        record('preprocess_text', measure(lambda i: app.preprocess_text(texts[i % len(texts)]), args.calls, args.warmup))
+    except LookupError:
+        # NLTK corpora are downloaded separately; the rest of the suite does not need them
+        skip('preprocess_text', 'NLTK data missing')
+
+    for size in args.batch_sizes:
+        calls = max(10, args.calls // size)
+        record(f'apply_tf_idf[{size}]', measure(lambda i: app.apply_tf_idf(pick(i, size)), calls, args.warmup, size))
+        with quiet():
+            features = [app.apply_tf_idf(pick(i, size)) for i in range(min(calls, 50))]
+        # The compact format serves both models through the fused scorer and never loads the
+        # pickled svm/lr; their predict calls would only time the unavailable fallback
+        for name, model, predict in (('predict_svm', 'svm', app.predict_svm),
+                                     ('predict_logistic_regression', 'lr', app.predict_logistic_regression)):
+            if app.models.get(model) is None:
+                skip(f'{name}[{size}]', f'{model} model not loaded (MODEL_FORMAT={app.config.MODEL_FORMAT})')
+                continue
+            record(f'{name}[{size}]', measure(
+                lambda i: predict(features[i % len(features)]), calls, args.warmup, size))
+        scorer = app.models.get('ensemble')
+        if scorer is not None:
+            record(f'ensemble_scorer[{size}]', measure(
+                lambda i: scorer.predict_proba(features[i % len(features)]), calls, args.warmup, size))
+        record(f'classify_reviews[{size}]', measure(
+            lambda i: app.classify_reviews(pick(i, size)), calls, args.warmup, size))
+
+    predictions = rng.choice(PREDICTION_LABELS, size=len(texts))
+    urls = [f'https://www.amazon.in/benchmark/dp/B{i:05d}' for i in range(20)]
+    record('save_analysis', measure(
+        lambda i: app.db.save_analysis(texts[i % len(texts)], urls[i % len(urls)], predictions[i % len(texts)],
+                                       predictions[i % len(texts)], predictions[i % len(texts)], 90.0),
+        args.calls, args.warmup))
+
+    print(f"\nEnd-to-end /analyze ({args.threads} threads):")
+    client = app.app.test_client()
+    for size in args.batch_sizes:
+        per_thread = max(5, args.requests // (args.threads * size))
+        # A warm-up request per batch size, outside the measurement
+        load_run(client, texts, 1, 1, size)
+        record(f'analyze[{size}]', load_run(client, texts, per_thread, args.threads, size))
+    return results
+
+
+def metadata(args):
+    import sklearn
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    import config
+    return {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'git_commit': commit,
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'numpy': np.__version__,
+        'scikit_learn': sklearn.__version__,
+        'db_backend': config.DB_BACKEND,
+        'model_format': config.MODEL_FORMAT,
+        'cache_enabled': config.CACHE_ENABLED,
+        'settings': vars(args)
+    }
+
+
+def compare(current, baseline, threshold):
+    # Relative change of each latency stat; True when any benchmark got slower than threshold
+    print(f"\nAgainst {baseline['meta'].get('git_commit') or 'baseline'} ({baseline['meta'].get('created')}):")
+    regressed = False
+    for name, stats in current['results'].items():
+        before = baseline['results'].get(name)
+        if not before or 'skipped' in before or 'skipped' in stats:
+            continue
+        changes = []
+        for key in COMPARED_STATS:
+            change = stats[key] / before[key] - 1 if before[key] else 0.0
+            flag = ''
+            if change > threshold:
+                flag = ' !'
+                regressed = True
+            changes.append(f"{key} {change:+7.1%}{flag}")
+        print(f"  {name:<34} {'   '.join(changes)}")
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark preprocessing, vectorization, inference and persistence')
+    parser.add_argument('--data', default='large_dataset.csv', help='Reviews used as benchmark inputs')
+    parser.add_argument('--rows', type=int, default=2000)
+    parser.add_argument('--calls', type=int, default=500, help='Timed calls per single-review microbenchmark')
+    parser.add_argument('--warmup', type=int, default=20)
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 100])
+    parser.add_argument('--requests', type=int, default=2000, help='Reviews sent per end-to-end run')
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--db', choices=('sqlite', 'mysql'), default='sqlite',
+                        help='sqlite: a throwaway file; mysql: the server from config.py')
+    parser.add_argument('--cache', action='store_true', help='Keep the inference cache on (off by default, '
+                        'so repeated inputs still reach the models)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help=f'Result file (default: {RESULTS_DIR}/<timestamp>.json)')
+    parser.add_argument('--compare', help='Earlier result file to compare against')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='Relative slowdown reported as a regression by --compare (exit status 1)')
+    args = parser.parse_args()
+
+    # Settings are read when config is first imported, so they go into the environment first
+    scratch = tempfile.mkdtemp(prefix='benchmark-')
+    os.environ['DB_BACKEND'] = args.db
+    if args.db == 'sqlite':
+        os.environ['SQLITE_PATH'] = os.path.join(scratch, 'benchmark.sqlite3')
+    os.environ['CACHE_ENABLED'] = '1' if args.cache else '0'
+
+    texts = pd.read_csv(args.data, nrows=args.rows)['review_text'].fillna('').tolist()
+    texts = [texts[i] for i in np.random.default_rng(args.seed).permutation(len(texts))]
+
+    started = time.perf_counter()
+    try:
+        results = run(args, texts)
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+    report = {'meta': metadata(args), 'results': results, 'seconds': time.perf_counter() - started}
+
+    output = args.output or os.path.join(RESULTS_DIR, time.strftime('%Y%m%d-%H%M%S') + '.json')
+    if os.path.dirname(output):
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {output} ({report['seconds']:.1f}s)")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(report, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,266 @@
+import argparse
+import importlib.util
+import json
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+import config
+from inference import score_batch
+from model_registry import create_registry
+
+# Offline scoring of review dumps with the same artifacts app.py serves. The parent loads the
+# models once and forks the worker pool, so every worker reads the same memory-mapped arrays.
+# Chunks are scored in parallel, written back in input order, and the row offset reached is
+# checkpointed after each write, so an interrupted run resumes from the last written chunk.
+OUTPUT_FORMATS = ('csv', 'parquet', 'db')
+PROGRESS_FILE = '_progress.json'
+
+# Loaded in the parent before the pool forks; workers started any other way load their own
+_models = None
+
+
+def load_models():
+    models = create_registry(config)
+    models.load_all()
+    if not models.ready:
+        raise SystemExit(f"Models are not loaded from {config.MODEL_DIR}: {models.timings()}")
+    return models
+
+
+def _init_worker():
+    global _models
+    if _models is None:
+        _models = load_models()
+
+
+def score_chunk(texts):
+    # DataFrame of score_batch results, one row per text
+    lstm = _models.get('lstm') if config.LSTM_IN_ENSEMBLE else None
+    results = score_batch(texts, _models.get('vectorizer'), _models.get('svm'), _models.get('lr'),
+                          _models.get('ensemble'), lstm)
+    return pd.DataFrame.from_records(results)
+
+
+# --- Input ---
+
+def iter_chunks(path, columns, chunk_rows, offset=0):
+    # (first row number, DataFrame) of at most chunk_rows rows, starting at row offset
+    if path.endswith('.parquet'):
+        # Imported here: Parquet input is optional
+        import pyarrow.parquet as pq
+        parquet = pq.ParquetFile(path)
+        # Row groups wholly before the offset are skipped without being read
+        row, groups = 0, []
+        for i in range(parquet.num_row_groups):
+            rows = parquet.metadata.row_group(i).num_rows
+            if row + rows <= offset and not groups:
+                row += rows
+            else:
+                groups.append(i)
+        if not groups:
+            return
+        batches = (batch.to_pandas() for batch in
+                   parquet.iter_batches(batch_size=chunk_rows, row_groups=groups, columns=columns))
+    else:
+        # CSV rows can span lines, so skipped rows are still parsed rather than skipped by line number
+        row = 0
+        batches = pd.read_csv(path, usecols=columns, chunksize=chunk_rows)
+
+    for chunk in batches:
+        if row + len(chunk) <= offset:
+            row += len(chunk)
+            continue
+        if row < offset:
+            chunk = chunk.iloc[offset - row:]
+            row = offset
+        yield row, chunk.reset_index(drop=True)
+        row += len(chunk)
+
+
+def fingerprint(path):
+    stat = os.stat(path)
+    return {'path': os.path.abspath(path), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+# --- Output ---
+
+class FileParts:
+    # One file per chunk, output/part-<first row>.<format>, written under a temporary name and
+    # renamed; a resumed run rewrites any part past the checkpoint whole
+
+    def __init__(self, directory, fmt):
+        self.directory = directory
+        self.format = fmt
+        os.makedirs(directory, exist_ok=True)
+
+    def write(self, start, chunk, texts, scores, args):
+        frame = pd.concat([pd.DataFrame({'row': range(start, start + len(chunk))}), scores], axis=1)
+        if args.id_column:
+            frame.insert(1, args.id_column, chunk[args.id_column].to_numpy())
+        path = os.path.join(self.directory, f'part-{start:012d}.{self.format}')
+        scratch = path + '.tmp'
+        if self.format == 'parquet':
+            frame.to_parquet(scratch, index=False)
+        else:
+            frame.to_csv(scratch, index=False)
+        os.replace(scratch, path)
+
+
+class DatabaseLoad:
+    # reviews, analysis_results and the product_stats rollups, one transaction per chunk.
+    # A crash between the commit and the checkpoint loads that chunk again on resume.
+
+    def __init__(self):
+        from database import Database
+        self.db = Database(pool_size=1)
+
+    def write(self, start, chunk, texts, scores, args):
+        # texts are the normalized strings that were scored, so what is stored matches the scores
+        urls = chunk[args.url_column].fillna('').astype(str).tolist() if args.url_column else [args.url] * len(chunk)
+        records = [
+            {
+                'review_text': text,
+                'url': url,
+                'svm_pred': svm,
+                'lr_pred': lr,
+                'final_pred': final,
+                'accuracy': float(accuracy)
+            }
+            for text, url, svm, lr, final, accuracy in zip(
+                texts, urls, scores['svm_prediction'], scores['lr_prediction'], scores['prediction'], scores['accuracy']
+            )
+        ]
+        if not self.db.save_analyses(records, history=False):
+            raise SystemExit(f"Database load failed at row {start}; rerun with --resume")
+
+
+def read_progress(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def write_progress(path, progress):
+    scratch = path + '.tmp'
+    with open(scratch, 'w') as f:
+        json.dump(progress, f, indent=2)
+    os.replace(scratch, path)
+
+
+# --- Run ---
+
+def run(args, sink, offset, progress_path):
+    global _models
+    _models = load_models()
+    columns = [c for c in (args.text_column, args.url_column, args.id_column) if c]
+    source = fingerprint(args.data)
+
+    # Forked workers share the parent's loaded models; spawned ones load their own
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context('fork' if 'fork' in methods else None)
+    pool = ProcessPoolExecutor(args.workers, mp_context=context, initializer=_init_worker) if args.workers else None
+
+    # Chunks in flight, oldest first; enough queued that no worker waits on the writer
+    pending = deque()
+    scored = 0
+    started = time.perf_counter()
+
+    def finish(start, chunk, texts, future):
+        nonlocal scored
+        scores = future.result() if pool else future
+        sink.write(start, chunk, texts, scores, args)
+        scored += len(chunk)
+        write_progress(progress_path, {
+            'input': source,
+            'output': args.output,
+            'format': args.format,
+            'offset': start + len(chunk),
+            'updated': time.strftime('%Y-%m-%dT%H:%M:%S')
+        })
+        seconds = time.perf_counter() - started
+        print(f"  rows {offset}-{start + len(chunk)}: {scored} scored in {seconds:.1f}s "
+              f"({scored / max(seconds, 1e-9):.0f} rows/s)")
+
+    try:
+        for start, chunk in iter_chunks(args.data, columns, args.chunk_rows, offset):
+            if args.rows is not None:
+                if start >= offset + args.rows:
+                    break
+                chunk = chunk.iloc[:offset + args.rows - start]
+            texts = chunk[args.text_column].fillna('').astype(str).tolist()
+            pending.append((start, chunk, texts, pool.submit(score_chunk, texts) if pool else score_chunk(texts)))
+            if len(pending) >= max(1, args.workers) * 2:
+                finish(*pending.popleft())
+        while pending:
+            finish(*pending.popleft())
+    finally:
+        if pool:
+            pool.shutdown(cancel_futures=True)
+    return scored, time.perf_counter() - started
+
+
+def missing_parquet_engine(args):
+    # Parquet support is optional (pyarrow is not in requirements.txt); checked before the models
+    # load so a missing engine fails the run up front rather than after the first scored chunk
+    if args.data.endswith('.parquet') and importlib.util.find_spec('pyarrow') is None:
+        return "Reading a .parquet input needs pyarrow (pip install pyarrow)"
+    if args.format == 'parquet' and not any(importlib.util.find_spec(m) for m in ('pyarrow', 'fastparquet')):
+        return "--format parquet needs pyarrow or fastparquet (pip install pyarrow), or use --format csv"
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Score a CSV/Parquet review dump with the served models')
+    parser.add_argument('--data', required=True, help='CSV or .parquet file of reviews')
+    parser.add_argument('--output', help='Directory of result parts (parquet/csv formats)')
+    parser.add_argument('--format', choices=OUTPUT_FORMATS, default='csv',
+                        help='db loads the reviews and analysis_results tables of the configured database')
+    parser.add_argument('--text-column', default='review_text')
+    parser.add_argument('--id-column', help='Input column copied into the result parts')
+    parser.add_argument('--url-column', help='Product URL per review, for --format db')
+    parser.add_argument('--url', default='', help='Product URL of every review when there is no --url-column')
+    parser.add_argument('--chunk-rows', type=int, default=20000, help='Reviews per worker task and per part')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Scoring processes; 0 scores inline')
+    parser.add_argument('--offset', type=int, help='First input row to score')
+    parser.add_argument('--rows', type=int, help='Stop after this many rows')
+    parser.add_argument('--resume', action='store_true', help='Start after the last row the previous run wrote')
+    parser.add_argument('--progress', help=f'Checkpoint file (default: <output>/{PROGRESS_FILE}, '
+                        f'or bulk_score{PROGRESS_FILE} for --format db)')
+    args = parser.parse_args()
+    missing = missing_parquet_engine(args)
+    if missing:
+        parser.error(missing)
+
+    if args.format == 'db':
+        sink = DatabaseLoad()
+        progress_path = args.progress or f'bulk_score{PROGRESS_FILE}'
+    else:
+        if not args.output:
+            parser.error(f"--output is required for --format {args.format}")
+        sink = FileParts(args.output, args.format)
+        progress_path = args.progress or os.path.join(args.output, PROGRESS_FILE)
+
+    offset = args.offset or 0
+    if args.resume and args.offset is None:
+        progress = read_progress(progress_path)
+        if progress:
+            if progress['input'] != fingerprint(args.data):
+                raise SystemExit(f"{args.data} changed since {progress_path} was written; "
+                                 f"pass --offset to resume anyway")
+            offset = progress['offset']
+            print(f"Resuming from row {offset} ({progress_path})")
+
+    print(f"Scoring {args.data} from row {offset} with {args.workers} workers, {args.chunk_rows} rows per chunk")
+    scored, seconds = run(args, sink, offset, progress_path)
+    print(f"Scored {scored} reviews in {seconds:.1f}s ({scored / max(seconds, 1e-9):.0f} rows/s)")
+
+
+if __name__ == '__main__':
+    main()
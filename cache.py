@@ -0,0 +1,294 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+def normalize_text(text):
+    # Case and spacing differences should not defeat the cache for templated reviews
+    return _WHITESPACE.sub(' ', text).strip().lower()
+
+
+def cache_key(text, model_version):
+    digest = hashlib.sha256()
+    digest.update(model_version.encode('utf-8'))
+    digest.update(b'\0')
+    digest.update(normalize_text(text).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def model_version_from_files(paths):
+    # Any retrained artifact changes size or mtime, which invalidates every cached result
+    digest = hashlib.sha256()
+    for path in paths:
+        digest.update(path.encode('utf-8'))
+        try:
+            stat = os.stat(path)
+            digest.update(f'{stat.st_size}:{stat.st_mtime_ns}'.encode('ascii'))
+        except OSError:
+            digest.update(b'missing')
+    return digest.hexdigest()[:16]
+
+
+def _entry_size(key, value):
+    return len(key) + len(json.dumps(value))
+
+
+class LRUCache:
+    def __init__(self, max_entries, max_bytes, ttl_seconds):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, size, value = entry
+            if expires_at <= now:
+                self._remove(key, size)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        size = _entry_size(key, value)
+        if size > self.max_bytes:
+            return
+        expires_at = time.monotonic() + self.ttl_seconds
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._entries[key] = (expires_at, size, value)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                oldest_key, (_, oldest_size, _) = next(iter(self._entries.items()))
+                self._remove(oldest_key, oldest_size)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def _remove(self, key, size):
+        del self._entries[key]
+        self._bytes -= size
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations
+            }
+
+
+class SQLiteCache:
+    # Shared across processes: every gunicorn worker on the host opens the same file
+
+    # Bounds are enforced every this many writes rather than on each one
+    PRUNE_INTERVAL = 100
+
+    def __init__(self, path, max_entries, max_bytes, ttl_seconds):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._writes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = self._connection()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS inference_cache (
+                cache_key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                expires_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_cache_last_access ON inference_cache (last_access)")
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        # Wall-clock time, since the expiry has to mean the same thing in every process
+        now = time.time()
+        try:
+            conn = self._connection()
+            row = conn.execute(
+                "SELECT value, expires_at FROM inference_cache WHERE cache_key = ?", (key,)
+            ).fetchone()
+            if row is None or row[1] <= now:
+                with self._lock:
+                    self.misses += 1
+                return None
+            conn.execute("UPDATE inference_cache SET last_access = ? WHERE cache_key = ?", (now, key))
+        except sqlite3.Error as e:
+            logger.error("Error reading shared cache: %s", e)
+            return None
+        with self._lock:
+            self.hits += 1
+        return json.loads(row[0])
+
+    def set(self, key, value):
+        now = time.time()
+        payload = json.dumps(value)
+        try:
+            self._connection().execute(
+                "INSERT OR REPLACE INTO inference_cache (cache_key, value, size, expires_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, payload, len(key) + len(payload), now + self.ttl_seconds, now)
+            )
+        except sqlite3.Error as e:
+            logger.error("Error writing shared cache: %s", e)
+            return
+        with self._lock:
+            self._writes += 1
+            due = self._writes % self.PRUNE_INTERVAL == 0
+        if due:
+            self.prune()
+
+    def prune(self):
+        try:
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                removed = conn.execute("DELETE FROM inference_cache WHERE expires_at <= ?", (time.time(),)).rowcount
+                count, total = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM inference_cache").fetchone()
+                # Drop least recently used rows until both bounds hold again
+                rows = conn.execute("SELECT cache_key, size FROM inference_cache ORDER BY last_access")
+                doomed = []
+                for key, size in rows:
+                    if count <= self.max_entries and total <= self.max_bytes:
+                        break
+                    doomed.append((key,))
+                    count -= 1
+                    total -= size
+                rows.close()
+                conn.executemany("DELETE FROM inference_cache WHERE cache_key = ?", doomed)
+                conn.execute("COMMIT")
+            except sqlite3.Error:
+                conn.execute("ROLLBACK")
+                raise
+        except sqlite3.Error as e:
+            logger.error("Error pruning shared cache: %s", e)
+            return
+        with self._lock:
+            self.evictions += removed + len(doomed)
+
+    def clear(self):
+        self._connection().execute("DELETE FROM inference_cache")
+
+    def stats(self):
+        try:
+            count, total = self._connection().execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM inference_cache"
+            ).fetchone()
+        except sqlite3.Error:
+            count, total = None, None
+        with self._lock:
+            return {
+                'entries': count,
+                'bytes': total,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions
+            }
+
+
+class InferenceCache:
+    # Per-worker LRU in front of an optional shared backend
+
+    def __init__(self, model_version, max_entries, max_bytes, ttl_seconds, shared=None):
+        self.model_version = model_version
+        self.local = LRUCache(max_entries, max_bytes, ttl_seconds)
+        self.shared = shared
+
+    def key(self, text):
+        return cache_key(text, self.model_version)
+
+    def get(self, key):
+        value = self.local.get(key)
+        if value is None and self.shared is not None:
+            value = self.shared.get(key)
+            if value is not None:
+                self.local.set(key, value)
+        return value
+
+    def set(self, key, value):
+        self.local.set(key, value)
+        if self.shared is not None:
+            self.shared.set(key, value)
+
+    def clear(self):
+        self.local.clear()
+        if self.shared is not None:
+            self.shared.clear()
+
+    def stats(self):
+        stats = {'model_version': self.model_version, 'local': self.local.stats()}
+        if self.shared is not None:
+            stats['shared'] = self.shared.stats()
+        return stats
+
+
+def create_cache(config, model_version):
+    shared = None
+    if config.CACHE_BACKEND == 'sqlite':
+        shared = SQLiteCache(
+            config.CACHE_SQLITE_PATH,
+            config.CACHE_MAX_ENTRIES,
+            config.CACHE_MAX_BYTES,
+            config.CACHE_TTL_SECONDS
+        )
+    elif config.CACHE_BACKEND != 'memory':
+        raise ValueError(f"Unknown CACHE_BACKEND: {config.CACHE_BACKEND}")
+    return InferenceCache(
+        model_version,
+        config.CACHE_MAX_ENTRIES,
+        config.CACHE_MAX_BYTES,
+        config.CACHE_TTL_SECONDS,
+        shared=shared
+    )
@@ -1,12 +1,44 @@
-import mysql.connector
+import os
+import sqlite3
+
+import config
+
+def try_sqlite_connection():
+    print(f"\nOpening SQLite database at {config.SQLITE_PATH}...")
+    if not os.path.exists(config.SQLITE_PATH):
+        print("❌ Database file not found. Run setup_database.py first.")
+        return False
+    try:
+        connection = sqlite3.connect(config.SQLITE_PATH)
+        journal_mode = connection.execute("PRAGMA journal_mode").fetchone()[0]
+        print(f"✅ Connected to SQLite {sqlite3.sqlite_version} (journal mode: {journal_mode})")
+        
+        tables = connection.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' ORDER BY name"
+        ).fetchall()
+        print("\n✅ Available tables:")
+        for table in tables:
+            print(f"   - {table[0]}")
+        
+        connection.close()
+        print("\n✅ Database connection closed successfully")
+        return True
+    except sqlite3.Error as e:
+        print(f"❌ Error opening SQLite database: {e}")
+        return False
 
 def try_connection():
+    if config.DB_BACKEND == 'sqlite':
+        return try_sqlite_connection()
+
+    import mysql.connector
     try:
-        # First try to connect as root to check if database exists
+        # First try to connect without a database to check if it exists
         root_connection = mysql.connector.connect(
-            host='localhost',
-            user='root',
-            password='5036'  # Try with no password first
+            host=config.DB_HOST,
+            port=config.DB_PORT,
+            user=config.DB_USER,
+            password=config.DB_PASSWORD
         )
         
         if root_connection.is_connected():
@@ -21,25 +53,26 @@ def try_connection():
                 print(f"   - {db[0]}")
             
             # Try to create database if it doesn't exist
-            if 'fake_review_db' not in [db[0] for db in databases]:
-                print("\nCreating database 'fake_review_db'...")
-                cursor.execute("CREATE DATABASE fake_review_db")
+            if config.DB_NAME not in [db[0] for db in databases]:
+                print(f"\nCreating database '{config.DB_NAME}'...")
+                cursor.execute(f"CREATE DATABASE {config.DB_NAME}")
                 print("✅ Database created successfully!")
             
             cursor.close()
             root_connection.close()
             
             # Now try to connect to the specific database
-            print("\nTrying to connect to fake_review_db...")
+            print(f"\nTrying to connect to {config.DB_NAME}...")
             connection = mysql.connector.connect(
-                host='localhost',
-                user='fake-review',
-                password='5036',
-                database='fake_review_db'
+                host=config.DB_HOST,
+                port=config.DB_PORT,
+                user=config.DB_USER,
+                password=config.DB_PASSWORD,
+                database=config.DB_NAME
             )
             
             if connection.is_connected():
-                print("✅ Successfully connected to fake_review_db!")
+                print(f"✅ Successfully connected to {config.DB_NAME}!")
                 db_info = connection.get_server_info()
                 print(f"✅ Connected to MySQL Server version {db_info}")
                 
@@ -0,0 +1,241 @@
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+from sklearn.feature_extraction.text import HashingVectorizer, TfidfTransformer, TfidfVectorizer
+from sklearn.pipeline import Pipeline, make_pipeline
+
+from cache import model_version_from_files
+from ensemble import EnsembleScorer, build_scorer, heads_from_specs, source_paths
+
+# Serving artifacts without pickles: a JSON manifest, the vocabulary as a text file of one term per
+# column and every numeric array as a raw .npy file. Loading memory-maps the numeric arrays, so all
+# workers on a host share one page-cache copy and nothing is unpickled at start-up. The vocabulary
+# is the exception: transform() needs a term -> column dict, rebuilt in each process that loads it.
+COMPACT_DIR = 'compact'
+MANIFEST_FILE = 'manifest.json'
+FORMAT_VERSION = 1
+WEIGHT_DTYPES = ('float64', 'float32', 'int8')
+TRANSFORMER_PARAMS = ('norm', 'use_idf', 'smooth_idf', 'sublinear_tf')
+
+
+def pickle_paths(model_dir):
+    return [os.path.join(model_dir, 'tfidf_vectorizer.pkl')] + source_paths(model_dir)
+
+
+# --- Vectorizer ---
+
+def _json_params(estimator):
+    params = estimator.get_params()
+    params.pop('vocabulary', None)
+    for key in ('tokenizer', 'preprocessor', 'analyzer'):
+        if callable(params.get(key)):
+            raise ValueError(f"A custom {key} cannot be stored in the compact format")
+    params['dtype'] = np.dtype(params['dtype']).name
+    if isinstance(params.get('stop_words'), (set, frozenset)):
+        params['stop_words'] = sorted(params['stop_words'])
+    return params
+
+
+def _python_params(params):
+    params = dict(params, dtype=np.dtype(params['dtype']).type)
+    if 'ngram_range' in params:
+        params['ngram_range'] = tuple(params['ngram_range'])
+    return params
+
+
+def _vectorizer_parts(vectorizer):
+    # (manifest entry, vocabulary terms or None, idf)
+    if isinstance(vectorizer, TfidfVectorizer):
+        terms = [None] * len(vectorizer.vocabulary_)
+        for term, column in vectorizer.vocabulary_.items():
+            terms[column] = term
+        if any('\n' in term for term in terms):
+            raise ValueError("Vocabulary terms containing newlines cannot be stored one per line")
+        spec = {'kind': 'tfidf', 'params': _json_params(vectorizer)}
+        return spec, terms, np.asarray(vectorizer.idf_, dtype=np.float64)
+    if isinstance(vectorizer, Pipeline) and [type(step) for _, step in vectorizer.steps] == [HashingVectorizer, TfidfTransformer]:
+        # The out-of-core pipeline from train_streaming.py: no vocabulary at all
+        hasher, tfidf = vectorizer.steps[0][1], vectorizer.steps[1][1]
+        spec = {
+            'kind': 'hashing',
+            'params': _json_params(hasher),
+            'transformer': {key: getattr(tfidf, key) for key in TRANSFORMER_PARAMS}
+        }
+        return spec, None, np.asarray(tfidf.idf_, dtype=np.float64)
+    raise ValueError(f"Cannot store a {type(vectorizer).__name__} in the compact format")
+
+
+def _load_vectorizer(directory, spec):
+    idf = np.load(os.path.join(directory, 'idf.npy'), mmap_mode='r')
+    if spec['kind'] == 'hashing':
+        tfidf = TfidfTransformer(**spec['transformer'])
+        tfidf.idf_ = idf
+        tfidf.n_features_in_ = idf.shape[0]
+        return make_pipeline(HashingVectorizer(**_python_params(spec['params'])), tfidf)
+
+    with open(os.path.join(directory, 'vocabulary.txt'), encoding='utf-8') as f:
+        terms = f.read().split('\n')
+    vectorizer = TfidfVectorizer(**_python_params(spec['params']))
+    # The fitted state transform() reads: the term -> column map and the idf weights
+    vectorizer.vocabulary_ = {term: column for column, term in enumerate(terms)}
+    vectorizer.fixed_vocabulary_ = False
+    vectorizer.idf_ = idf
+    return vectorizer
+
+
+# --- Scorer weights ---
+
+def quantize(weights, dtype):
+    # int8 is symmetric per column: w ~ q * scale, q in [-127, 127]
+    if dtype == 'int8':
+        scale = np.abs(weights).max(axis=0) / 127
+        scale[scale == 0] = 1.0
+        return np.round(weights / scale).astype(np.int8), scale
+    return weights.astype(dtype), None
+
+
+# --- Export / load ---
+
+def export_compact(model_dir, dtype='float32', vectorizer=None, scorer=None):
+    # Built from the pickles (or the given objects) into model_dir/compact, replacing it atomically
+    import joblib
+    if vectorizer is None:
+        vectorizer = joblib.load(os.path.join(model_dir, 'tfidf_vectorizer.pkl'))
+    if scorer is None:
+        svm_model, lr_model = (joblib.load(path) for path in source_paths(model_dir))
+        scorer = build_scorer(svm_model, lr_model)
+
+    spec, terms, idf = _vectorizer_parts(vectorizer)
+    weights, scale = quantize(np.asarray(scorer.weights, dtype=np.float64), dtype)
+    arrays = dict(scorer.head_arrays(), idf=idf, weights=weights, bias=scorer.bias)
+    if scale is not None:
+        arrays['weight_scale'] = scale
+    manifest = {
+        'format': FORMAT_VERSION,
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        # Size/mtime version of the pickles this was exported from; MODEL_FORMAT=auto only
+        # prefers the compact files while it still matches
+        'source_version': model_version_from_files(pickle_paths(model_dir)),
+        'vectorizer': spec,
+        'scorer': {'heads': scorer.head_specs(), 'weights_dtype': dtype},
+        'arrays': sorted(arrays)
+    }
+
+    target = os.path.join(model_dir, COMPACT_DIR)
+    scratch = tempfile.mkdtemp(dir=model_dir, prefix='.compact-')
+    try:
+        # mkdtemp creates it owner-only; workers may run as another user
+        os.chmod(scratch, 0o755)
+        for name, value in arrays.items():
+            np.save(os.path.join(scratch, f'{name}.npy'), np.ascontiguousarray(value))
+        if terms is not None:
+            with open(os.path.join(scratch, 'vocabulary.txt'), 'w', encoding='utf-8') as f:
+                f.write('\n'.join(terms))
+        # Manifest last: a directory without one is never loaded
+        with open(os.path.join(scratch, MANIFEST_FILE), 'w') as f:
+            json.dump(manifest, f, indent=2)
+        if os.path.isdir(target):
+            # Files a running worker still maps stay valid after the old directory is removed
+            old = f'{scratch}.old'
+            os.rename(target, old)
+            os.rename(scratch, target)
+            shutil.rmtree(old)
+        else:
+            os.rename(scratch, target)
+    except BaseException:
+        shutil.rmtree(scratch, ignore_errors=True)
+        raise
+    return target
+
+
+def read_manifest(directory):
+    with open(os.path.join(directory, MANIFEST_FILE)) as f:
+        manifest = json.load(f)
+    if manifest.get('format') != FORMAT_VERSION:
+        raise ValueError(f"Unsupported compact model format: {manifest.get('format')}")
+    return manifest
+
+
+def load_compact_vectorizer(directory):
+    return _load_vectorizer(directory, read_manifest(directory)['vectorizer'])
+
+
+def load_compact_scorer(directory):
+    manifest = read_manifest(directory)
+    arrays = {
+        name: np.load(os.path.join(directory, f'{name}.npy'), mmap_mode='r')
+        for name in manifest['arrays']
+    }
+    heads = heads_from_specs(manifest['scorer']['heads'], {k: np.asarray(v) for k, v in arrays.items()})
+    return EnsembleScorer(arrays['weights'], arrays['bias'], heads, weight_scale=arrays.get('weight_scale'))
+
+
+def compact_is_current(model_dir):
+    # True when the compact export exists and the pickles are absent or unchanged since it was made
+    directory = os.path.join(model_dir, COMPACT_DIR)
+    try:
+        manifest = read_manifest(directory)
+    except (OSError, ValueError):
+        return False
+    if not any(os.path.exists(path) for path in pickle_paths(model_dir)):
+        return True
+    return manifest.get('source_version') == model_version_from_files(pickle_paths(model_dir))
+
+
+def compare(model_dir, texts):
+    # The compact vectorizer + scorer against the pickled sklearn objects on the same reviews
+    import joblib
+    from inference import score_batch
+    vectorizer = joblib.load(os.path.join(model_dir, 'tfidf_vectorizer.pkl'))
+    svm_model, lr_model = (joblib.load(path) for path in source_paths(model_dir))
+    directory = os.path.join(model_dir, COMPACT_DIR)
+    compact_vectorizer, scorer = load_compact_vectorizer(directory), load_compact_scorer(directory)
+
+    reference = score_batch(texts, vectorizer, svm_model, lr_model)
+    compact = score_batch(texts, compact_vectorizer, None, None, scorer)
+    keys = ('prediction', 'svm_prediction', 'lr_prediction')
+    return {
+        'reviews': len(texts),
+        'label_agreement': float(np.mean([all(r[k] == c[k] for k in keys) for r, c in zip(reference, compact)])),
+        'max_confidence_difference': max(abs(r['accuracy'] - c['accuracy']) for r, c in zip(reference, compact)),
+        'max_feature_difference': float(abs(compact_vectorizer.transform(texts) - vectorizer.transform(texts)).max())
+    }
+
+
+def directory_bytes(directory):
+    return sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export the serving models to the compact memory-mapped format')
+    parser.add_argument('--model-dir', default='models')
+    parser.add_argument('--dtype', choices=WEIGHT_DTYPES, default='float32', help='Storage type of the weights')
+    parser.add_argument('--data', default='large_dataset.csv', help='Reviews used to compare with the pickles')
+    parser.add_argument('--rows', type=int, default=2000)
+    args = parser.parse_args()
+
+    target = export_compact(args.model_dir, args.dtype)
+    pickles = sum(os.path.getsize(path) for path in pickle_paths(args.model_dir))
+    print(f"Compact models written to {target}: {directory_bytes(target) / 1024:.0f} KB "
+          f"(pickles: {pickles / 1024:.0f} KB)")
+
+    import pandas as pd
+    texts = pd.read_csv(args.data, nrows=args.rows)['review_text'].fillna('').tolist()
+    report = compare(args.model_dir, texts)
+    print(f"Against the pickles over {report['reviews']} reviews: labels agree on "
+          f"{report['label_agreement']:.2%}, confidence differs by at most "
+          f"{report['max_confidence_difference']:.2e} points, TF-IDF by {report['max_feature_difference']:.2e}")
+
+    started = time.perf_counter()
+    load_compact_vectorizer(target)
+    load_compact_scorer(target)
+    print(f"Compact load: {(time.perf_counter() - started) * 1000:.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
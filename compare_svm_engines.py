@@ -0,0 +1,110 @@
+import argparse
+import json
+import time
+
+import numpy as np
+import pandas as pd
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.model_selection import train_test_split
+
+from svm_engines import SVM_ENGINES, build_svm
+
+LABEL_MAPPING = {'negative': 0, 'neutral': 1, 'positive': 2}
+
+
+def load_dataset(path):
+    df = pd.read_csv(path).dropna(subset=['sentiment'])
+    return df['review_text'].values, df['sentiment'].map(LABEL_MAPPING).values
+
+
+def request_latency_ms(model, features, repeats):
+    # What /analyze pays per review: predict_proba on a single-row matrix
+    timings = []
+    for i in range(repeats):
+        row = features[i % features.shape[0]]
+        start = time.perf_counter()
+        model.predict_proba(row)
+        timings.append((time.perf_counter() - start) * 1000)
+    return float(np.percentile(timings, 50)), float(np.percentile(timings, 99))
+
+
+def run_size(X_train, y_train, X_test, y_test, size, engines, libsvm_max_rows, repeats, seed):
+    # The held-out rows stay fixed; only the training side is resampled up to the target size
+    rng = np.random.default_rng(seed)
+    idx = rng.integers(0, len(X_train), size=size)
+    vectorizer = TfidfVectorizer(max_features=5000)
+    train_features = vectorizer.fit_transform(X_train[idx])
+    test_features = vectorizer.transform(X_test)
+
+    rows = []
+    for engine in engines:
+        row = {'engine': engine, 'train_rows': size}
+        if engine == 'libsvm' and size > libsvm_max_rows:
+            row['skipped'] = f'more than {libsvm_max_rows} rows'
+            rows.append(row)
+            continue
+        model = build_svm(engine)
+        start = time.perf_counter()
+        model.fit(train_features, y_train[idx])
+        row['train_seconds'] = time.perf_counter() - start
+
+        proba = model.predict_proba(test_features)
+        row['accuracy'] = float(np.mean(model.classes_[proba.argmax(axis=1)] == y_test))
+        row['latency_p50_ms'], row['latency_p99_ms'] = request_latency_ms(model, test_features, repeats)
+
+        start = time.perf_counter()
+        model.predict_proba(test_features)
+        row['batch_rows_per_second'] = test_features.shape[0] / (time.perf_counter() - start)
+        rows.append(row)
+
+    baseline = next((r for r in rows if r['engine'] == 'libsvm' and 'accuracy' in r), None)
+    for row in rows:
+        if baseline is not None and 'accuracy' in row:
+            row['accuracy_delta_vs_libsvm'] = row['accuracy'] - baseline['accuracy']
+    return rows
+
+
+def print_rows(rows):
+    print(f"{'rows':>9} {'engine':>10} {'train s':>9} {'p50 ms':>8} {'p99 ms':>8} {'batch r/s':>11} {'accuracy':>9} {'delta':>8}")
+    for r in rows:
+        if 'skipped' in r:
+            print(f"{r['train_rows']:>9} {r['engine']:>10}  skipped: {r['skipped']}")
+            continue
+        delta = r.get('accuracy_delta_vs_libsvm')
+        print(f"{r['train_rows']:>9} {r['engine']:>10} {r['train_seconds']:>9.2f} {r['latency_p50_ms']:>8.3f} "
+              f"{r['latency_p99_ms']:>8.3f} {r['batch_rows_per_second']:>11.0f} {r['accuracy']:>9.4f} "
+              f"{'n/a' if delta is None else f'{delta:+.4f}':>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare SVM engines on training time, request latency and accuracy')
+    parser.add_argument('--data', default='large_dataset.csv')
+    parser.add_argument('--sizes', default='5000,100000,1000000',
+                        help='Comma-separated training set sizes; the labelled rows are resampled to reach each')
+    parser.add_argument('--engines', default=','.join(SVM_ENGINES))
+    parser.add_argument('--libsvm-max-rows', type=int, default=100000,
+                        help='Skip libsvm above this many training rows')
+    parser.add_argument('--repeats', type=int, default=500, help='Single-review predictions timed per engine')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='Write the results as JSON to this path')
+    args = parser.parse_args()
+
+    X, y = load_dataset(args.data)
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=args.seed)
+    engines = args.engines.split(',')
+
+    results = []
+    for size in [int(s) for s in args.sizes.split(',')]:
+        print(f"\nTraining on {size} rows...")
+        rows = run_size(X_train, y_train, X_test, y_test, size, engines, args.libsvm_max_rows, args.repeats, args.seed)
+        print_rows(rows)
+        results.extend(rows)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
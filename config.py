@@ -0,0 +1,143 @@
+import os
+
+
+def _env_bool(name, default):
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def _env_int(name, default):
+    return int(os.environ.get(name, default))
+
+
+def _env_float(name, default):
+    return float(os.environ.get(name, default))
+
+
+# --- Inference result cache ---
+CACHE_ENABLED = _env_bool('CACHE_ENABLED', True)
+CACHE_MAX_ENTRIES = _env_int('CACHE_MAX_ENTRIES', 50000)
+CACHE_MAX_BYTES = _env_int('CACHE_MAX_BYTES', 32 * 1024 * 1024)
+CACHE_TTL_SECONDS = _env_float('CACHE_TTL_SECONDS', 24 * 60 * 60)
+# 'memory' keeps the cache inside each worker; 'sqlite' adds a file shared by every worker on the host
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'memory')
+CACHE_SQLITE_PATH = os.environ.get('CACHE_SQLITE_PATH', 'cache/inference_cache.sqlite3')
+# Overrides the version derived from the model files; part of every cache key
+MODEL_VERSION = os.environ.get('MODEL_VERSION', '')
+
+# --- Storage ---
+# 'mysql' for a MySQL server, 'sqlite' for the embedded engine (edge boxes, CI, load tests)
+DB_BACKEND = os.environ.get('DB_BACKEND', 'mysql')
+SQLITE_PATH = os.environ.get('SQLITE_PATH', 'data/fake_review.sqlite3')
+# Seconds a SQLite writer waits for the database lock held by another connection
+SQLITE_BUSY_TIMEOUT = _env_float('SQLITE_BUSY_TIMEOUT', 10)
+
+# MySQL connection settings
+DB_HOST = os.environ.get('DB_HOST', 'localhost')
+DB_PORT = _env_int('DB_PORT', 3306)
+DB_USER = os.environ.get('DB_USER', 'root')
+DB_PASSWORD = os.environ.get('DB_PASSWORD', '5036')
+DB_NAME = os.environ.get('DB_NAME', 'fake_review_db')
+
+# Connection pool, used by both backends
+DB_POOL_SIZE = _env_int('DB_POOL_SIZE', 8)
+# Seconds a request waits for a free connection before giving up
+DB_POOL_TIMEOUT = _env_float('DB_POOL_TIMEOUT', 5)
+# Connections idle for longer than this are pinged (and reconnected) before reuse
+DB_HEALTH_CHECK_INTERVAL = _env_float('DB_HEALTH_CHECK_INTERVAL', 30)
+# Product url -> product_id entries kept in memory by each worker
+PRODUCT_CACHE_SIZE = _env_int('PRODUCT_CACHE_SIZE', 100000)
+
+# --- Write-behind for analysis records ---
+WRITE_BEHIND_ENABLED = _env_bool('WRITE_BEHIND_ENABLED', True)
+# Records held in memory at most; producers block, then fall back to a direct write
+WRITE_BEHIND_MAX_QUEUE = _env_int('WRITE_BEHIND_MAX_QUEUE', 10000)
+WRITE_BEHIND_BATCH_SIZE = _env_int('WRITE_BEHIND_BATCH_SIZE', 500)
+WRITE_BEHIND_FLUSH_INTERVAL = _env_float('WRITE_BEHIND_FLUSH_INTERVAL', 0.5)
+WRITE_BEHIND_PUT_TIMEOUT = _env_float('WRITE_BEHIND_PUT_TIMEOUT', 0.05)
+WRITE_BEHIND_SHUTDOWN_TIMEOUT = _env_float('WRITE_BEHIND_SHUTDOWN_TIMEOUT', 10)
+
+# --- Micro-batching (micro_batch.py) ---
+# Coalesces concurrent /analyze requests into one model call; pays off with several request
+# threads per worker, e.g. GUNICORN_THREADS=16
+MICRO_BATCH_ENABLED = _env_bool('MICRO_BATCH_ENABLED', False)
+# A batch is scored once it holds this many reviews or its first request has waited this long.
+# 0 ms never waits: requests that arrive while a batch is scored form the next one
+MICRO_BATCH_MAX_SIZE = _env_int('MICRO_BATCH_MAX_SIZE', 256)
+MICRO_BATCH_MAX_WAIT_MS = _env_float('MICRO_BATCH_MAX_WAIT_MS', 2)
+# Requests queued at most; beyond that a request scores its own reviews
+MICRO_BATCH_MAX_QUEUE = _env_int('MICRO_BATCH_MAX_QUEUE', 1024)
+# Seconds a request waits for its batch before failing
+MICRO_BATCH_TIMEOUT = _env_float('MICRO_BATCH_TIMEOUT', 10)
+
+# --- /history ---
+HISTORY_MAX_LIMIT = _env_int('HISTORY_MAX_LIMIT', 100)
+
+# --- Model loading ---
+MODEL_DIR = os.environ.get('MODEL_DIR', 'models')
+MODEL_LOAD_WORKERS = _env_int('MODEL_LOAD_WORKERS', 4)
+# Memory-map the numpy arrays inside the joblib pickles instead of copying them into each process
+MODEL_MMAP = _env_bool('MODEL_MMAP', True)
+# Start serving immediately and load the models in the background (/readyz reports progress)
+FAST_START = _env_bool('FAST_START', False)
+# Score with the fused SVM + LR matrix exported by ensemble.py when models/ensemble_scorer.npz exists
+ENSEMBLE_SCORER = _env_bool('ENSEMBLE_SCORER', True)
+# 'compact' serves from models/compact (compact_model.py), 'pickle' from the joblib pickles,
+# 'auto' picks compact when it exists and matches the pickles
+MODEL_FORMAT = os.environ.get('MODEL_FORMAT', 'auto')
+# Transform with fast_tfidf.py's engine, bit-identical to the saved TfidfVectorizer
+FAST_TFIDF = _env_bool('FAST_TFIDF', True)
+
+# --- LSTM serving (lstm_serving.py) ---
+# 'numpy' serves the forward pass exported to models/lstm_numpy, 'framework' the trained
+# model, 'auto' the NumPy export when it exists and matches the trained model
+LSTM_ENGINE = os.environ.get('LSTM_ENGINE', 'auto')
+# Adds the LSTM's sentiment (lstm_prediction, lstm_confidence) to every /analyze result,
+# scored in the same batch as the other models
+LSTM_IN_ENSEMBLE = _env_bool('LSTM_IN_ENSEMBLE', False)
+# Reviews per forward pass, tokenized reviews kept as integer sequences, and the length
+# granularity reviews are bucketed and padded to
+LSTM_BATCH_SIZE = _env_int('LSTM_BATCH_SIZE', 256)
+LSTM_TOKEN_CACHE_SIZE = _env_int('LSTM_TOKEN_CACHE_SIZE', 50000)
+LSTM_BUCKET_STEP = _env_int('LSTM_BUCKET_STEP', 8)
+
+# --- Near-duplicate review index (near_duplicates.py) ---
+# Adds duplicate_cluster_size to /analyze results: how many stored reviews share this one's skeleton
+NEAR_DUP_ENABLED = _env_bool('NEAR_DUP_ENABLED', True)
+# MinHash signature length and LSH bands; num_perm / bands rows per band put the
+# similarity at which reviews become candidates near (1 / bands) ** (bands / num_perm)
+NEAR_DUP_NUM_PERM = _env_int('NEAR_DUP_NUM_PERM', 64)
+NEAR_DUP_BANDS = _env_int('NEAR_DUP_BANDS', 16)
+# Estimated Jaccard similarity of character shingles at which two reviews count as near-duplicates
+NEAR_DUP_THRESHOLD = _env_float('NEAR_DUP_THRESHOLD', 0.5)
+NEAR_DUP_SHINGLE_SIZE = _env_int('NEAR_DUP_SHINGLE_SIZE', 4)
+# Seconds between reads of newly stored reviews, and rows read per query
+NEAR_DUP_SYNC_INTERVAL = _env_float('NEAR_DUP_SYNC_INTERVAL', 5)
+NEAR_DUP_SYNC_BATCH = _env_int('NEAR_DUP_SYNC_BATCH', 5000)
+
+# --- Review fetching (review_fetcher.py) ---
+# /analyze with a url and no review_text fetches the product's review pages and scores them
+FETCH_ENABLED = _env_bool('FETCH_ENABLED', True)
+# Hosts (and their subdomains) the server may fetch from, comma separated; '*' allows any
+FETCH_ALLOWED_HOSTS = os.environ.get('FETCH_ALLOWED_HOSTS', 'amazon.in,amazon.com,flipkart.com,meesho.com')
+FETCH_TIMEOUT = _env_float('FETCH_TIMEOUT', 10)
+# Review pages fetched per product, all in flight at once
+FETCH_MAX_PAGES = _env_int('FETCH_MAX_PAGES', 3)
+# Pages fetched concurrently by each worker, and keep-alive connections kept per host
+FETCH_WORKERS = _env_int('FETCH_WORKERS', 8)
+FETCH_POOL_SIZE = _env_int('FETCH_POOL_SIZE', 16)
+# Parsed pages kept per worker. Within FETCH_FRESH_SECONDS a page is not fetched again; after
+# that it is revalidated with its ETag/Last-Modified and dropped after FETCH_CACHE_TTL_SECONDS
+FETCH_CACHE_ENTRIES = _env_int('FETCH_CACHE_ENTRIES', 1000)
+FETCH_FRESH_SECONDS = _env_float('FETCH_FRESH_SECONDS', 300)
+FETCH_CACHE_TTL_SECONDS = _env_float('FETCH_CACHE_TTL_SECONDS', 24 * 60 * 60)
+# Pages larger than this are not read
+FETCH_MAX_PAGE_BYTES = _env_int('FETCH_MAX_PAGE_BYTES', 5 * 1024 * 1024)
+
+# --- Observability ---
+# Level of the app's log output; DEBUG adds a line per model call on the request path
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+# Per-stage timing spans and the Prometheus /metrics endpoint
+METRICS_ENABLED = _env_bool('METRICS_ENABLED', True)
@@ -1,125 +1,455 @@
-import mysql.connector
-from mysql.connector import Error
+import base64
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
 from datetime import datetime
 
+import config
+import metrics
+from storage import create_backend
+
+logger = logging.getLogger(__name__)
+
+
+# Columns /history may return; review_text is only sent when asked for
+HISTORY_FIELDS = (
+    'history_id', 'url_analyzed', 'platform', 'review_text',
+    'prediction_result', 'confidence_score', 'analyzed_at'
+)
+HISTORY_DEFAULT_FIELDS = (
+    'history_id', 'url_analyzed', 'platform', 'prediction_result', 'confidence_score', 'analyzed_at'
+)
+
+
+def encode_history_cursor(analyzed_at, history_id):
+    payload = json.dumps([analyzed_at.isoformat(), history_id]).encode('utf-8')
+    return base64.urlsafe_b64encode(payload).decode('ascii')
+
+
+def decode_history_cursor(cursor):
+    try:
+        analyzed_at, history_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return datetime.fromisoformat(analyzed_at), int(history_id)
+    except (ValueError, TypeError, UnicodeError) as e:
+        raise ValueError(f"Invalid history cursor: {e}")
+
+
+def platform_from_url(url):
+    if not url:
+        return "Unknown"
+    url = url.lower()
+    if "amazon" in url:
+        return "Amazon"
+    elif "flipkart" in url:
+        return "Flipkart"
+    elif "meesho" in url:
+        return "Meesho"
+    else:
+        return "Other"
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class ConnectionPool:
+    def __init__(self, backend, size, timeout, health_check_interval):
+        self.backend = backend
+        self.size = size
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+        # LIFO so the most recently used (and most likely alive) connection is reused first.
+        # Every change to the idle list or the open count notifies one waiter, so a slot freed
+        # by a discarded connection goes to a blocked acquire() as surely as a released one.
+        self._idle = []
+        self._created = 0
+        self._lock = threading.Lock()
+        self._available = threading.Condition(self._lock)
+
+        self.checkouts = 0
+        self.timeouts = 0
+        self.reconnects = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def acquire(self):
+        start = time.perf_counter()
+        with self._available:
+            conn, last_used = self._take_or_wait()
+            waited = time.perf_counter() - start
+            self.checkouts += 1
+            self.wait_total += waited
+            self.wait_max = max(self.wait_max, waited)
+
+        try:
+            if conn is None or time.monotonic() - last_used > self.health_check_interval:
+                conn = self._check(conn)
+        except self.backend.errors:
+            self._discard()
+            raise
+        return conn
+
+    def _take_or_wait(self):
+        # Called with the lock held: an idle connection, else a free slot, else wait for either
+        deadline = time.monotonic() + self.timeout
+        while True:
+            if self._idle:
+                return self._idle.pop()
+            if self._created < self.size:
+                self._created += 1
+                # Opened lazily by acquire(), outside the lock, so a dead server does not use up a slot
+                return None, 0.0
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self.timeouts += 1
+                raise PoolTimeout(f"No database connection free after {self.timeout}s")
+            self._available.wait(remaining)
+
+    def _check(self, conn):
+        if conn is not None:
+            try:
+                self.backend.ping(conn)
+                return conn
+            except self.backend.errors:
+                self._close_quietly(conn)
+            with self._lock:
+                self.reconnects += 1
+        return self.backend.connect()
+
+    def release(self, conn, broken=False):
+        if broken:
+            self._close_quietly(conn)
+            self._discard()
+            return
+        with self._available:
+            self._idle.append((conn, time.monotonic()))
+            self._available.notify()
+
+    def _discard(self):
+        with self._available:
+            self._created -= 1
+            self._available.notify()
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        broken = False
+        try:
+            yield conn
+        except self.backend.disconnect_errors:
+            broken = True
+            raise
+        finally:
+            self.release(conn, broken)
+
+    def close_all(self):
+        with self._available:
+            idle, self._idle = self._idle, []
+            self._created -= len(idle)
+            self._available.notify(len(idle))
+        for conn, _ in idle:
+            self._close_quietly(conn)
+
+    def _close_quietly(self, conn):
+        try:
+            conn.close()
+        except self.backend.errors:
+            pass
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': self.size,
+                'open': self._created,
+                'idle': len(self._idle),
+                'checkouts': self.checkouts,
+                'timeouts': self.timeouts,
+                'reconnects': self.reconnects,
+                'wait_avg_ms': self.wait_total / self.checkouts * 1000 if self.checkouts else 0.0,
+                'wait_max_ms': self.wait_max * 1000
+            }
+
+
+class ProductCache:
+    # Bounded LRU map of product url -> product_id shared by every request thread
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._ids = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, url):
+        with self._lock:
+            product_id = self._ids.get(url)
+            if product_id is not None:
+                self._ids.move_to_end(url)
+            return product_id
+
+    def update(self, ids):
+        with self._lock:
+            for url, product_id in ids.items():
+                self._ids[url] = product_id
+                self._ids.move_to_end(url)
+            while len(self._ids) > self.max_entries:
+                self._ids.popitem(last=False)
+
+    def __len__(self):
+        return len(self._ids)
+
+
 class Database:
-    def __init__(self):
+    def __init__(self, pool_size=None, backend=None):
+        # MySQL or embedded SQLite, picked by config.DB_BACKEND
+        self.backend = backend or create_backend(config)
+        self._errors = self.backend.errors + (PoolTimeout,)
+        self.pool = ConnectionPool(
+            self.backend,
+            pool_size or config.DB_POOL_SIZE,
+            config.DB_POOL_TIMEOUT,
+            config.DB_HEALTH_CHECK_INTERVAL
+        )
+        # url -> product_id, kept warm across requests
+        self._product_ids = ProductCache(config.PRODUCT_CACHE_SIZE)
         try:
-            self.connection = mysql.connector.connect(
-                host='localhost',
-                user='root',  # MySQL root username
-                password='5036',  # Your MySQL root password
-                database='fake_review_db'
-            )
-            if self.connection.is_connected():
-                print("Successfully connected to MySQL database")
-        except Error as e:
-            print(f"Error connecting to MySQL database: {e}")
-            self.connection = None
+            self.backend.prepare()
+            with self.pool.connection():
+                logger.info("Successfully connected to %s database", self.backend.name)
+        except self._errors as e:
+            # Not fatal: every operation checks out its own connection and retries the server
+            logger.error("Error connecting to %s database: %s", self.backend.name, e)
 
     def close(self):
-        if hasattr(self, 'connection') and self.connection and self.connection.is_connected():
-            self.connection.close()
-            print("MySQL connection closed")
+        self.pool.close_all()
+        logger.info("%s connections closed", self.backend.name)
+
+    def pool_stats(self):
+        return dict(self.pool.stats(), cached_products=len(self._product_ids))
 
     def save_analysis(self, review_text, url, svm_pred, lr_pred, final_pred, accuracy):
-        if not self.connection or not self.connection.is_connected():
-            print("Database connection not available")
+        return self.save_analyses([{
+            'review_text': review_text,
+            'url': url,
+            'svm_pred': svm_pred,
+            'lr_pred': lr_pred,
+            'final_pred': final_pred,
+            'accuracy': accuracy
+        }])
+
+    def save_analyses(self, records, history=True):
+        # Writes a batch of analysis records in a single transaction. history=False leaves out the
+        # analysis_history rows, which log requests, for bulk loads that are not requests.
+        if not records:
+            return True
+        try:
+            with self.pool.connection() as connection:
+                return self._save_analyses(connection, records, history)
+        except self._errors as e:
+            logger.error("Error saving analysis: %s", e)
+            metrics.ERRORS.inc('db_write')
             return False
-            
+
+    def _save_analyses(self, connection, records, history=True):
+        cursor = None
         try:
-            cursor = self.connection.cursor()
+            cursor = connection.cursor()
             
-            # Insert into analysis_history
-            query = """
-            INSERT INTO analysis_history 
-            (url_analyzed, review_text, prediction_result, confidence_score) 
-            VALUES (%s, %s, %s, %s)
-            """
-            cursor.execute(query, (url, review_text, final_pred, accuracy))
+            # Insert into analysis_history, one multi-row statement for the batch
+            if history:
+                platforms = {}
+                for r in records:
+                    if r['url'] not in platforms:
+                        platforms[r['url']] = self._get_platform_from_url(r['url'])
+                query = """
+                INSERT INTO analysis_history 
+                (url_analyzed, platform, review_text, prediction_result, confidence_score) 
+                VALUES (%s, %s, %s, %s, %s)
+                """
+                cursor.executemany(self.backend.sql(query), [
+                    (r['url'], platforms[r['url']], r['review_text'], r['final_pred'], r['accuracy']) for r in records
+                ])
             
-            # If there's a review text, also save it to reviews table
-            if review_text:
-                # First check if product exists
-                product_query = "SELECT product_id FROM products WHERE url = %s"
-                cursor.execute(product_query, (url,))
-                product = cursor.fetchone()
-                
-                if not product:
-                    # Insert new product
-                    product_query = """
-                    INSERT INTO products (name, url, platform) 
-                    VALUES (%s, %s, %s)
-                    """
-                    platform = self._get_platform_from_url(url)
-                    cursor.execute(product_query, ("Unknown Product", url, platform))
-                    product_id = cursor.lastrowid
-                else:
-                    product_id = product[0]
+            # Records with review text are also saved to the reviews table
+            reviewed = [r for r in records if r['review_text']]
+            product_ids = {}
+            analysis_rows = []
+            # product_id -> [reviews, fake reviews, confidence sum] for the product_stats rollup
+            product_totals = {}
+            for r in reviewed:
+                url = r['url']
+                if url not in product_ids:
+                    product_ids[url] = self._get_or_create_product(cursor, url)
                 
-                # Insert review
+                # Insert review; rows go one at a time because analysis_results needs each review_id
                 review_query = """
                 INSERT INTO reviews 
                 (product_id, review_text, is_fake, confidence_score) 
                 VALUES (%s, %s, %s, %s)
                 """
-                is_fake = final_pred.lower() == 'fake'
-                cursor.execute(review_query, (product_id, review_text, is_fake, accuracy))
-                
-                # Get the review_id
-                review_id = cursor.lastrowid
-                
-                # Insert analysis results
+                is_fake = r['final_pred'].lower() == 'fake'
+                cursor.execute(self.backend.sql(review_query), (product_ids[url], r['review_text'], is_fake, r['accuracy']))
+                analysis_rows.append((
+                    cursor.lastrowid, r['svm_pred'], r['lr_pred'], r['final_pred'], r['accuracy']
+                ))
+                totals = product_totals.setdefault(product_ids[url], [0, 0, 0.0])
+                totals[0] += 1
+                totals[1] += is_fake
+                totals[2] += r['accuracy']
+            
+            # Insert analysis results
+            if analysis_rows:
                 analysis_query = """
                 INSERT INTO analysis_results 
                 (review_id, svm_prediction, lr_prediction, final_prediction, accuracy) 
                 VALUES (%s, %s, %s, %s, %s)
                 """
-                cursor.execute(analysis_query, (review_id, svm_pred, lr_pred, final_pred, accuracy))
+                cursor.executemany(self.backend.sql(analysis_query), analysis_rows)
             
-            self.connection.commit()
+            # Rollups move in the same transaction as the reviews they count, one upsert per product.
+            # Sorted so concurrent batches lock the rows in the same order and cannot deadlock.
+            if product_totals:
+                self.backend.add_product_stats(cursor, [
+                    (product_id, count, fake, confidence)
+                    for product_id, (count, fake, confidence) in sorted(product_totals.items())
+                ])
+
+            connection.commit()
+            # Only ids from committed transactions are cached; a rolled back insert has none
+            self._product_ids.update(product_ids)
             return True
-            
-        except Error as e:
-            print(f"Error saving analysis: {e}")
-            return False
+
+        except self._errors:
+            try:
+                connection.rollback()
+            except self._errors:
+                pass
+            raise
         finally:
             if cursor:
                 cursor.close()
 
+    def _get_or_create_product(self, cursor, url):
+        product_id = self._product_ids.get(url)
+        if product_id is not None:
+            return product_id
+        # Upsert instead of check-then-insert, so concurrent writers agree on one row
+        return self.backend.upsert_product(cursor, "Unknown Product", url, self._get_platform_from_url(url))
+
     def get_analysis_history(self, limit=10):
-        if not self.connection or not self.connection.is_connected():
-            print("Database connection not available")
-            return []
-            
+        rows, _ = self.get_analysis_history_page(limit=limit, fields=HISTORY_FIELDS)
+        return rows
+
+    def get_analysis_history_page(self, limit=10, cursor=None, prediction=None, url=None,
+                                  platform=None, since=None, until=None, fields=None):
+        # Keyset pagination, newest first. Every filter is an equality or range on the
+        # leading columns of an (..., analyzed_at, history_id) index, so a page is a
+        # bounded index range scan however large the table grows.
+        fields = list(fields or HISTORY_DEFAULT_FIELDS)
+        unknown = set(fields) - set(HISTORY_FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown history fields: {', '.join(sorted(unknown))}")
+        # The cursor is built from these two, so they are always selected
+        for required in ('analyzed_at', 'history_id'):
+            if required not in fields:
+                fields.append(required)
+
+        conditions = []
+        params = []
+        for column, value in (('prediction_result', prediction), ('url_analyzed', url), ('platform', platform)):
+            if value is not None:
+                conditions.append(f"{column} = %s")
+                params.append(value)
+        if since is not None:
+            conditions.append("analyzed_at >= %s")
+            params.append(since)
+        if until is not None:
+            conditions.append("analyzed_at < %s")
+            params.append(until)
+        if cursor is not None:
+            last_at, last_id = decode_history_cursor(cursor)
+            conditions.append("(analyzed_at < %s OR (analyzed_at = %s AND history_id < %s))")
+            params.extend([last_at, last_at, last_id])
+
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        query = f"""
+        SELECT {', '.join(fields)} FROM analysis_history 
+        {where}
+        ORDER BY analyzed_at DESC, history_id DESC 
+        LIMIT %s
+        """
+        # One extra row tells whether another page exists
+        params.append(limit + 1)
+
         try:
-            cursor = self.connection.cursor(dictionary=True)
-            query = """
-            SELECT * FROM analysis_history 
-            ORDER BY analyzed_at DESC 
-            LIMIT %s
-            """
-            cursor.execute(query, (limit,))
-            return cursor.fetchall()
-        except Error as e:
-            print(f"Error fetching analysis history: {e}")
-            return []
-        finally:
-            if cursor:
-                cursor.close()
+            with self.pool.connection() as connection:
+                rows = self.backend.fetch_dicts(connection, query, params)
+        except self._errors as e:
+            logger.error("Error fetching analysis history: %s", e)
+            return [], None
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_history_cursor(rows[-1]['analyzed_at'], rows[-1]['history_id'])
+        return rows, next_cursor
+
+    def get_product_stats(self, url):
+        # Two primary/unique key lookups, however many reviews the product has
+        query = """
+        SELECT p.product_id, p.name, p.url, p.platform,
+               s.review_count, s.fake_count, s.confidence_sum, s.updated_at
+        FROM products p 
+        LEFT JOIN product_stats s ON s.product_id = p.product_id 
+        WHERE p.url = %s
+        """
+        try:
+            with self.pool.connection() as connection:
+                rows = self.backend.fetch_dicts(connection, query, (url,))
+        except self._errors as e:
+            logger.error("Error fetching product stats: %s", e)
+            return None
+        if not rows:
+            return None
+        row = rows[0]
+        count = row.pop('review_count') or 0
+        fake = row.pop('fake_count') or 0
+        confidence_sum = row.pop('confidence_sum') or 0.0
+        return dict(
+            row,
+            review_count=count,
+            fake_count=fake,
+            fake_ratio=fake / count if count else None,
+            mean_confidence=confidence_sum / count if count else None
+        )
+
+    def iter_reviews(self, after_id=0, batch_size=5000):
+        # Stored reviews in review_id order, a page of rows at a time. Each page is its own short
+        # keyset query on the primary key, so a scan of the whole table holds no connection or
+        # server-side cursor between pages.
+        query = """
+        SELECT review_id, review_text FROM reviews 
+        WHERE review_id > %s 
+        ORDER BY review_id 
+        LIMIT %s
+        """
+        while True:
+            try:
+                with self.pool.connection() as connection:
+                    rows = self.backend.fetch_dicts(connection, query, (after_id, batch_size))
+            except self._errors as e:
+                logger.error("Error reading reviews: %s", e)
+                return
+            if not rows:
+                return
+            yield rows
+            if len(rows) < batch_size:
+                return
+            after_id = rows[-1]['review_id']
 
     def _get_platform_from_url(self, url):
-        if not url:
-            return "Unknown"
-        url = url.lower()
-        if "amazon" in url:
-            return "Amazon"
-        elif "flipkart" in url:
-            return "Flipkart"
-        elif "meesho" in url:
-            return "Meesho"
-        else:
-            return "Other"
+        return platform_from_url(url)
 
 # Example usage:
 if __name__ == "__main__":
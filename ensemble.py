@@ -0,0 +1,414 @@
+import argparse
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+from scipy.special import expit, softmax
+
+ENSEMBLE_FILE = 'ensemble_scorer.npz'
+FORMAT_VERSION = 1
+
+# libsvm clips every pairwise probability into [MIN_PROB, 1 - MIN_PROB] before coupling
+_LIBSVM_MIN_PROB = 1e-7
+# Below this many rows, pairwise coupling runs row by row on Python floats: numpy's per-call
+# overhead dominates the few iterations a single review needs
+_COUPLE_ROWWISE_MAX = 4
+# Largest difference from the sklearn probabilities accepted when exporting
+VERIFY_TOLERANCE = 1e-6
+
+
+class Head:
+    # One model's slice of the stacked score matrix plus what turns those scores into probabilities
+    def __init__(self, name, kind, start, stop, classes, params=None):
+        self.name = name
+        self.kind = kind
+        self.start = start
+        self.stop = stop
+        self.classes = np.asarray(classes)
+        self.params = params or {}
+
+    def predict_proba(self, scores):
+        return _PROBA[self.kind](scores[:, self.start:self.stop], self.params, len(self.classes))
+
+
+class EnsembleScorer:
+    # Both models are linear over the same TF-IDF features, so their weight vectors sit side by
+    # side in one matrix: a single sparse x dense product gives every decision value for a batch
+
+    def __init__(self, weights, bias, heads, source_digest=None, weight_scale=None):
+        # weights keep the dtype they arrive in: float64 from export, or float32/int8 arrays
+        # memory-mapped from the compact format (compact_model.py); int8 columns carry a scale
+        self.weights = weights
+        self.bias = np.asarray(bias, dtype=np.float64)
+        self.heads = {head.name: head for head in heads}
+        self.source_digest = source_digest
+        self.weight_scale = weight_scale
+
+    @property
+    def n_features(self):
+        return self.weights.shape[0]
+
+    def classes(self, name):
+        return self.heads[name].classes
+
+    def decision_values(self, features):
+        if self.weights.dtype == np.float32:
+            # Keeps the product in float32 instead of upcasting the whole weight matrix per call
+            features = features.astype(np.float32)
+        scores = np.asarray(features @ self.weights, dtype=np.float64)
+        if self.weight_scale is not None:
+            scores *= self.weight_scale
+        return scores + self.bias
+
+    def predict_proba(self, features):
+        scores = self.decision_values(features)
+        return {name: head.predict_proba(scores) for name, head in self.heads.items()}
+
+    def head_specs(self):
+        return [
+            {'name': h.name, 'kind': h.kind, 'start': h.start, 'stop': h.stop, 'classes': h.classes.tolist()}
+            for h in self.heads.values()
+        ]
+
+    def head_arrays(self):
+        return {f'{h.name}__{key}': value for h in self.heads.values() for key, value in h.params.items()}
+
+    def save(self, path):
+        arrays = dict(self.head_arrays(), weights=self.weights, bias=self.bias)
+        meta = {'format': FORMAT_VERSION, 'source_digest': self.source_digest, 'heads': self.head_specs()}
+        arrays['meta'] = np.array(json.dumps(meta))
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Written next to the target and renamed, so a loading worker never sees half a file
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, **arrays)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            meta = json.loads(str(data['meta']))
+            if meta.get('format') != FORMAT_VERSION:
+                raise ValueError(f"Unsupported ensemble scorer format: {meta.get('format')}")
+            heads = heads_from_specs(meta['heads'], {key: data[key] for key in data.files})
+            return cls(data['weights'], data['bias'], heads, meta.get('source_digest'))
+
+
+def heads_from_specs(specs, arrays):
+    heads = []
+    for spec in specs:
+        prefix = f"{spec['name']}__"
+        params = {key[len(prefix):]: value for key, value in arrays.items() if key.startswith(prefix)}
+        heads.append(Head(spec['name'], spec['kind'], spec['start'], spec['stop'], spec['classes'], params))
+    return heads
+
+
+# --- Scores to probabilities, one function per head kind, each matching sklearn's predict_proba ---
+
+def _softmax_proba(scores, params, n_classes):
+    # Multinomial LogisticRegression
+    return softmax(scores, axis=1)
+
+
+def _ovr_proba(scores, params, n_classes):
+    # One-vs-rest LogisticRegression: independent sigmoids, renormalized
+    proba = expit(scores)
+    return proba / proba.sum(axis=1, keepdims=True)
+
+
+def _sigmoid_calibrated_proba(scores, params, n_classes):
+    # CalibratedClassifierCV(method='sigmoid') over a linear model: per class Platt sigmoid of the
+    # decision value, then normalized; averaged over the calibrated members when there are several
+    a, b, class_index = params['a'], params['b'], params['class_index']
+    members, width = a.shape
+    total = np.zeros((scores.shape[0], n_classes))
+    for m in range(members):
+        proba = np.zeros_like(total)
+        block = scores[:, m * width:(m + 1) * width]
+        proba[:, class_index[m]] = expit(-(a[m] * block + b[m]))
+        if n_classes == 2:
+            proba[:, 0] = 1.0 - proba[:, 1]
+        else:
+            denominator = proba.sum(axis=1, keepdims=True)
+            uniform = np.full_like(proba, 1 / n_classes)
+            proba = np.divide(proba, denominator, out=uniform, where=denominator != 0)
+        proba[(1.0 < proba) & (proba <= 1.0 + 1e-5)] = 1.0
+        total += proba
+    return total / members
+
+
+def _libsvm_proba(scores, params, n_classes):
+    # SVC(probability=True): one-vs-one decision values, Platt sigmoid per pair, then
+    # libsvm's pairwise coupling
+    prob_a, prob_b = params['prob_a'], params['prob_b']
+    pairwise = _platt(scores, prob_a, prob_b)
+    pairwise = np.clip(pairwise, _LIBSVM_MIN_PROB, 1 - _LIBSVM_MIN_PROB)
+    # The libsvm bundled with sklearn couples two classes as well, rather than returning the
+    # pairwise estimate directly as newer libsvm releases do
+    n = scores.shape[0]
+    r = np.zeros((n, n_classes, n_classes))
+    pair = 0
+    for i in range(n_classes):
+        for j in range(i + 1, n_classes):
+            r[:, i, j] = pairwise[:, pair]
+            r[:, j, i] = 1 - pairwise[:, pair]
+            pair += 1
+    if n <= _COUPLE_ROWWISE_MAX:
+        return np.array([_couple_row(row) for row in r.tolist()]).reshape(n, n_classes)
+    return _couple(r)
+
+
+def _platt(dec, prob_a, prob_b):
+    # libsvm's sigmoid_predict, with its two branches to avoid cancellation
+    f = dec * prob_a + prob_b
+    out = np.empty_like(f)
+    positive = f >= 0
+    e = np.exp(-f[positive])
+    out[positive] = e / (1.0 + e)
+    out[~positive] = 1.0 / (1.0 + np.exp(f[~positive]))
+    return out
+
+
+def _couple_row(r):
+    # Straight port of libsvm's multiclass_probability for one row
+    k = len(r)
+    Q = [[0.0] * k for _ in range(k)]
+    for t in range(k):
+        for j in range(t):
+            Q[t][t] += r[j][t] * r[j][t]
+            Q[t][j] = Q[j][t]
+        for j in range(t + 1, k):
+            Q[t][t] += r[j][t] * r[j][t]
+            Q[t][j] = -r[j][t] * r[t][j]
+    p = [1.0 / k] * k
+    eps = 0.005 / k
+    for _ in range(max(100, k)):
+        Qp = [sum(Q[t][j] * p[j] for j in range(k)) for t in range(k)]
+        pQp = sum(p[t] * Qp[t] for t in range(k))
+        if max(abs(Qp[t] - pQp) for t in range(k)) < eps:
+            break
+        for t in range(k):
+            diff = (-Qp[t] + pQp) / Q[t][t]
+            p[t] += diff
+            pQp = (pQp + diff * (diff * Q[t][t] + 2 * Qp[t])) / (1 + diff) / (1 + diff)
+            for j in range(k):
+                Qp[j] = (Qp[j] + diff * Q[t][j]) / (1 + diff)
+                p[j] /= 1 + diff
+    return p
+
+
+def _couple(r):
+    # libsvm's multiclass_probability (Wu, Lin and Weng, method 2) run for the whole batch at once.
+    # Each row iterates exactly as it would on its own and stops updating once it converges.
+    n, k, _ = r.shape
+    r_t = r.transpose(0, 2, 1)
+    Q = -r_t * r
+    diag = np.arange(k)
+    Q[:, diag, diag] = (r_t ** 2).sum(axis=2)
+
+    p = np.full((n, k), 1.0 / k)
+    active = np.ones(n, dtype=bool)
+    eps = 0.005 / k
+    for _ in range(max(100, k)):
+        Qp = np.matmul(Q, p[:, :, None])[:, :, 0]
+        pQp = (p * Qp).sum(axis=1)
+        active &= np.abs(Qp - pQp[:, None]).max(axis=1) >= eps
+        if not active.any():
+            break
+        if active.all():
+            _coupling_step(Q, p, Qp, pQp)
+        else:
+            rows = np.flatnonzero(active)
+            pa = p[rows]
+            _coupling_step(Q[rows], pa, Qp[rows], pQp[rows])
+            p[rows] = pa
+    return p
+
+
+def _coupling_step(Q, p, Qp, pQp):
+    # One sweep over the classes, updating p in place
+    for t in range(Q.shape[1]):
+        Qtt = Q[:, t, t]
+        diff = (pQp - Qp[:, t]) / Qtt
+        p[:, t] += diff
+        scale = 1 + diff
+        pQp = (pQp + diff * (diff * Qtt + 2 * Qp[:, t])) / scale / scale
+        Qp = (Qp + diff[:, None] * Q[:, t, :]) / scale[:, None]
+        p /= scale[:, None]
+
+
+_PROBA = {
+    'softmax': _softmax_proba,
+    'ovr': _ovr_proba,
+    'sigmoid_calibrated': _sigmoid_calibrated_proba,
+    'libsvm_ovo': _libsvm_proba,
+}
+
+
+# --- Export from the trained sklearn models ---
+
+def _dense(matrix):
+    if hasattr(matrix, 'toarray'):
+        matrix = matrix.toarray()
+    return np.asarray(matrix, dtype=np.float64)
+
+
+def _probabilistic_linear_weights(model):
+    coef, intercept = _dense(model.coef_), _dense(model.intercept_).ravel()
+    if coef.shape[0] == 1:
+        # Binary: sklearn scores the classes as [-d, d] under both softmax and one-vs-rest
+        coef, intercept = np.vstack([-coef, coef]), np.concatenate([-intercept, intercept])
+    return coef, intercept
+
+
+def _logistic_block(model):
+    coef, intercept = _probabilistic_linear_weights(model)
+    # Mirrors the branch in LogisticRegression.predict_proba
+    ovr = model.multi_class in ('ovr', 'warn') or (
+        model.multi_class == 'auto' and (len(model.classes_) <= 2 or model.solver == 'liblinear')
+    )
+    return coef, intercept, 'ovr' if ovr else 'softmax', {}
+
+
+def _calibrated_block(model):
+    if model.method != 'sigmoid':
+        raise ValueError(f"Only sigmoid calibration can be fused, not {model.method!r}")
+    coefs, intercepts, a, b, class_index = [], [], [], [], []
+    for member in model.calibrated_classifiers_:
+        estimator = member.estimator
+        if not hasattr(estimator, 'coef_'):
+            raise ValueError(f"Calibrated estimator {type(estimator).__name__} is not linear")
+        coefs.append(_dense(estimator.coef_))
+        intercepts.append(_dense(estimator.intercept_).ravel())
+        a.append([calibrator.a_ for calibrator in member.calibrators])
+        b.append([calibrator.b_ for calibrator in member.calibrators])
+        index = np.searchsorted(model.classes_, estimator.classes_)
+        if len(model.classes_) == 2:
+            # Binary estimators produce one decision value, for the positive class
+            index = index[1:]
+        class_index.append(index)
+    if len({len(row) for row in a}) != 1:
+        raise ValueError("Calibrated members saw different classes and cannot be stacked")
+    params = {'a': np.array(a), 'b': np.array(b), 'class_index': np.array(class_index)}
+    return np.vstack(coefs), np.concatenate(intercepts), 'sigmoid_calibrated', params
+
+
+def _libsvm_block(model):
+    if model.kernel != 'linear' or not model.probability:
+        raise ValueError("Only a linear-kernel SVC trained with probability=True can be fused")
+    coef, intercept = _dense(model.coef_), _dense(model.intercept_).ravel()
+    if len(model.classes_) == 2:
+        # sklearn flips the binary decision function relative to libsvm's; probA_/probB_ follow libsvm
+        coef, intercept = -coef, -intercept
+    params = {'prob_a': _dense(model.probA_), 'prob_b': _dense(model.probB_)}
+    return coef, intercept, 'libsvm_ovo', params
+
+
+def _model_block(model):
+    name = type(model).__name__
+    if name == 'CalibratedClassifierCV':
+        return _calibrated_block(model)
+    if name == 'SVC':
+        return _libsvm_block(model)
+    if name == 'LogisticRegression':
+        return _logistic_block(model)
+    if name == 'SGDClassifier' and model.loss in ('log_loss', 'log'):
+        # Logistic regression trained out of core (train_streaming.py): one-vs-rest sigmoids
+        coef, intercept = _probabilistic_linear_weights(model)
+        return coef, intercept, 'ovr', {}
+    raise ValueError(f"Cannot fuse a {name} model")
+
+
+def build_scorer(svm_model, lr_model, source_digest=None):
+    coefs, intercepts, heads = [], [], []
+    start = 0
+    for name, model in (('svm', svm_model), ('lr', lr_model)):
+        coef, intercept, kind, params = _model_block(model)
+        stop = start + coef.shape[0]
+        coefs.append(coef)
+        intercepts.append(intercept)
+        heads.append(Head(name, kind, start, stop, model.classes_, params))
+        start = stop
+    if coefs[0].shape[1] != coefs[1].shape[1]:
+        raise ValueError("The SVM and LR models were trained on different feature spaces")
+    weights = np.ascontiguousarray(np.vstack(coefs).T)
+    return EnsembleScorer(weights, np.concatenate(intercepts), heads, source_digest)
+
+
+def verify_scorer(scorer, models, features):
+    # Largest absolute difference from each sklearn model's own predict_proba
+    fused = scorer.predict_proba(features)
+    differences = {}
+    for name, model in models.items():
+        if not np.array_equal(scorer.classes(name), model.classes_):
+            raise ValueError(f"{name}: class order differs from the model")
+        differences[name] = float(np.abs(fused[name] - model.predict_proba(features)).max())
+    return differences
+
+
+def source_digest(paths):
+    # Content hash of the pickles the scorer was exported from, so a retrained model is never
+    # paired with stale weights (mtimes do not survive copying the models directory around)
+    digest = hashlib.sha256()
+    for path in paths:
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+def source_paths(model_dir):
+    return [os.path.join(model_dir, 'svm_model.pkl'), os.path.join(model_dir, 'logistic_regression_model.pkl')]
+
+
+def load_scorer(path, sources):
+    scorer = EnsembleScorer.load(path)
+    if scorer.source_digest != source_digest(sources):
+        raise ValueError(f"{path} was exported from different model files; re-run ensemble.py")
+    return scorer
+
+
+def export(model_dir, texts=None, features=None):
+    # Checked against the saved models on either raw reviews or an already vectorized matrix
+    import joblib
+    sources = source_paths(model_dir)
+    svm_model, lr_model = (joblib.load(path) for path in sources)
+    scorer = build_scorer(svm_model, lr_model, source_digest(sources))
+
+    if features is None:
+        vectorizer = joblib.load(os.path.join(model_dir, 'tfidf_vectorizer.pkl'))
+        features = vectorizer.transform(texts)
+    differences = verify_scorer(scorer, {'svm': svm_model, 'lr': lr_model}, features)
+    for name, difference in differences.items():
+        print(f"{name}: max |fused - sklearn| = {difference:.2e} over {features.shape[0]} reviews")
+        if difference > VERIFY_TOLERANCE:
+            raise ValueError(f"{name}: fused probabilities differ from sklearn by {difference:.2e}")
+
+    path = os.path.join(model_dir, ENSEMBLE_FILE)
+    scorer.save(path)
+    print(f"Ensemble scorer saved to {path}")
+    return scorer, features
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export the fused SVM + LR scorer used by app.py')
+    parser.add_argument('--model-dir', default='models')
+    parser.add_argument('--data', default='large_dataset.csv', help='Reviews used to check the export against sklearn')
+    parser.add_argument('--rows', type=int, default=2000)
+    args = parser.parse_args()
+
+    import pandas as pd
+    texts = pd.read_csv(args.data, nrows=args.rows)['review_text'].fillna('').tolist()
+    scorer, features = export(args.model_dir, texts)
+
+    start = time.perf_counter()
+    scorer.predict_proba(features)
+    print(f"Fused scoring: {features.shape[0] / (time.perf_counter() - start):.0f} reviews/s")
+
+
+if __name__ == '__main__':
+    main()
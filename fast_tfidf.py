@@ -0,0 +1,210 @@
+import argparse
+import logging
+import re
+import time
+from itertools import chain, repeat
+
+import numpy as np
+import scipy.sparse as sp
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+logger = logging.getLogger(__name__)
+
+# TfidfVectorizer.transform() without its per-token Python loop, for the fitted vectorizer the
+# models were trained on. Tokens of a whole batch are looked up in the vocabulary in one C-level
+# map(), the (row, column) counts come from one np.unique over integer keys, and IDF scaling and
+# normalization run on the CSR arrays directly.
+#
+# The output is bit-identical to the vectorizer's, layout included: sklearn's IDF step is a sparse
+# product with a diagonal matrix, whose result lists each row's columns in descending order (they
+# stay ascending without IDF), and its row norms are summed left to right in that order. Both are
+# reproduced here.
+NORMS = (None, 'l1', 'l2')
+# Non-zeros up to which row norms are summed in Python rather than with numpy
+SMALL_BATCH_NNZ = 512
+
+
+def unsupported_settings(vectorizer):
+    # Reasons this engine cannot reproduce the vectorizer, empty when it can
+    if not isinstance(vectorizer, TfidfVectorizer):
+        return [f'{type(vectorizer).__name__} is not a TfidfVectorizer']
+    reasons = []
+    if vectorizer.analyzer != 'word':
+        reasons.append(f'analyzer={vectorizer.analyzer!r}')
+    for key in ('tokenizer', 'preprocessor', 'strip_accents'):
+        if getattr(vectorizer, key) is not None:
+            reasons.append(f'{key}={getattr(vectorizer, key)!r}')
+    if vectorizer.input != 'content':
+        reasons.append(f'input={vectorizer.input!r}')
+    if vectorizer.norm not in NORMS:
+        reasons.append(f'norm={vectorizer.norm!r}')
+    if np.dtype(vectorizer.dtype) != np.float64:
+        reasons.append(f'dtype={np.dtype(vectorizer.dtype).name}')
+    if re.compile(vectorizer.token_pattern).groups > 1:
+        reasons.append('token_pattern has more than one group')
+    return reasons
+
+
+def fast_vectorizer(vectorizer):
+    # The fast engine when it supports the vectorizer's settings, otherwise the vectorizer itself
+    reasons = unsupported_settings(vectorizer)
+    if reasons:
+        logger.info("Fast TF-IDF engine not used: %s", ', '.join(reasons))
+        return vectorizer
+    return FastTfidfVectorizer(vectorizer)
+
+
+class FastTfidfVectorizer:
+
+    def __init__(self, vectorizer):
+        reasons = unsupported_settings(vectorizer)
+        if reasons:
+            raise ValueError(f"Unsupported vectorizer settings: {', '.join(reasons)}")
+        self.vectorizer = vectorizer
+        self._findall = re.compile(vectorizer.token_pattern).findall
+        self._lowercase = vectorizer.lowercase
+        self._stop_words = vectorizer.get_stop_words()
+        self._ngram_range = tuple(vectorizer.ngram_range)
+        self._vocabulary = dict(vectorizer.vocabulary_)
+        self.n_features = len(self._vocabulary)
+        self._idf = np.asarray(vectorizer.idf_, dtype=np.float64) if vectorizer.use_idf else None
+        self._binary = vectorizer.binary
+        self._sublinear_tf = vectorizer.sublinear_tf
+        self._norm = vectorizer.norm
+        self._index_dtype = np.int32 if self.n_features < np.iinfo(np.int32).max else np.int64
+
+    def __getattr__(self, name):
+        # vocabulary_, idf_, get_feature_names_out() and the rest come from the vectorizer.
+        # Unpickling looks attributes up before vectorizer is set.
+        if name == 'vectorizer':
+            raise AttributeError(name)
+        return getattr(self.vectorizer, name)
+
+    def _terms(self, tokens):
+        # CountVectorizer._word_ngrams: stop words dropped, then n-grams of the remaining tokens
+        if self._stop_words is not None:
+            tokens = [w for w in tokens if w not in self._stop_words]
+        min_n, max_n = self._ngram_range
+        if max_n == 1:
+            return tokens
+        terms = list(tokens) if min_n == 1 else []
+        for n in range(max(min_n, 2), min(max_n + 1, len(tokens) + 1)):
+            terms.extend(' '.join(tokens[i:i + n]) for i in range(len(tokens) - n + 1))
+        return terms
+
+    def transform(self, raw_documents):
+        if isinstance(raw_documents, str):
+            raise ValueError("Iterable over raw text documents expected, string object received.")
+        documents = list(raw_documents)
+        if not documents or not all(type(d) is str for d in documents):
+            # Bytes, NaN and empty batches get sklearn's own decoding and errors
+            return self.vectorizer.transform(documents)
+        if self._lowercase:
+            documents = list(map(str.lower, documents))
+        tokens = list(map(self._findall, documents))
+        if self._stop_words is not None or self._ngram_range != (1, 1):
+            tokens = list(map(self._terms, tokens))
+
+        n_rows, n_features = len(documents), self.n_features
+        lengths = np.fromiter(map(len, tokens), dtype=np.int64, count=n_rows)
+        columns = np.fromiter(
+            map(self._vocabulary.get, chain.from_iterable(tokens), repeat(-1)), dtype=np.int64, count=int(lengths.sum())
+        )
+        rows = np.repeat(np.arange(n_rows, dtype=np.int64), lengths)
+        known = columns >= 0
+        columns = columns[known]
+        if self._idf is not None:
+            # Columns high to low within a row, the order of sklearn's product with the IDF diagonal
+            columns = n_features - 1 - columns
+        # One sortable key per (row, column)
+        keys, counts = np.unique(rows[known] * n_features + columns, return_counts=True)
+        row_of = keys // n_features
+        indices = keys % n_features
+        if self._idf is not None:
+            indices = n_features - 1 - indices
+        indices = indices.astype(self._index_dtype)
+        row_nnz = np.bincount(row_of, minlength=n_rows)
+        indptr = np.zeros(n_rows + 1, dtype=self._index_dtype)
+        np.cumsum(row_nnz, out=indptr[1:])
+
+        data = counts.astype(np.float64)
+        if self._binary:
+            data.fill(1)
+        if self._sublinear_tf:
+            np.log(data, data)
+            data += 1
+        if self._idf is not None:
+            data *= self._idf[indices]
+        if self._norm is not None:
+            data /= np.repeat(self._row_norms(data, indptr, row_nnz), row_nnz)
+        return sp.csr_matrix((data, indices, indptr), shape=(n_rows, n_features))
+
+    def _row_norms(self, data, indptr, row_nnz):
+        # Summed left to right per row, as sklearn's inplace_csr_row_normalize_l1/l2 do; numpy's
+        # own reductions sum pairwise and can differ in the last bit
+        values = data * data if self._norm == 'l2' else np.abs(data)
+        if len(values) <= SMALL_BATCH_NNZ:
+            # A request's worth of reviews: plain float additions beat the numpy call overhead
+            flat = values.tolist()
+            sums = []
+            for start, end in zip(indptr[:-1].tolist(), indptr[1:].tolist()):
+                total = 0.0
+                for value in flat[start:end]:
+                    total += value
+                sums.append(total)
+            sums = np.array(sums)
+        else:
+            # One vector addition per position; rows go longest first, so the rows still being
+            # summed at position k are always a prefix
+            order = np.argsort(-row_nnz, kind='stable')
+            remaining = -row_nnz[order]
+            starts = indptr[:-1][order]
+            ordered = np.zeros(len(row_nnz))
+            for k in range(int(-remaining[0])):
+                active = int(np.searchsorted(remaining, -k, side='left'))
+                ordered[:active] += values[starts[:active] + k]
+            sums = np.empty_like(ordered)
+            sums[order] = ordered
+        norms = np.sqrt(sums) if self._norm == 'l2' else sums
+        # All-zero rows are left as they are
+        norms[norms == 0] = 1.0
+        return norms
+
+
+def identical(a, b):
+    # Same shape, layout and bits, not merely equal values
+    return (
+        a.shape == b.shape and a.dtype == b.dtype
+        and np.array_equal(a.indptr, b.indptr) and np.array_equal(a.indices, b.indices)
+        and a.data.tobytes() == b.data.tobytes()
+    )
+
+
+def main():
+    # Checks the engine against the saved vectorizer and times both
+    import joblib
+    import pandas as pd
+    parser = argparse.ArgumentParser(description='Compare the fast TF-IDF engine with the saved vectorizer')
+    parser.add_argument('--vectorizer', default='models/tfidf_vectorizer.pkl')
+    parser.add_argument('--data', default='large_dataset.csv')
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 100, 1000])
+    args = parser.parse_args()
+
+    vectorizer = joblib.load(args.vectorizer)
+    engine = FastTfidfVectorizer(vectorizer)
+    texts = pd.read_csv(args.data)['review_text'].fillna('').tolist()
+    print(f"Bit-identical on {len(texts)} reviews: {identical(engine.transform(texts), vectorizer.transform(texts))}")
+    for size in args.batch_sizes:
+        batches = [texts[i:i + size] for i in range(0, len(texts), size)]
+        timings = {}
+        for name, transform in (('sklearn', vectorizer.transform), ('fast', engine.transform)):
+            started = time.perf_counter()
+            for batch in batches:
+                transform(batch)
+            timings[name] = (time.perf_counter() - started) / len(texts) * 1e6
+        print(f"  batch {size:>5}: sklearn {timings['sklearn']:8.2f} us/review, fast {timings['fast']:8.2f} us/review "
+              f"({timings['sklearn'] / timings['fast']:.1f}x)")
+
+
+if __name__ == '__main__':
+    main()
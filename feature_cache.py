@@ -0,0 +1,121 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import joblib
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.model_selection import train_test_split
+
+LABEL_MAPPING = {'negative': 0, 'neutral': 1, 'positive': 2}
+FEATURE_CACHE_DIR = os.path.join('cache', 'features')
+DEFAULT_VECTORIZER_PARAMS = {'max_features': 5000}
+
+
+def load_dataset(path):
+    # Rows without a sentiment label cannot be used for training
+    df = pd.read_csv(path).dropna(subset=['sentiment'])
+    return df['review_text'].values, df['sentiment'].map(LABEL_MAPPING).to_numpy().astype(np.int64)
+
+
+def split_dataset(X, y, test_size=0.2, random_state=42):
+    return train_test_split(X, y, test_size=test_size, random_state=random_state)
+
+
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def feature_key(data_digest, vectorizer_params, test_size, random_state):
+    # Everything the fitted matrices depend on: the dataset bytes, the vectorizer settings and the split
+    settings = {
+        'data': data_digest,
+        'vectorizer': vectorizer_params,
+        'test_size': test_size,
+        'random_state': random_state,
+        'labels': LABEL_MAPPING
+    }
+    return hashlib.sha256(json.dumps(settings, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+
+
+class FeatureSet:
+    # A fitted TF-IDF vectorizer and the train/test matrices it produced
+    def __init__(self, key, path, vectorizer, X_train, X_test, y_train, y_test, cached):
+        self.key = key
+        self.path = path
+        self.vectorizer = vectorizer
+        self.X_train = X_train
+        self.X_test = X_test
+        self.y_train = y_train
+        self.y_test = y_test
+        # False when this call had to fit the vectorizer
+        self.cached = cached
+
+
+def load_feature_set(path):
+    # Also used by training worker processes, which reopen the cached matrices instead of
+    # receiving them pickled
+    labels = np.load(os.path.join(path, 'labels.npz'))
+    return FeatureSet(
+        os.path.basename(path), path,
+        joblib.load(os.path.join(path, 'vectorizer.pkl')),
+        sp.load_npz(os.path.join(path, 'train.npz')),
+        sp.load_npz(os.path.join(path, 'test.npz')),
+        labels['y_train'], labels['y_test'],
+        cached=True
+    )
+
+
+def _save(path, vectorizer, X_train, X_test, y_train, y_test, settings):
+    # Built in a scratch directory and renamed into place, so concurrent runs never read a partial entry
+    parent = os.path.dirname(path)
+    os.makedirs(parent, exist_ok=True)
+    scratch = tempfile.mkdtemp(dir=parent, prefix='.building-')
+    try:
+        joblib.dump(vectorizer, os.path.join(scratch, 'vectorizer.pkl'))
+        sp.save_npz(os.path.join(scratch, 'train.npz'), X_train, compressed=False)
+        sp.save_npz(os.path.join(scratch, 'test.npz'), X_test, compressed=False)
+        np.savez(os.path.join(scratch, 'labels.npz'), y_train=y_train, y_test=y_test)
+        with open(os.path.join(scratch, 'meta.json'), 'w') as f:
+            json.dump(settings, f, indent=2)
+        os.rename(scratch, path)
+    except OSError:
+        shutil.rmtree(scratch, ignore_errors=True)
+        # Another run finished the same entry first
+        if not os.path.isdir(path):
+            raise
+
+
+def feature_path(data_path, vectorizer_params=None, test_size=0.2, random_state=42, cache_dir=FEATURE_CACHE_DIR):
+    vectorizer_params = dict(vectorizer_params or DEFAULT_VECTORIZER_PARAMS)
+    return os.path.join(cache_dir, feature_key(file_digest(data_path), vectorizer_params, test_size, random_state))
+
+
+def featurize(data_path, vectorizer_params=None, test_size=0.2, random_state=42,
+              cache_dir=FEATURE_CACHE_DIR, refresh=False):
+    # Fits TfidfVectorizer on the training split once per (dataset, settings) and reuses the
+    # matrices on later runs, so a model-only change never re-vectorizes the data
+    vectorizer_params = dict(vectorizer_params or DEFAULT_VECTORIZER_PARAMS)
+    path = feature_path(data_path, vectorizer_params, test_size, random_state, cache_dir)
+    if os.path.isdir(path):
+        if not refresh:
+            return load_feature_set(path)
+        shutil.rmtree(path)
+
+    X, y = load_dataset(data_path)
+    X_train, X_test, y_train, y_test = split_dataset(X, y, test_size, random_state)
+    vectorizer = TfidfVectorizer(**vectorizer_params)
+    train_matrix = vectorizer.fit_transform(X_train)
+    test_matrix = vectorizer.transform(X_test)
+    settings = {'data': os.path.abspath(data_path), 'vectorizer': vectorizer_params,
+                'test_size': test_size, 'random_state': random_state}
+    _save(path, vectorizer, train_matrix, test_matrix, y_train, y_test, settings)
+    return FeatureSet(os.path.basename(path), path, vectorizer, train_matrix, test_matrix, y_train, y_test, cached=False)
@@ -1,6 +1,11 @@
+import argparse
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
 import pandas as pd
-import random
-from datetime import datetime
 
 # Base templates for generating reviews
 positive_templates = [
@@ -104,51 +109,230 @@ positive_features = [
     "premium feel"
 ]
 
-def generate_review():
-    sentiment = random.choice(['positive', 'neutral', 'negative'])
-    
-    if sentiment == 'positive':
-        template = random.choice(positive_templates)
-        phrase = random.choice(positive_phrases)
-        feature = random.choice(positive_features)
-    elif sentiment == 'neutral':
-        template = random.choice(neutral_templates)
-        phrase = random.choice(neutral_phrases)
-        feature = "basic features"
-    else:
-        template = random.choice(negative_templates)
-        phrase = random.choice(negative_phrases)
-        feature = "poor quality"
-    
-    product = random.choice(products)
-    
-    review = template.format(
-        product=product,
-        positive_feature=feature,
-        positive_phrase=phrase,
-        neutral_phrase=phrase,
-        negative_phrase=phrase
-    )
-    
-    return review, sentiment
-
-# Generate 5000 reviews
-reviews = []
-sentiments = []
-
-for _ in range(5000):
-    review, sentiment = generate_review()
-    reviews.append(review)
-    sentiments.append(sentiment)
-
-# Create DataFrame
-df = pd.DataFrame({
-    'review_text': reviews,
-    'sentiment': sentiments
-})
-
-# Save to CSV
-df.to_csv('large_dataset.csv', index=False)
-print(f"Generated dataset with {len(df)} reviews")
-print("\nSentiment distribution:")
-print(df['sentiment'].value_counts()) 
\ No newline at end of file
+# sentiment -> (templates, phrases, features)
+SENTIMENTS = {
+    'positive': (positive_templates, positive_phrases, positive_features),
+    'neutral': (neutral_templates, neutral_phrases, ["basic features"]),
+    'negative': (negative_templates, negative_phrases, ["poor quality"])
+}
+LENGTH_DISTRIBUTIONS = ('fixed', 'poisson', 'geometric')
+
+
+class ReviewTables:
+    # Every template x product x feature x phrase combination rendered once per sentiment, so a
+    # review is an index into a table instead of a str.format call
+
+    def __init__(self):
+        self.labels = np.array(list(SENTIMENTS), dtype=object)
+        self.rendered = []
+        self.phrases = []
+        self.shapes = []
+        for templates, phrases, features in SENTIMENTS.values():
+            rendered = [
+                template.format(product=product, positive_feature=feature, positive_phrase=phrase,
+                                neutral_phrase=phrase, negative_phrase=phrase)
+                for template in templates for product in products for feature in features for phrase in phrases
+            ]
+            self.rendered.append(np.array(rendered, dtype=object))
+            self.phrases.append(np.array(phrases, dtype=object))
+            self.shapes.append((len(templates), len(products), len(features), len(phrases)))
+
+
+def sentence_counts(rng, n, distribution, mean):
+    # Phrases per review, at least one; mean 1 with 'fixed' is the original one-phrase review
+    if distribution == 'fixed':
+        return np.full(n, max(1, round(mean)), dtype=np.int64)
+    if distribution == 'poisson':
+        return 1 + rng.poisson(max(mean - 1, 0), n)
+    return rng.geometric(1 / max(mean, 1), n)
+
+
+def add_typo(text, position, kind):
+    # One character dropped, doubled or swapped with the next one
+    if len(text) < 2:
+        return text
+    i = position % (len(text) - 1)
+    if kind == 0:
+        return text[:i] + text[i + 1:]
+    if kind == 1:
+        return text[:i] + text[i] + text[i:]
+    return text[:i] + text[i + 1] + text[i] + text[i + 2:]
+
+
+def generate_chunk(settings, chunk, rows):
+    # Reviews and labels of one chunk; the random stream depends only on the seed and the chunk
+    # number, so the output is the same whichever process generates it
+    rng = np.random.default_rng(np.random.SeedSequence(settings['seed'], spawn_key=(chunk,)))
+    tables = _tables()
+    classes = rng.choice(len(tables.labels), size=rows, p=settings['balance'])
+    counts = sentence_counts(rng, rows, settings['length_distribution'], settings['mean_sentences'])
+    texts = np.empty(rows, dtype=object)
+
+    for c, (rendered, phrases, shape) in enumerate(zip(tables.rendered, tables.phrases, tables.shapes)):
+        members = np.flatnonzero(classes == c)
+        # One uniform draw per table axis, flattened into an index of the rendered table
+        picks = [rng.integers(0, size, len(members)) for size in shape]
+        texts[members] = rendered[np.ravel_multi_index(picks, shape)]
+        # Longer reviews: more phrases of the same sentiment, appended one position at a time
+        for position in range(1, int(counts[members].max(initial=1))):
+            longer = members[counts[members] > position]
+            texts[longer] = texts[longer] + ' ' + phrases[rng.integers(0, len(phrases), len(longer))]
+
+    # Exact repeats of other reviews in the chunk, like copy-pasted or bot-posted reviews
+    duplicates = np.flatnonzero(rng.random(rows) < settings['duplicate_rate'])
+    if len(duplicates) and len(duplicates) < rows:
+        originals = np.setdiff1d(np.arange(rows), duplicates)
+        sources = originals[rng.integers(0, len(originals), len(duplicates))]
+        texts[duplicates] = texts[sources]
+        classes[duplicates] = classes[sources]
+
+    typos = np.flatnonzero(rng.random(rows) < settings['typo_rate'])
+    positions = rng.integers(0, 1 << 30, len(typos))
+    kinds = rng.integers(0, 3, len(typos))
+    for row, position, kind in zip(typos, positions, kinds):
+        texts[row] = add_typo(texts[row], position, kind)
+
+    # Labels replaced by a random sentiment, which may be the right one again
+    flipped = np.flatnonzero(rng.random(rows) < settings['label_noise'])
+    classes[flipped] = rng.integers(0, len(tables.labels), len(flipped))
+
+    return pd.DataFrame({'review_text': texts, 'sentiment': tables.labels[classes]})
+
+
+_cached_tables = None
+
+
+def _tables():
+    # Built once per process
+    global _cached_tables
+    if _cached_tables is None:
+        _cached_tables = ReviewTables()
+    return _cached_tables
+
+
+def produce_chunk(settings, chunk, rows, csv):
+    # (chunk for Output.write, reviews per sentiment); CSV is formatted in the worker, so the
+    # writing process only copies bytes
+    df = generate_chunk(settings, chunk, rows)
+    counts = df['sentiment'].value_counts()
+    return (df.to_csv(index=False, header=False) if csv else df), counts
+
+
+class Output:
+    # CSV, or Parquet for a .parquet path, appended one chunk at a time under a temporary name
+
+    def __init__(self, path):
+        self.path = path
+        self.parquet = path.endswith('.parquet')
+        self.scratch = path + '.tmp'
+        self._writer = None
+        if self.parquet:
+            self._file = None
+        else:
+            self._file = open(self.scratch, 'w', newline='', encoding='utf-8')
+            self._file.write('review_text,sentiment\n')
+
+    def write(self, chunk):
+        if not self.parquet:
+            self._file.write(chunk)
+            return
+        # Imported here: Parquet output is optional
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        table = pa.Table.from_pandas(chunk, preserve_index=False)
+        if self._writer is None:
+            self._writer = pq.ParquetWriter(self.scratch, table.schema)
+        self._writer.write_table(table)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+        if self._file is not None:
+            self._file.close()
+        os.replace(self.scratch, self.path)
+
+
+def chunk_sizes(rows, chunk_rows):
+    return [min(chunk_rows, rows - start) for start in range(0, rows, chunk_rows)]
+
+
+def generate(path, settings, rows, chunk_rows, workers):
+    # Chunks are generated in parallel and written in order, with at most two per worker in
+    # memory, so memory stays flat however many rows are written
+    output = Output(path)
+    pool = ProcessPoolExecutor(workers) if workers > 1 else None
+    pending = deque()
+    totals = pd.Series(0, index=list(SENTIMENTS))
+
+    def write_next():
+        result = pending.popleft()
+        chunk, counts = result.result() if pool else result
+        output.write(chunk)
+        totals.update(totals.add(counts, fill_value=0))
+
+    try:
+        for chunk, size in enumerate(chunk_sizes(rows, chunk_rows)):
+            args = (settings, chunk, size, not output.parquet)
+            pending.append(pool.submit(produce_chunk, *args) if pool else produce_chunk(*args))
+            if len(pending) >= max(1, workers) * 2:
+                write_next()
+        while pending:
+            write_next()
+        output.close()
+    except BaseException:
+        if os.path.exists(output.scratch):
+            os.remove(output.scratch)
+        raise
+    finally:
+        if pool:
+            pool.shutdown(cancel_futures=True)
+    return totals.astype(np.int64)
+
+
+def parse_balance(value):
+    weights = np.array([float(w) for w in value.split(':')])
+    if len(weights) != len(SENTIMENTS) or (weights < 0).any() or weights.sum() == 0:
+        raise argparse.ArgumentTypeError(f"expected {len(SENTIMENTS)} non-negative weights like 1:1:1")
+    return weights / weights.sum()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate a synthetic review dataset')
+    parser.add_argument('--rows', type=int, default=5000)
+    parser.add_argument('--output', default='large_dataset.csv', help='CSV, or Parquet for a .parquet path')
+    parser.add_argument('--seed', type=int, help='Same seed and chunk size, same dataset (default: random)')
+    parser.add_argument('--balance', type=parse_balance, default='1:1:1',
+                        help='Relative weights of ' + ':'.join(SENTIMENTS))
+    parser.add_argument('--duplicate-rate', type=float, default=0.0,
+                        help='Share of reviews that repeat another review of their chunk word for word')
+    parser.add_argument('--typo-rate', type=float, default=0.0, help='Share of reviews with one character typo')
+    parser.add_argument('--label-noise', type=float, default=0.0,
+                        help='Share of reviews whose sentiment is replaced by a random one')
+    parser.add_argument('--length-distribution', choices=LENGTH_DISTRIBUTIONS, default='fixed',
+                        help='Distribution of the number of phrases per review')
+    parser.add_argument('--mean-sentences', type=float, default=1.0, help='Mean phrases per review')
+    parser.add_argument('--chunk-rows', type=int, default=100000)
+    parser.add_argument('--workers', type=int, default=1)
+    args = parser.parse_args()
+
+    seed = args.seed if args.seed is not None else int(np.random.SeedSequence().entropy % (1 << 63))
+    settings = {
+        'seed': seed,
+        'balance': args.balance,
+        'duplicate_rate': args.duplicate_rate,
+        'typo_rate': args.typo_rate,
+        'label_noise': args.label_noise,
+        'length_distribution': args.length_distribution,
+        'mean_sentences': args.mean_sentences
+    }
+    started = time.perf_counter()
+    distribution = generate(args.output, settings, args.rows, args.chunk_rows, args.workers)
+    seconds = time.perf_counter() - started
+    print(f"Generated dataset with {args.rows} reviews in {args.output} "
+          f"({seconds:.1f}s, {args.rows / max(seconds, 1e-9):.0f} rows/s, seed {seed})")
+    print("\nSentiment distribution:")
+    print(distribution.sort_values(ascending=False).to_string())
+
+
+if __name__ == '__main__':
+    main()
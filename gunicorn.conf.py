@@ -0,0 +1,25 @@
+import gc
+import os
+
+wsgi_app = 'app:app'
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('GUNICORN_WORKERS', '4'))
+# Request threads per worker. Above 1 the workers run gthread, and with MICRO_BATCH_ENABLED the
+# threads' concurrent /analyze calls are scored together in one batched model call
+threads = int(os.environ.get('GUNICORN_THREADS', '1'))
+if threads > 1:
+    worker_class = 'gthread'
+
+# Import the app (and load the models) once in the master; workers are forked from it and
+# share the model pages copy-on-write instead of each unpickling its own copy
+preload_app = True
+
+
+def when_ready(server):
+    # Keep the collector from touching the preloaded objects, which would copy their pages
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    from app import init_worker
+    init_worker()
@@ -0,0 +1,74 @@
+import numpy as np
+
+import metrics
+from lstm_serving import LABELS as LSTM_LABELS
+
+# Class label the models were trained to treat as a genuine review
+REAL_LABEL = 1
+# Predictions as the app returns and stores them
+PREDICTION_LABELS = ('Fake', 'Real')
+
+
+def label_name(is_real):
+    return PREDICTION_LABELS[1] if is_real else PREDICTION_LABELS[0]
+
+
+def labels_from_proba(proba, classes):
+    # The label is the argmax and its confidence the max of the same probabilities
+    best = proba.argmax(axis=1)
+    is_real = classes[best] == REAL_LABEL
+    confidence = proba[np.arange(proba.shape[0]), best]
+    return is_real, confidence
+
+
+def labels_and_confidence(model, features):
+    # A single predict_proba call gives both the label and its confidence,
+    # so there is no need for a second predict() pass over the same matrix
+    return labels_from_proba(model.predict_proba(features), model.classes_)
+
+
+def score_batch(texts, vectorizer, svm_model, lr_model, scorer=None, lstm=None):
+    if not texts:
+        return []
+
+    # One sparse TF-IDF matrix for the whole request
+    with metrics.span('vectorize'):
+        features = vectorizer.transform(texts)
+
+    if scorer is not None:
+        # Fused scorer: one matrix multiply yields both models' probabilities
+        with metrics.span('ensemble'):
+            proba = scorer.predict_proba(features)
+            svm_real, svm_conf = labels_from_proba(proba['svm'], scorer.classes('svm'))
+            lr_real, lr_conf = labels_from_proba(proba['lr'], scorer.classes('lr'))
+    else:
+        with metrics.span('svm'):
+            svm_real, svm_conf = labels_and_confidence(svm_model, features)
+        with metrics.span('lr'):
+            lr_real, lr_conf = labels_and_confidence(lr_model, features)
+
+    if lstm is not None:
+        # Sentiment rather than a fake/real vote, so it rides along next to the vote;
+        # one bucketed forward pass covers the whole batch
+        with metrics.span('lstm'):
+            lstm_classes, lstm_conf = lstm.predict(texts)
+
+    with metrics.span('vote'):
+        # Majority vote over the two models, ties go to 'Real'
+        votes = svm_real.astype(np.int8) + lr_real.astype(np.int8)
+        final_real = votes >= 1
+        confidence = (svm_conf * 100 + lr_conf * 100) / 2
+
+        results = []
+        for i in range(len(texts)):
+            results.append({
+                'prediction': label_name(final_real[i]),
+                'accuracy': float(confidence[i]),
+                'svm_prediction': label_name(svm_real[i]),
+                'lr_prediction': label_name(lr_real[i])
+            })
+            if lstm is not None:
+                results[i]['lstm_prediction'] = LSTM_LABELS[int(lstm_classes[i])]
+                results[i]['lstm_confidence'] = float(lstm_conf[i] * 100)
+    metrics.REVIEWS.inc(amount=len(texts))
+    return results
@@ -0,0 +1,481 @@
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+from scipy.special import expit, softmax
+
+from cache import model_version_from_files
+
+# CPU serving for the LSTM. Reviews are tokenized through a cache of integer sequences, grouped
+# into buckets of similar length, padded only to their bucket and run through the network a
+# batch at a time. The network is either the trained framework model (models/lstm_model.py) or
+# a NumPy re-implementation of its forward pass exported from the trained weights into
+# models/lstm_numpy, which serves without TensorFlow installed.
+NUMPY_DIR = 'lstm_numpy'
+MANIFEST_FILE = 'manifest.json'
+TOKENIZER_FILE = 'tokenizer.json'
+FORMAT_VERSION = 1
+# Classes the LSTM is trained on (feature_cache.LABEL_MAPPING, inverted)
+LABELS = {0: 'negative', 1: 'neutral', 2: 'positive'}
+# keras.preprocessing.text.Tokenizer defaults
+KERAS_FILTERS = '!"#$%&()*+,-./:;<=>?@[\\]^_`{|}~\t\n'
+
+
+def lstm_paths(model_dir):
+    return [os.path.join(model_dir, 'lstm_model'), os.path.join(model_dir, 'lstm_tokenizer.json')]
+
+
+# --- Tokenization ---
+
+class Tokenizer:
+    # texts_to_sequences() of a Keras Tokenizer, read from its to_json() file without importing Keras
+
+    def __init__(self, word_index, num_words=None, oov_token=None, filters=KERAS_FILTERS,
+                 lower=True, split=' ', char_level=False):
+        self.word_index = word_index
+        self.num_words = num_words
+        self.lower = lower
+        self.split = split
+        self.char_level = char_level
+        self._oov = word_index.get(oov_token) if oov_token is not None else None
+        self._filters = str.maketrans({c: split for c in filters})
+
+    @classmethod
+    def from_json(cls, path):
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        config = data.get('config', data)
+        word_index = config['word_index']
+        # to_json() stores the index as a JSON string inside the JSON
+        if isinstance(word_index, str):
+            word_index = json.loads(word_index)
+        return cls(word_index, config.get('num_words'), config.get('oov_token'), config.get('filters', KERAS_FILTERS),
+                   config.get('lower', True), config.get('split', ' '), config.get('char_level', False))
+
+    def sequence(self, text):
+        if self.lower:
+            text = text.lower()
+        if self.char_level:
+            words = text
+        else:
+            words = [w for w in text.translate(self._filters).split(self.split) if w]
+        ids = []
+        for word in words:
+            index = self.word_index.get(word)
+            if index is not None and not (self.num_words and index >= self.num_words):
+                ids.append(index)
+            elif self._oov is not None:
+                ids.append(self._oov)
+        return ids
+
+
+class TokenCache:
+    # Templated reviews repeat constantly; their integer sequences are kept instead of re-tokenized
+
+    def __init__(self, tokenizer, max_entries):
+        self.tokenizer = tokenizer
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def sequences(self, texts):
+        found = []
+        with self._lock:
+            for text in texts:
+                ids = self._entries.get(text)
+                if ids is not None:
+                    self._entries.move_to_end(text)
+                found.append(ids)
+        missing = {text: np.asarray(self.tokenizer.sequence(text), dtype=np.int32)
+                   for text, ids in zip(texts, found) if ids is None}
+        with self._lock:
+            self.hits += len(texts) - sum(ids is None for ids in found)
+            self.misses += sum(ids is None for ids in found)
+            for text, ids in missing.items():
+                self._entries[text] = ids
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return [ids if ids is not None else missing[text] for text, ids in zip(texts, found)]
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses}
+
+
+def pad(sequences, length, maxlen, padding='pre', truncating='pre'):
+    # keras pad_sequences() with value 0, except that rows are padded to length (<= maxlen)
+    batch = np.zeros((len(sequences), length), dtype=np.int32)
+    for row, ids in enumerate(sequences):
+        if len(ids) > maxlen:
+            ids = ids[-maxlen:] if truncating == 'pre' else ids[:maxlen]
+        if len(ids):
+            if padding == 'pre':
+                batch[row, length - len(ids):] = ids
+            else:
+                batch[row, :len(ids)] = ids
+    return batch
+
+
+def bucket_lengths(sequences, maxlen, step):
+    # Each row's sequence length rounded up to a multiple of step
+    lengths = np.fromiter((min(len(ids), maxlen) for ids in sequences), dtype=np.int64, count=len(sequences))
+    return np.minimum(maxlen, np.maximum(1, -(-lengths // step)) * step)
+
+
+# --- NumPy forward pass ---
+
+def _hard_sigmoid(x):
+    return np.clip(0.2 * x + 0.5, 0.0, 1.0)
+
+
+ACTIVATIONS = {
+    'sigmoid': expit,
+    'hard_sigmoid': _hard_sigmoid,
+    'tanh': np.tanh,
+    'relu': lambda x: np.maximum(x, 0),
+    'linear': lambda x: x,
+    'softmax': lambda x: softmax(x, axis=-1)
+}
+
+MERGE = {
+    'concat': lambda a, b: np.concatenate([a, b], axis=-1),
+    'sum': lambda a, b: a + b,
+    'ave': lambda a, b: (a + b) / 2,
+    'mul': lambda a, b: a * b
+}
+
+
+def lstm_states(spec, arrays, x, mask=None, h=None, c=None):
+    # Keras LSTM over x (rows, steps, features), gates in i, f, c, o order. Masked steps keep the
+    # previous state. Returns the hidden states at every step (rows, steps, units) and the final (h, c).
+    kernel, recurrent, bias = (arrays[name] for name in spec['arrays'])
+    units = spec['units']
+    act, rec_act = ACTIVATIONS[spec['activation']], ACTIVATIONS[spec['recurrent_activation']]
+    rows, steps = x.shape[:2]
+    if h is None:
+        h = np.zeros((rows, units), dtype=x.dtype)
+        c = np.zeros((rows, units), dtype=x.dtype)
+    # The input projection of every step in one matrix multiply; only h @ recurrent is sequential
+    projected = (x.reshape(rows * steps, -1) @ kernel + bias).reshape(rows, steps, 4 * units)
+    outputs = np.empty((rows, steps, units), dtype=x.dtype)
+    for t in range(steps):
+        z = projected[:, t] + h @ recurrent
+        i = rec_act(z[:, :units])
+        f = rec_act(z[:, units:2 * units])
+        c_next = f * c + i * act(z[:, 2 * units:3 * units])
+        h_next = rec_act(z[:, 3 * units:]) * act(c_next)
+        if mask is not None:
+            keep = mask[:, t:t + 1]
+            h_next = np.where(keep, h_next, h)
+            c_next = np.where(keep, c_next, c)
+        h, c = h_next, c_next
+        outputs[:, t] = h
+    return outputs, h, c
+
+
+class NumpyLSTM:
+    # Embedding -> (Bidirectional) LSTM layers -> Dense layers, from the exported weights
+
+    def __init__(self, manifest, arrays, tokenizer, token_cache_size=50000, batch_size=256, bucket_step=8):
+        self.layers = manifest['layers']
+        self.arrays = arrays
+        self.maxlen = manifest['maxlen']
+        self.padding = manifest['padding']
+        self.truncating = manifest['truncating']
+        self.classes = np.asarray(manifest['classes'])
+        self.batch_size = batch_size
+        self.tokens = TokenCache(tokenizer, token_cache_size)
+
+        self.masked = any(layer['kind'] == 'embedding' and layer['mask_zero'] for layer in self.layers)
+        recurrent = [layer for layer in self.layers if layer['kind'] in ('lstm', 'bidirectional')]
+        # Shorter padding only changes nothing when padded steps are skipped (masking) or all come
+        # first and run from a known state: without a mask, pre-padding feeds the same pad token
+        # through a unidirectional stack, so the state after k pad steps is the same for every
+        # review and is computed once here
+        self._prefix = None
+        if self.masked:
+            self.bucket_step = bucket_step
+        elif self.padding == 'pre' and all(layer['kind'] == 'lstm' for layer in recurrent):
+            self.bucket_step = bucket_step
+            self._prefix = self._pad_prefix_states()
+        else:
+            self.bucket_step = self.maxlen
+
+    def _pad_prefix_states(self):
+        # [(h, c) of every LSTM layer after k pad steps, k = 0..maxlen], from one all-pad review
+        x = self.arrays[self.layers[0]['arrays'][0]][np.zeros((1, self.maxlen), dtype=np.int64)]
+        states = []
+        for layer in self.layers[1:]:
+            if layer['kind'] == 'dense':
+                x = ACTIVATIONS[layer['activation']](x @ self.arrays[layer['arrays'][0]] + self.arrays[layer['arrays'][1]])
+                continue
+            hs, cs = [np.zeros((1, layer['units']), dtype=x.dtype)], [np.zeros((1, layer['units']), dtype=x.dtype)]
+            for t in range(self.maxlen):
+                _, h, c = self._lstm(layer, x[:, t:t + 1], None, hs[-1], cs[-1])
+                hs.append(h)
+                cs.append(c)
+            states.append((np.concatenate(hs), np.concatenate(cs)))
+            if not layer['return_sequences']:
+                break
+            x = np.concatenate(hs[1:])[np.newaxis]
+        return states
+
+    def _lstm(self, layer, x, mask=None, h=None, c=None):
+        return lstm_states(layer, self.arrays, x, mask, h, c)
+
+    def forward(self, ids):
+        # Class probabilities for a padded batch of token ids (rows, steps)
+        steps = ids.shape[1]
+        mask = None
+        x = None
+        recurrent_index = 0
+        for layer in self.layers:
+            kind = layer['kind']
+            if kind == 'embedding':
+                x = self.arrays[layer['arrays'][0]][ids]
+                if layer['mask_zero']:
+                    mask = ids != 0
+            elif kind == 'lstm':
+                h = c = None
+                if self._prefix is not None:
+                    hs, cs = self._prefix[recurrent_index]
+                    skipped = self.maxlen - steps
+                    h = np.repeat(hs[skipped:skipped + 1], len(ids), axis=0)
+                    c = np.repeat(cs[skipped:skipped + 1], len(ids), axis=0)
+                outputs, h, _ = self._lstm(layer, x, mask, h, c)
+                x = outputs if layer['return_sequences'] else h
+                recurrent_index += 1
+            elif kind == 'bidirectional':
+                forward, backward = layer['forward'], layer['backward']
+                f_out, f_h, _ = self._lstm(forward, x, mask)
+                reversed_mask = mask[:, ::-1] if mask is not None else None
+                b_out, b_h, _ = self._lstm(backward, x[:, ::-1], reversed_mask)
+                merge = MERGE[layer['merge_mode']]
+                x = merge(f_out, b_out[:, ::-1]) if forward['return_sequences'] else merge(f_h, b_h)
+            elif kind == 'dense':
+                kernel, bias = (self.arrays[name] for name in layer['arrays'])
+                x = ACTIVATIONS[layer['activation']](x @ kernel + bias)
+            if x.ndim == 2:
+                mask = None
+        if x.shape[1] == 1:
+            # A single sigmoid unit: probability of the second class
+            x = np.hstack([1 - x, x])
+        return x
+
+    def predict_proba(self, texts):
+        sequences = self.tokens.sequences(texts)
+        lengths = bucket_lengths(sequences, self.maxlen, self.bucket_step)
+        proba = np.empty((len(texts), len(self.classes)))
+        for length in np.unique(lengths):
+            rows = np.flatnonzero(lengths == length)
+            for start in range(0, len(rows), self.batch_size):
+                chunk = rows[start:start + self.batch_size]
+                ids = pad([sequences[i] for i in chunk], int(length), self.maxlen, self.padding, self.truncating)
+                proba[chunk] = self.forward(ids)
+        return proba
+
+    def predict(self, texts):
+        # Same contract as LSTMModel.predict: (class per review, its probability)
+        if not texts:
+            return np.empty(0, dtype=self.classes.dtype), np.empty(0)
+        proba = self.predict_proba(texts)
+        best = proba.argmax(axis=1)
+        return self.classes[best], proba[np.arange(len(texts)), best]
+
+
+class FrameworkLSTM:
+    # The trained framework model, called once per batch of reviews rather than once per review
+
+    def __init__(self, model, batch_size=256):
+        self.model = model
+        self.batch_size = batch_size
+
+    def predict(self, texts):
+        classes, confidence = [], []
+        for start in range(0, len(texts), self.batch_size):
+            batch_classes, batch_confidence = self.model.predict(list(texts[start:start + self.batch_size]))
+            classes.extend(np.ravel(batch_classes))
+            confidence.extend(np.ravel(batch_confidence))
+        return np.asarray(classes), np.asarray(confidence, dtype=np.float64)
+
+
+# --- Export ---
+
+def _lstm_spec(layer, name, arrays):
+    config = layer.get_config()
+    if config.get('stateful') or config.get('time_major'):
+        raise ValueError(f"Cannot export a stateful or time-major LSTM ({layer.name})")
+    weights = layer.get_weights()
+    units = config['units']
+    kernel, recurrent = weights[0], weights[1]
+    bias = weights[2] if len(weights) > 2 else np.zeros(4 * units, dtype=kernel.dtype)
+    arrays.update({f'{name}_kernel': kernel, f'{name}_recurrent': recurrent, f'{name}_bias': bias})
+    return {
+        'kind': 'lstm',
+        'units': units,
+        'activation': config.get('activation', 'tanh'),
+        'recurrent_activation': config.get('recurrent_activation', 'sigmoid'),
+        'return_sequences': config.get('return_sequences', False),
+        'arrays': [f'{name}_kernel', f'{name}_recurrent', f'{name}_bias']
+    }
+
+
+def export_layers(keras_model):
+    # (layer specs, arrays) for the layers NumpyLSTM implements; anything else is refused
+    layers, arrays = [], {}
+    for layer in keras_model.layers:
+        kind = type(layer).__name__
+        name = f'layer{len(layers)}'
+        config = layer.get_config()
+        if kind in ('InputLayer', 'Dropout', 'SpatialDropout1D'):
+            # Identity at inference
+            continue
+        if kind == 'Embedding':
+            arrays[f'{name}_embeddings'] = layer.get_weights()[0]
+            layers.append({'kind': 'embedding', 'mask_zero': config.get('mask_zero', False),
+                           'arrays': [f'{name}_embeddings']})
+        elif kind == 'LSTM':
+            if config.get('go_backwards'):
+                raise ValueError(f"Cannot export a go_backwards LSTM outside Bidirectional ({layer.name})")
+            layers.append(_lstm_spec(layer, name, arrays))
+        elif kind == 'Bidirectional' and type(layer.forward_layer).__name__ == 'LSTM':
+            layers.append({
+                'kind': 'bidirectional',
+                'merge_mode': config.get('merge_mode', 'concat'),
+                'forward': _lstm_spec(layer.forward_layer, f'{name}_forward', arrays),
+                'backward': _lstm_spec(layer.backward_layer, f'{name}_backward', arrays)
+            })
+        elif kind == 'Dense':
+            weights = layer.get_weights()
+            bias = weights[1] if len(weights) > 1 else np.zeros(weights[0].shape[1], dtype=weights[0].dtype)
+            arrays.update({f'{name}_kernel': weights[0], f'{name}_bias': bias})
+            layers.append({'kind': 'dense', 'activation': config.get('activation', 'linear'),
+                           'arrays': [f'{name}_kernel', f'{name}_bias']})
+        else:
+            raise ValueError(f"No NumPy forward pass for a {kind} layer ({layer.name})")
+    if not layers or layers[0]['kind'] != 'embedding':
+        raise ValueError("The network must start with an Embedding layer")
+    return layers, arrays
+
+
+def _load_framework_model(model_dir):
+    # Imported here: TensorFlow is heavy and only export and the framework engine need it
+    from models.lstm_model import LSTMModel
+    return LSTMModel.load(*lstm_paths(model_dir))
+
+
+def export_numpy(model_dir, lstm_model=None):
+    # Written to model_dir/lstm_numpy next to a copy of the tokenizer, replacing it atomically
+    if lstm_model is None:
+        lstm_model = _load_framework_model(model_dir)
+    keras_model = getattr(lstm_model, 'model', lstm_model)
+    layers, arrays = export_layers(keras_model)
+    maxlen = next((getattr(lstm_model, attr) for attr in ('max_length', 'maxlen', 'max_len')
+                   if getattr(lstm_model, attr, None)), None) or keras_model.input_shape[1]
+    manifest = {
+        'format': FORMAT_VERSION,
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'source_version': model_version_from_files(lstm_paths(model_dir)),
+        'maxlen': int(maxlen),
+        'padding': getattr(lstm_model, 'padding', 'pre'),
+        'truncating': getattr(lstm_model, 'truncating', 'pre'),
+        # One output unit is a sigmoid over two classes
+        'classes': list(range(max(2, arrays[layers[-1]['arrays'][0]].shape[-1]))),
+        'layers': layers,
+        'arrays': sorted(arrays)
+    }
+
+    target = os.path.join(model_dir, NUMPY_DIR)
+    scratch = tempfile.mkdtemp(dir=model_dir, prefix='.lstm-numpy-')
+    try:
+        os.chmod(scratch, 0o755)
+        for name, value in arrays.items():
+            np.save(os.path.join(scratch, f'{name}.npy'), np.ascontiguousarray(value, dtype=np.float32))
+        shutil.copyfile(lstm_paths(model_dir)[1], os.path.join(scratch, TOKENIZER_FILE))
+        # Manifest last: a directory without one is never loaded
+        with open(os.path.join(scratch, MANIFEST_FILE), 'w') as f:
+            json.dump(manifest, f, indent=2)
+        if os.path.isdir(target):
+            old = f'{scratch}.old'
+            os.rename(target, old)
+            os.rename(scratch, target)
+            shutil.rmtree(old)
+        else:
+            os.rename(scratch, target)
+    except BaseException:
+        shutil.rmtree(scratch, ignore_errors=True)
+        raise
+    return target
+
+
+def read_manifest(directory):
+    with open(os.path.join(directory, MANIFEST_FILE)) as f:
+        manifest = json.load(f)
+    if manifest.get('format') != FORMAT_VERSION:
+        raise ValueError(f"Unsupported LSTM export format: {manifest.get('format')}")
+    return manifest
+
+
+def load_numpy_lstm(directory, token_cache_size=50000, batch_size=256, bucket_step=8):
+    manifest = read_manifest(directory)
+    arrays = {name: np.load(os.path.join(directory, f'{name}.npy'), mmap_mode='r') for name in manifest['arrays']}
+    tokenizer = Tokenizer.from_json(os.path.join(directory, TOKENIZER_FILE))
+    return NumpyLSTM(manifest, arrays, tokenizer, token_cache_size, batch_size, bucket_step)
+
+
+def numpy_is_current(model_dir):
+    # True when the export exists and the framework model is absent or unchanged since it was made
+    try:
+        manifest = read_manifest(os.path.join(model_dir, NUMPY_DIR))
+    except (OSError, ValueError):
+        return False
+    if not any(os.path.exists(path) for path in lstm_paths(model_dir)):
+        return True
+    return manifest.get('source_version') == model_version_from_files(lstm_paths(model_dir))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export the LSTM to a NumPy forward pass and compare serving paths')
+    parser.add_argument('--model-dir', default='models')
+    parser.add_argument('--data', default='large_dataset.csv', help='Reviews used to compare and time the paths')
+    parser.add_argument('--rows', type=int, default=1000)
+    parser.add_argument('--batch-size', type=int, default=256)
+    args = parser.parse_args()
+
+    import pandas as pd
+    texts = pd.read_csv(args.data, nrows=args.rows)['review_text'].fillna('').tolist()
+    lstm_model = _load_framework_model(args.model_dir)
+    target = export_numpy(args.model_dir, lstm_model)
+    print(f"NumPy LSTM written to {target}")
+
+    numpy_lstm = load_numpy_lstm(target, batch_size=args.batch_size)
+    timings = {}
+    started = time.perf_counter()
+    reference = [lstm_model.predict([text]) for text in texts]
+    timings['framework, one review per call'] = time.perf_counter() - started
+    started = time.perf_counter()
+    FrameworkLSTM(lstm_model, args.batch_size).predict(texts)
+    timings['framework, batched'] = time.perf_counter() - started
+    started = time.perf_counter()
+    classes, confidence = numpy_lstm.predict(texts)
+    timings['numpy, batched'] = time.perf_counter() - started
+
+    reference_classes = np.array([np.ravel(c)[0] for c, _ in reference])
+    reference_confidence = np.array([np.ravel(p)[0] for _, p in reference], dtype=np.float64)
+    print(f"NumPy against the framework over {len(texts)} reviews: classes agree on "
+          f"{np.mean(classes == reference_classes):.2%}, confidence differs by at most "
+          f"{np.abs(confidence - reference_confidence).max():.2e}")
+    for name, seconds in timings.items():
+        print(f"  {name:<32} {seconds / len(texts) * 1000:8.3f} ms per review")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,180 @@
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import joblib
+
+from compact_model import COMPACT_DIR, compact_is_current, load_compact_scorer, load_compact_vectorizer
+from ensemble import ENSEMBLE_FILE, load_scorer, source_paths
+from fast_tfidf import fast_vectorizer
+from lstm_serving import NUMPY_DIR, FrameworkLSTM, load_numpy_lstm, lstm_paths, numpy_is_current
+
+logger = logging.getLogger(__name__)
+
+
+class Artifact:
+    def __init__(self, name, loader, required=True):
+        self.name = name
+        self.loader = loader
+        self.required = required
+        self.value = None
+        self.status = 'pending'
+        self.error = None
+        self.seconds = None
+
+
+class ModelRegistry:
+    # Loads every model artifact once, in parallel, and records how long each one took.
+    # Nothing here is tied to a request, so the gunicorn master can load the registry
+    # before forking and every worker shares the result.
+
+    def __init__(self, workers=4):
+        self.workers = workers
+        self._artifacts = {}
+        self._lock = threading.Lock()
+        self._loaded = threading.Event()
+        self._loading_pid = None
+        self.load_seconds = None
+        # 'pickle' or 'compact', set by create_registry
+        self.format = None
+
+    def register(self, name, loader, required=True):
+        self._artifacts[name] = Artifact(name, loader, required)
+
+    def get(self, name):
+        # None for artifacts that are not loaded or not part of this configuration
+        artifact = self._artifacts.get(name)
+        return artifact.value if artifact else None
+
+    def _load_one(self, artifact):
+        start = time.perf_counter()
+        try:
+            artifact.value = artifact.loader()
+            artifact.status = 'loaded'
+        except (FileNotFoundError, ImportError) as e:
+            artifact.status = 'missing'
+            artifact.error = str(e)
+        except Exception as e:
+            artifact.status = 'error'
+            artifact.error = str(e)
+        artifact.seconds = time.perf_counter() - start
+
+    def load_all(self):
+        with self._lock:
+            # Also true in a worker forked after the master finished loading
+            if self._loaded.is_set() or self._loading_pid == os.getpid():
+                return
+            self._loading_pid = os.getpid()
+        start = time.perf_counter()
+        # Unpickling holds the GIL, but threads still overlap the disk reads and
+        # the native parts of each load
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='model-load') as pool:
+            list(pool.map(self._load_one, self._artifacts.values()))
+        self.load_seconds = time.perf_counter() - start
+        self._loaded.set()
+        self.log_timings()
+
+    def load_in_background(self):
+        # Fast-start mode: the process serves /healthz immediately and /readyz flips once loaded
+        with self._lock:
+            if self._loaded.is_set() or self._loading_pid == os.getpid():
+                return
+        threading.Thread(target=self.load_all, name='model-registry', daemon=True).start()
+
+    @property
+    def loaded(self):
+        return self._loaded.is_set()
+
+    @property
+    def ready(self):
+        return self.loaded and all(
+            a.status == 'loaded' for a in self._artifacts.values() if a.required
+        )
+
+    def timings(self):
+        return {
+            'format': self.format,
+            'total_seconds': self.load_seconds,
+            'artifacts': {
+                name: {
+                    'status': a.status,
+                    'required': a.required,
+                    'seconds': a.seconds,
+                    'error': a.error
+                }
+                for name, a in self._artifacts.items()
+            }
+        }
+
+    def log_timings(self):
+        logger.info("Model artifacts loaded in %.3fs:", self.load_seconds)
+        for name, a in self._artifacts.items():
+            line = f"  {name}: {a.status} ({a.seconds:.3f}s)"
+            if a.error:
+                line += f" - {a.error}"
+            logger.info(line)
+
+
+def load_pickle(path, mmap=True):
+    # mmap_mode maps the numpy arrays inside the pickle straight from the page cache,
+    # so processes loading the same file share those pages
+    return joblib.load(path, mmap_mode='r' if mmap else None)
+
+
+def load_lstm(config):
+    # Both paths batch reviews; the NumPy export also skips importing the framework entirely
+    model_dir = config.MODEL_DIR
+    if config.LSTM_ENGINE == 'numpy' or (config.LSTM_ENGINE == 'auto' and numpy_is_current(model_dir)):
+        return load_numpy_lstm(
+            os.path.join(model_dir, NUMPY_DIR), config.LSTM_TOKEN_CACHE_SIZE, config.LSTM_BATCH_SIZE,
+            config.LSTM_BUCKET_STEP
+        )
+    # Imported here: the LSTM stack is optional and heavy
+    from models.lstm_model import LSTMModel
+    return FrameworkLSTM(LSTMModel.load(*lstm_paths(model_dir)), config.LSTM_BATCH_SIZE)
+
+
+def load_ensemble(model_dir):
+    # Refuses an export whose source pickles have since been retrained
+    return load_scorer(os.path.join(model_dir, ENSEMBLE_FILE), source_paths(model_dir))
+
+
+def use_compact(config):
+    if config.MODEL_FORMAT == 'compact':
+        return True
+    if config.MODEL_FORMAT == 'pickle':
+        return False
+    return compact_is_current(config.MODEL_DIR)
+
+
+def create_registry(config):
+    registry = ModelRegistry(workers=config.MODEL_LOAD_WORKERS)
+    model_dir = config.MODEL_DIR
+    mmap = config.MODEL_MMAP
+    # Same output, bit for bit; vectorizers the fast engine cannot reproduce are served as they are
+    serve_vectorizer = fast_vectorizer if config.FAST_TFIDF else (lambda vectorizer: vectorizer)
+    registry.register('lstm', lambda: load_lstm(config), required=False)
+
+    if use_compact(config):
+        # Serving only needs the vectorizer and the fused scorer; the sklearn pickles are never read
+        compact_dir = os.path.join(model_dir, COMPACT_DIR)
+        registry.format = 'compact'
+        registry.register('vectorizer', lambda: serve_vectorizer(load_compact_vectorizer(compact_dir)))
+        registry.register('ensemble', lambda: load_compact_scorer(compact_dir))
+        return registry
+
+    registry.format = 'pickle'
+    # Unpickling imports the estimators' modules; importing them up front keeps the loader
+    # threads from tripping Python's import deadlock detection on each other's module locks
+    import sklearn.calibration, sklearn.feature_extraction.text, sklearn.linear_model, sklearn.svm  # noqa: F401
+    registry.register(
+        'vectorizer', lambda: serve_vectorizer(load_pickle(os.path.join(model_dir, 'tfidf_vectorizer.pkl'), mmap))
+    )
+    registry.register('svm', lambda: load_pickle(os.path.join(model_dir, 'svm_model.pkl'), mmap))
+    registry.register('lr', lambda: load_pickle(os.path.join(model_dir, 'logistic_regression_model.pkl'), mmap))
+    if config.ENSEMBLE_SCORER:
+        # Optional: without it inference falls back to the sklearn estimators
+        registry.register('ensemble', lambda: load_ensemble(model_dir), required=False)
+    return registry
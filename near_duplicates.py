@@ -0,0 +1,229 @@
+import argparse
+import logging
+import threading
+import time
+import zlib
+
+import numpy as np
+
+from cache import normalize_text
+
+logger = logging.getLogger(__name__)
+
+# Mersenne prime modulus of the MinHash permutations (a * x + b) mod p
+_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+
+def shingles(text, size):
+    # Character n-grams of the normalized text: generated reviews are a handful of words, too
+    # short for word shingles, and a swapped product name only touches the n-grams around it
+    text = normalize_text(text)
+    if len(text) <= size:
+        return {text}
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+
+class NearDuplicateIndex:
+    # Incremental MinHash/LSH index over review texts. Each review gets a num_perm MinHash
+    # signature split into bands; reviews sharing any band land in the same bucket, so finding
+    # candidates for a new review is one dict lookup per band however many reviews are indexed.
+    #
+    # Clusters are grown leader-style: a review joins the cluster whose first review (its leader)
+    # it matches best, judged on signature agreement (an estimate of the Jaccard similarity of
+    # their shingles), or starts a new cluster. Only leaders are hashed into the buckets, so memory
+    # follows the number of distinct review skeletons, and a cluster never drifts further than the
+    # threshold from its leader the way single-linkage merging would.
+
+    def __init__(self, num_perm=64, bands=16, threshold=0.5, shingle_size=4, seed=1):
+        if num_perm % bands:
+            raise ValueError(f"num_perm ({num_perm}) must be a multiple of bands ({bands})")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.threshold = threshold
+        self.shingle_size = shingle_size
+        rng = np.random.RandomState(seed)
+        self._a = rng.randint(1, _PRIME, size=num_perm, dtype=np.uint64)
+        self._b = rng.randint(0, _PRIME, size=num_perm, dtype=np.uint64)
+
+        # band -> {band hash: [cluster ids]}; cluster id -> leader signature and member count
+        self._buckets = [{} for _ in range(bands)]
+        self._signatures = np.empty((256, num_perm), dtype=np.uint32)
+        self._sizes = []
+        self._lock = threading.Lock()
+        self.reviews = 0
+        # Highest reviews.review_id indexed so far; the next sync starts after it
+        self.last_review_id = 0
+
+    def __len__(self):
+        return self.reviews
+
+    def signature(self, text):
+        hashes = np.fromiter(
+            (zlib.crc32(s.encode('utf-8')) for s in shingles(text, self.shingle_size)), dtype=np.uint64
+        )
+        # a * x wraps around in uint64 before the modulus, as in datasketch; the result is still a
+        # fixed pseudo-random permutation per row, which is all MinHash needs
+        permuted = (np.outer(hashes, self._a) + self._b) % _PRIME & _MAX_HASH
+        return permuted.min(axis=0).astype(np.uint32)
+
+    def _band_keys(self, signature):
+        return [hash(signature[i * self.rows:(i + 1) * self.rows].tobytes()) for i in range(self.bands)]
+
+    def _best_cluster(self, signature, keys):
+        # Cluster id of the closest leader at or above the threshold, or None
+        candidates = set()
+        for bucket, key in zip(self._buckets, keys):
+            candidates.update(bucket.get(key, ()))
+        if not candidates:
+            return None
+        candidates = np.fromiter(candidates, dtype=np.int64)
+        agreement = (self._signatures[candidates] == signature).mean(axis=1)
+        best = int(np.argmax(agreement))
+        return int(candidates[best]) if agreement[best] >= self.threshold else None
+
+    def add(self, text):
+        # Indexes one review and returns the size of the cluster it joined
+        signature = self.signature(text)
+        keys = self._band_keys(signature)
+        with self._lock:
+            self.reviews += 1
+            cluster = self._best_cluster(signature, keys)
+            if cluster is not None:
+                self._sizes[cluster] += 1
+                return self._sizes[cluster]
+
+            cluster = len(self._sizes)
+            if cluster == len(self._signatures):
+                self._signatures = np.concatenate([self._signatures, np.empty_like(self._signatures)])
+            self._signatures[cluster] = signature
+            self._sizes.append(1)
+            for bucket, key in zip(self._buckets, keys):
+                bucket.setdefault(key, []).append(cluster)
+            return 1
+
+    def cluster_size(self, text):
+        # Size of the cluster this review would join, itself included; the index is not changed
+        signature = self.signature(text)
+        keys = self._band_keys(signature)
+        with self._lock:
+            cluster = self._best_cluster(signature, keys)
+            return 1 if cluster is None else self._sizes[cluster] + 1
+
+    def largest_clusters(self, n=10):
+        # [(size, cluster id)], biggest first; cluster ids count up in the order leaders were added
+        with self._lock:
+            return sorted(((size, cluster) for cluster, size in enumerate(self._sizes)), reverse=True)[:n]
+
+    def stats(self):
+        with self._lock:
+            return {
+                'reviews': self.reviews,
+                'clusters': len(self._sizes),
+                'largest_cluster': max(self._sizes, default=0),
+                'last_review_id': self.last_review_id,
+                'num_perm': self.num_perm,
+                'bands': self.bands,
+                'threshold': self.threshold
+            }
+
+
+def sync_index(index, db, batch_size=5000):
+    # Streams reviews stored since the last sync into the index, one keyset page at a time,
+    # so a full build never holds more than batch_size rows from the database
+    added = 0
+    for rows in db.iter_reviews(index.last_review_id, batch_size):
+        for row in rows:
+            index.add(row['review_text'] or '')
+        index.last_review_id = rows[-1]['review_id']
+        added += len(rows)
+    return added
+
+
+class IndexSync:
+    # Background thread that builds the index from the database, then keeps adding reviews
+    # as the write path stores them. Requests only read the index.
+
+    def __init__(self, index, db, interval, batch_size):
+        self.index = index
+        self._db = db
+        self.interval = interval
+        self.batch_size = batch_size
+        self._stopping = threading.Event()
+        self.syncs = 0
+        self.failed = 0
+        self.last_sync_seconds = None
+
+        self._thread = threading.Thread(target=self._run, name='near-duplicate-sync', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stopping.is_set():
+            started = time.perf_counter()
+            try:
+                sync_index(self.index, self._db, self.batch_size)
+                self.syncs += 1
+                self.last_sync_seconds = time.perf_counter() - started
+            except Exception as e:
+                logger.error("Error syncing the near-duplicate index: %s", e)
+                self.failed += 1
+            self._stopping.wait(self.interval)
+
+    def close(self, timeout=None):
+        self._stopping.set()
+        self._thread.join(timeout)
+
+    def stats(self):
+        return dict(self.index.stats(), syncs=self.syncs, failed_syncs=self.failed,
+                    last_sync_seconds=self.last_sync_seconds)
+
+
+def create_index(config):
+    return NearDuplicateIndex(
+        config.NEAR_DUP_NUM_PERM,
+        config.NEAR_DUP_BANDS,
+        config.NEAR_DUP_THRESHOLD,
+        config.NEAR_DUP_SHINGLE_SIZE
+    )
+
+
+def _texts(data, batch_size):
+    if data:
+        import pandas as pd
+        for chunk in pd.read_csv(data, usecols=['review_text'], chunksize=batch_size):
+            yield from chunk['review_text'].fillna('')
+        return
+    from database import Database
+    for rows in Database().iter_reviews(0, batch_size):
+        for row in rows:
+            yield row['review_text'] or ''
+
+
+def main():
+    # Offline report: builds the index from the reviews table (or a CSV) and prints the largest clusters
+    import config
+    parser = argparse.ArgumentParser(description='Build the near-duplicate review index and list the largest clusters')
+    parser.add_argument('--data', help='CSV with a review_text column instead of the database')
+    parser.add_argument('--batch-size', type=int, default=config.NEAR_DUP_SYNC_BATCH)
+    parser.add_argument('--top', type=int, default=10)
+    args = parser.parse_args()
+
+    index = create_index(config)
+    # Leader texts only, to label the report
+    leaders = []
+    started = time.perf_counter()
+    for text in _texts(args.data, args.batch_size):
+        if index.add(text) == 1:
+            leaders.append(text)
+    seconds = time.perf_counter() - started
+
+    stats = index.stats()
+    print(f"Indexed {stats['reviews']} reviews into {stats['clusters']} clusters in {seconds:.1f}s "
+          f"({stats['reviews'] / max(seconds, 1e-9):.0f} reviews/s)")
+    for size, cluster in index.largest_clusters(args.top):
+        print(f"  {size:>6} reviews like {leaders[cluster]!r}")
+
+
+if __name__ == '__main__':
+    main()
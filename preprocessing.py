@@ -0,0 +1,100 @@
+import re
+import string
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+from nltk.corpus import stopwords
+from nltk.corpus.reader.wordnet import ADJ, ADV, NOUN, VERB
+from nltk.stem import WordNetLemmatizer
+from nltk.tag.perceptron import PerceptronTagger
+from nltk.tokenize import word_tokenize
+
+_PUNCTUATION_TABLE = str.maketrans('', '', string.punctuation)
+
+# Once ASCII punctuation is stripped, word_tokenize() only differs from str.split() on
+# these words (it splits e.g. "cannot" into "can not"), so anything else skips it
+_TOKENIZER_SPECIAL_CASES = re.compile(r'\b(?:cannot|gimme|gonna|gotta|lemme|wanna)\b')
+
+_WORDNET_POS = {
+    'J': ADJ,
+    'V': VERB,
+    'N': NOUN,
+    'R': ADV
+}
+
+
+class Preprocessor:
+    # Same output as app.preprocess_text(), built for throughput: the tagger is loaded
+    # once instead of on every pos_tag() call and lemmas are memoized per (token, tag)
+
+    def __init__(self, lemma_cache_size=500000):
+        self.tagger = PerceptronTagger()
+        self.lemmatizer = WordNetLemmatizer()
+        self.stop_words = frozenset(stopwords.words('english'))
+        self._lemma = lru_cache(maxsize=lemma_cache_size)(self._lemma_for)
+
+    def _lemma_for(self, word, tag):
+        # None marks tokens the original pipeline drops
+        if not word.isalpha() or word in self.stop_words:
+            return None
+        return self.lemmatizer.lemmatize(word, pos=_WORDNET_POS.get(tag[:1], NOUN))
+
+    def tokenize(self, text):
+        text = text.lower().translate(_PUNCTUATION_TABLE)
+        if text.isascii() and not _TOKENIZER_SPECIAL_CASES.search(text):
+            return text.split()
+        return word_tokenize(text)
+
+    def preprocess(self, text):
+        return self.preprocess_many([text])[0]
+
+    def preprocess_many(self, texts):
+        token_lists = [self.tokenize(text) if isinstance(text, str) else None for text in texts]
+        tagged_docs = self.tagger.tag_sents([tokens or [] for tokens in token_lists])
+
+        lemma = self._lemma
+        results = []
+        for tokens, tagged in zip(token_lists, tagged_docs):
+            if tokens is None:
+                results.append("")
+                continue
+            lemmas = [lemma(word, tag) for word, tag in tagged]
+            results.append(" ".join([l for l in lemmas if l is not None]))
+        return results
+
+    def cache_info(self):
+        return self._lemma.cache_info()
+
+
+_default_preprocessor = None
+
+
+def get_preprocessor():
+    global _default_preprocessor
+    if _default_preprocessor is None:
+        _default_preprocessor = Preprocessor()
+    return _default_preprocessor
+
+
+# --- Process-pool mode for bulk jobs ---
+_worker_preprocessor = None
+
+
+def _init_worker():
+    global _worker_preprocessor
+    _worker_preprocessor = Preprocessor()
+
+
+def _preprocess_chunk(texts):
+    return _worker_preprocessor.preprocess_many(texts)
+
+
+def preprocess_parallel(texts, workers=None, chunk_size=1000):
+    texts = list(texts)
+    chunks = [texts[i:i + chunk_size] for i in range(0, len(texts), chunk_size)]
+    results = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        # map() yields chunks in submission order, so output lines up with input
+        for processed in pool.map(_preprocess_chunk, chunks):
+            results.extend(processed)
+    return results
@@ -0,0 +1,301 @@
+import argparse
+import json
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from email.message import Message
+from urllib.parse import parse_qsl, urlencode, urljoin, urlsplit, urlunsplit
+
+import requests
+from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+import metrics
+from cache import LRUCache
+from database import platform_from_url
+
+logger = logging.getLogger(__name__)
+
+FETCHES = metrics.REGISTRY.counter(
+    'review_page_fetches_total',
+    'Review pages by outcome: fetched, not_modified (ETag/Last-Modified revalidation), fresh (cache), error',
+    ('result',)
+)
+
+# Review text selectors per platform (database.platform_from_url), tried in order; the first
+# that matches anything wins. Marketplace markup changes without notice, so these are kept as
+# data next to each other rather than spread through the parsing code.
+SELECTORS = {
+    'Amazon': ['[data-hook="review"] [data-hook="review-body"]', '[data-hook="review-collapsed"]'],
+    'Flipkart': ['div.ZmyHeo', 'div.t-ZTKy', 'div.qwjRop'],
+    'Meesho': ['[class*="Comment__CommentText"]', '[class*="ReviewCard"] p'],
+}
+# Microdata every platform may use, tried after the platform's own selectors
+GENERIC_SELECTORS = ['[itemprop="reviewBody"]']
+# Flipkart truncates long reviews behind a link whose text ends up in the review's text
+TRAILING_NOISE = ('READ MORE',)
+# Query parameter of the review page number; platforms without one are fetched as a single page
+PAGE_PARAMS = {'Amazon': 'pageNumber', 'Flipkart': 'page'}
+MAX_REDIRECTS = 5
+
+
+class FetchError(Exception):
+    pass
+
+
+# --- Extraction ---
+
+def _clean(text):
+    text = ' '.join(text.split())
+    for noise in TRAILING_NOISE:
+        if text.endswith(noise):
+            text = text[:-len(noise)].rstrip()
+    return text
+
+
+def json_ld_reviews(soup):
+    # schema.org Review objects embedded as JSON-LD for search engines, in document order
+    reviews = []
+    for script in soup.find_all('script', type='application/ld+json'):
+        try:
+            stack = [json.loads(script.string or '')]
+        except ValueError:
+            continue
+        while stack:
+            item = stack.pop()
+            if isinstance(item, list):
+                stack.extend(reversed(item))
+            elif isinstance(item, dict):
+                if item.get('@type') == 'Review' and isinstance(item.get('reviewBody'), str):
+                    reviews.append(item['reviewBody'])
+                stack.extend(reversed([v for v in item.values() if isinstance(v, (dict, list))]))
+    return reviews
+
+
+def extract_reviews(html, platform, encoding=None):
+    # Review texts on one page: the platform's markup, then microdata, then JSON-LD. Repeated
+    # texts are kept; identical reviews are exactly what the classifier is looking for.
+    soup = BeautifulSoup(html, 'html.parser', from_encoding=encoding if isinstance(html, bytes) else None)
+    for selector in SELECTORS.get(platform, []) + GENERIC_SELECTORS:
+        reviews = [_clean(element.get_text(' ')) for element in soup.select(selector)]
+        reviews = [r for r in reviews if r]
+        if reviews:
+            return reviews
+    return [r for r in map(_clean, json_ld_reviews(soup)) if r]
+
+
+def header_charset(content_type):
+    # The charset the Content-Type header names, or None. requests falls back to ISO-8859-1 for
+    # text/* without one, which would override the page's own <meta charset>.
+    if not content_type:
+        return None
+    message = Message()
+    message['Content-Type'] = content_type
+    return message.get_content_charset()
+
+
+def page_urls(url, platform, pages):
+    # The product's first review pages; page 1 is the url as given
+    param = PAGE_PARAMS.get(platform)
+    if param is None or pages <= 1:
+        return [url]
+    parts = urlsplit(url)
+    query = [(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if k != param]
+    return [url] + [
+        urlunsplit(parts._replace(query=urlencode(query + [(param, str(n))]))) for n in range(2, pages + 1)
+    ]
+
+
+# --- Fetching ---
+
+class ReviewFetcher:
+    # Fetches product review pages over one pooled keep-alive session, several pages at a time,
+    # and parses them with the platform's extractor. Parsed reviews are cached per page URL with
+    # the page's ETag/Last-Modified: within fresh_seconds the site is not contacted at all, after
+    # that a conditional request answered 304 reuses them without downloading or parsing again.
+
+    def __init__(self, allowed_hosts=None, timeout=10, max_pages=1, workers=8, pool_size=16,
+                 cache_entries=1000, cache_bytes=16 * 1024 * 1024, fresh_seconds=300, ttl_seconds=24 * 60 * 60,
+                 max_page_bytes=5 * 1024 * 1024, user_agent='Mozilla/5.0 (compatible; review-checker)'):
+        # allowed_hosts: host names, each also allowing its subdomains; None allows any host
+        self.allowed_hosts = tuple(h.lower() for h in allowed_hosts) if allowed_hosts is not None else None
+        self.timeout = timeout
+        self.max_pages = max_pages
+        self.fresh_seconds = fresh_seconds
+        self.max_page_bytes = max_page_bytes
+        self.cache = LRUCache(cache_entries, cache_bytes, ttl_seconds)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=pool_size,
+            pool_maxsize=pool_size,
+            max_retries=Retry(total=2, backoff_factor=0.2, status_forcelist=(429, 500, 502, 503, 504),
+                              allowed_methods=('GET',), raise_on_status=False)
+        )
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers.update({'User-Agent': user_agent, 'Accept': 'text/html,application/xhtml+xml'})
+        self._pool = ThreadPoolExecutor(workers, thread_name_prefix='review-fetch')
+
+    def check_url(self, url):
+        # ValueError for anything but http(s) on an allowed host; the server fetches what users send
+        parts = urlsplit(url)
+        host = (parts.hostname or '').lower()
+        if parts.scheme not in ('http', 'https') or not host:
+            raise ValueError(f"Not an http(s) URL: {url}")
+        if self.allowed_hosts is not None and not any(
+            host == allowed or host.endswith('.' + allowed) for allowed in self.allowed_hosts
+        ):
+            raise ValueError(f"Fetching from {host} is not allowed")
+
+    def _get(self, url, headers):
+        # Redirects are followed here so every hop is checked against the allowed hosts
+        for _ in range(MAX_REDIRECTS + 1):
+            response = self.session.get(url, headers=headers, timeout=self.timeout, stream=True,
+                                        allow_redirects=False)
+            if not response.is_redirect:
+                return url, response
+            # Read to the end so the connection goes back to the pool instead of being closed
+            self._read(url, response)
+            response.close()
+            url = urljoin(url, response.headers['Location'])
+            # The site sent us there, not the user: a failed fetch rather than a bad request
+            try:
+                self.check_url(url)
+            except ValueError as e:
+                raise FetchError(f"Redirected to a disallowed URL: {e}")
+        raise FetchError(f"More than {MAX_REDIRECTS} redirects")
+
+    def _read(self, url, response):
+        chunks, size = [], 0
+        for chunk in response.iter_content(64 * 1024):
+            size += len(chunk)
+            if size > self.max_page_bytes:
+                response.close()
+                raise FetchError(f"{url} is larger than {self.max_page_bytes} bytes")
+            chunks.append(chunk)
+        return b''.join(chunks)
+
+    def fetch_page(self, url):
+        # Review texts on one page
+        cached = self.cache.get(url)
+        if cached is not None and time.time() - cached['fetched_at'] < self.fresh_seconds:
+            FETCHES.inc('fresh')
+            return cached['reviews']
+
+        headers = {}
+        if cached is not None:
+            if cached['etag']:
+                headers['If-None-Match'] = cached['etag']
+            if cached['last_modified']:
+                headers['If-Modified-Since'] = cached['last_modified']
+        final_url, response = self._get(url, headers)
+        with response:
+            # Read to the end, error pages included, so the connection can be reused
+            content = self._read(url, response)
+            if response.status_code == 304 and cached is not None:
+                FETCHES.inc('not_modified')
+                reviews = cached['reviews']
+            else:
+                response.raise_for_status()
+                # The platform of the page actually served, in case a short link redirected
+                reviews = extract_reviews(content, platform_from_url(final_url),
+                                          header_charset(response.headers.get('Content-Type')))
+                FETCHES.inc('fetched')
+            self.cache.set(url, {
+                'etag': response.headers.get('ETag') or (cached or {}).get('etag'),
+                'last_modified': response.headers.get('Last-Modified') or (cached or {}).get('last_modified'),
+                'reviews': reviews,
+                'fetched_at': time.time()
+            })
+        return reviews
+
+    def fetch_many(self, urls):
+        # {url: reviews or the exception that stopped it}. The review pages of every url are in
+        # flight at once; a url fails only with its first page, later pages that fail are skipped.
+        jobs = {}
+        results = {}
+        for url in urls:
+            try:
+                self.check_url(url)
+            except ValueError as e:
+                results[url] = e
+                continue
+            pages = page_urls(url, platform_from_url(url), self.max_pages)
+            jobs[url] = [self._pool.submit(self.fetch_page, page) for page in pages]
+
+        for url, futures in jobs.items():
+            reviews = []
+            for page, future in enumerate(futures):
+                try:
+                    reviews.extend(future.result())
+                except (requests.RequestException, FetchError) as e:
+                    FETCHES.inc('error')
+                    if page == 0:
+                        results[url] = e
+                        break
+                    logger.debug("Skipping review page %d of %s: %s", page + 1, url, e)
+            else:
+                results[url] = reviews
+        return results
+
+    def fetch_reviews(self, url):
+        # Reviews on the product's first max_pages pages, in page order; raises what fetch_many reports
+        result = self.fetch_many([url])[url]
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    def close(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        self.session.close()
+
+    def stats(self):
+        return dict(self.cache.stats(), max_pages=self.max_pages, fresh_seconds=self.fresh_seconds)
+
+
+def create_fetcher(config):
+    hosts = [h.strip() for h in config.FETCH_ALLOWED_HOSTS.split(',') if h.strip()]
+    return ReviewFetcher(
+        allowed_hosts=None if '*' in hosts else hosts,
+        timeout=config.FETCH_TIMEOUT,
+        max_pages=config.FETCH_MAX_PAGES,
+        workers=config.FETCH_WORKERS,
+        pool_size=config.FETCH_POOL_SIZE,
+        cache_entries=config.FETCH_CACHE_ENTRIES,
+        fresh_seconds=config.FETCH_FRESH_SECONDS,
+        ttl_seconds=config.FETCH_CACHE_TTL_SECONDS,
+        max_page_bytes=config.FETCH_MAX_PAGE_BYTES
+    )
+
+
+def main():
+    # Prints what the extractors find at each url, without scoring anything
+    import config
+    parser = argparse.ArgumentParser(description='Fetch product review pages and list the reviews found')
+    parser.add_argument('urls', nargs='+')
+    parser.add_argument('--pages', type=int, default=config.FETCH_MAX_PAGES)
+    parser.add_argument('--any-host', action='store_true', help='Ignore FETCH_ALLOWED_HOSTS')
+    args = parser.parse_args()
+
+    fetcher = create_fetcher(config)
+    fetcher.max_pages = args.pages
+    if args.any_host:
+        fetcher.allowed_hosts = None
+    started = time.perf_counter()
+    results = fetcher.fetch_many(args.urls)
+    seconds = time.perf_counter() - started
+    for url, result in results.items():
+        if isinstance(result, Exception):
+            print(f"{url}: {type(result).__name__}: {result}")
+            continue
+        print(f"{url}: {len(result)} reviews ({platform_from_url(url)})")
+        for review in result[:5]:
+            print(f"  {review[:100]!r}")
+    print(f"Fetched {len(args.urls)} urls in {seconds:.2f}s")
+    fetcher.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,358 @@
+import os
+import sqlite3
+from datetime import datetime
+
+# Keyset pagination indexes for /history: every filter leads, (analyzed_at, history_id) follows
+HISTORY_INDEXES = [
+    ('idx_history_time', 'analyzed_at, history_id'),
+    ('idx_history_prediction', 'prediction_result, analyzed_at, history_id'),
+    ('idx_history_url', 'url_analyzed, analyzed_at, history_id'),
+    ('idx_history_platform', 'platform, analyzed_at, history_id'),
+]
+
+MYSQL_TABLES = [
+    ('Products', """
+    CREATE TABLE IF NOT EXISTS products (
+        product_id INT AUTO_INCREMENT PRIMARY KEY,
+        name VARCHAR(255) NOT NULL,
+        url VARCHAR(255) UNIQUE,
+        platform VARCHAR(50),
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """),
+    ('Reviews', """
+    CREATE TABLE IF NOT EXISTS reviews (
+        review_id INT AUTO_INCREMENT PRIMARY KEY,
+        product_id INT,
+        review_text TEXT,
+        is_fake BOOLEAN,
+        confidence_score FLOAT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (product_id) REFERENCES products(product_id)
+    )
+    """),
+    ('Analysis results', """
+    CREATE TABLE IF NOT EXISTS analysis_results (
+        analysis_id INT AUTO_INCREMENT PRIMARY KEY,
+        review_id INT,
+        svm_prediction VARCHAR(50),
+        lr_prediction VARCHAR(50),
+        final_prediction VARCHAR(50),
+        accuracy FLOAT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (review_id) REFERENCES reviews(review_id)
+    )
+    """),
+    ('Analysis history', """
+    CREATE TABLE IF NOT EXISTS analysis_history (
+        history_id INT AUTO_INCREMENT PRIMARY KEY,
+        url_analyzed VARCHAR(255),
+        platform VARCHAR(50),
+        review_text TEXT,
+        prediction_result VARCHAR(50),
+        confidence_score FLOAT,
+        analyzed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """),
+    ('Product stats', """
+    CREATE TABLE IF NOT EXISTS product_stats (
+        product_id INT PRIMARY KEY,
+        review_count INT NOT NULL DEFAULT 0,
+        fake_count INT NOT NULL DEFAULT 0,
+        confidence_sum DOUBLE NOT NULL DEFAULT 0,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (product_id) REFERENCES products(product_id)
+    )
+    """),
+]
+
+# Same tables, columns and indexes in SQLite's dialect
+SQLITE_TABLES = [
+    ('Products', """
+    CREATE TABLE IF NOT EXISTS products (
+        product_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name VARCHAR(255) NOT NULL,
+        url VARCHAR(255) UNIQUE,
+        platform VARCHAR(50),
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """),
+    ('Reviews', """
+    CREATE TABLE IF NOT EXISTS reviews (
+        review_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        product_id INTEGER REFERENCES products(product_id),
+        review_text TEXT,
+        is_fake BOOLEAN,
+        confidence_score REAL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """),
+    ('Analysis results', """
+    CREATE TABLE IF NOT EXISTS analysis_results (
+        analysis_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        review_id INTEGER REFERENCES reviews(review_id),
+        svm_prediction VARCHAR(50),
+        lr_prediction VARCHAR(50),
+        final_prediction VARCHAR(50),
+        accuracy REAL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """),
+    ('Analysis history', """
+    CREATE TABLE IF NOT EXISTS analysis_history (
+        history_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        url_analyzed VARCHAR(255),
+        platform VARCHAR(50),
+        review_text TEXT,
+        prediction_result VARCHAR(50),
+        confidence_score REAL,
+        analyzed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """),
+    ('Product stats', """
+    CREATE TABLE IF NOT EXISTS product_stats (
+        product_id INTEGER PRIMARY KEY REFERENCES products(product_id),
+        review_count INTEGER NOT NULL DEFAULT 0,
+        fake_count INTEGER NOT NULL DEFAULT 0,
+        confidence_sum REAL NOT NULL DEFAULT 0,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """),
+]
+
+# product_stats is kept up to date by the write path; this fills it once for reviews stored
+# before the table existed. Does nothing when it already has rows.
+PRODUCT_STATS_BACKFILL = """
+INSERT INTO product_stats (product_id, review_count, fake_count, confidence_sum)
+SELECT product_id, COUNT(*), SUM(CASE WHEN is_fake THEN 1 ELSE 0 END), COALESCE(SUM(confidence_score), 0)
+FROM reviews
+WHERE product_id IS NOT NULL AND NOT EXISTS (SELECT 1 FROM product_stats)
+GROUP BY product_id
+"""
+
+# Explicit conversions so TIMESTAMP columns round-trip as datetime, matching MySQL
+sqlite3.register_adapter(datetime, lambda value: value.isoformat(' '))
+sqlite3.register_converter('TIMESTAMP', lambda value: datetime.fromisoformat(value.decode('ascii')))
+
+
+class StorageBackend:
+    # Everything that differs between database engines; Database holds the shared logic
+
+    name = None
+    # Exceptions an operation can fail with
+    errors = ()
+    # The subset after which a connection should be discarded rather than reused
+    disconnect_errors = ()
+
+    def connect(self):
+        raise NotImplementedError
+
+    def ping(self, conn):
+        raise NotImplementedError
+
+    def sql(self, query):
+        # Queries are written with %s placeholders
+        return query
+
+    def fetch_dicts(self, conn, query, params=()):
+        raise NotImplementedError
+
+    def upsert_product(self, cursor, name, url, platform):
+        raise NotImplementedError
+
+    def add_product_stats(self, cursor, rows):
+        # rows: (product_id, reviews, fake reviews, confidence sum), added onto the stored totals
+        raise NotImplementedError
+
+    def prepare(self):
+        # Called once when Database starts
+        pass
+
+    def create_schema(self):
+        raise NotImplementedError
+
+
+class MySQLBackend(StorageBackend):
+    name = 'MySQL'
+
+    def __init__(self, host, port, user, password, database):
+        # Imported here so SQLite deployments do not need the MySQL driver
+        import mysql.connector
+        self._mysql = mysql.connector
+        self.errors = (mysql.connector.Error,)
+        self.disconnect_errors = (mysql.connector.InterfaceError, mysql.connector.OperationalError)
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.database = database
+
+    def connect(self, use_database=True):
+        params = {'host': self.host, 'port': self.port, 'user': self.user, 'password': self.password}
+        if use_database:
+            params['database'] = self.database
+        return self._mysql.connect(**params)
+
+    def ping(self, conn):
+        conn.ping(reconnect=True, attempts=2, delay=0.2)
+
+    def fetch_dicts(self, conn, query, params=()):
+        cursor = conn.cursor(dictionary=True)
+        try:
+            cursor.execute(query, params)
+            return cursor.fetchall()
+        finally:
+            cursor.close()
+
+    def upsert_product(self, cursor, name, url, platform):
+        # The UNIQUE url decides under concurrency and LAST_INSERT_ID(product_id)
+        # makes lastrowid the existing id on a duplicate
+        cursor.execute("""
+        INSERT INTO products (name, url, platform)
+        VALUES (%s, %s, %s)
+        ON DUPLICATE KEY UPDATE product_id = LAST_INSERT_ID(product_id)
+        """, (name, url, platform))
+        return cursor.lastrowid
+
+    def add_product_stats(self, cursor, rows):
+        cursor.executemany("""
+        INSERT INTO product_stats (product_id, review_count, fake_count, confidence_sum)
+        VALUES (%s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE
+            review_count = review_count + VALUES(review_count),
+            fake_count = fake_count + VALUES(fake_count),
+            confidence_sum = confidence_sum + VALUES(confidence_sum),
+            updated_at = CURRENT_TIMESTAMP
+        """, rows)
+
+    def create_schema(self):
+        connection = self.connect(use_database=False)
+        cursor = connection.cursor()
+        try:
+            print("✅ Successfully connected to MySQL server")
+            cursor.execute(f"CREATE DATABASE IF NOT EXISTS {self.database}")
+            print("✅ Database created or already exists")
+            cursor.execute(f"USE {self.database}")
+
+            for label, statement in MYSQL_TABLES:
+                cursor.execute(statement)
+                print(f"✅ {label} table created")
+
+            # Tables created before the platform column existed
+            self._add_column_if_missing(cursor, 'analysis_history', 'platform', 'VARCHAR(50) AFTER url_analyzed')
+            for index_name, columns in HISTORY_INDEXES:
+                self._add_index_if_missing(cursor, 'analysis_history', index_name, columns)
+            print("✅ Analysis history indexes created")
+            cursor.execute(PRODUCT_STATS_BACKFILL)
+
+            connection.commit()
+        finally:
+            cursor.close()
+            connection.close()
+
+    def _add_column_if_missing(self, cursor, table, column, definition):
+        cursor.execute("""
+        SELECT COUNT(*) FROM information_schema.columns
+        WHERE table_schema = DATABASE() AND table_name = %s AND column_name = %s
+        """, (table, column))
+        if cursor.fetchone()[0] == 0:
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+    def _add_index_if_missing(self, cursor, table, index_name, columns):
+        # MySQL has no CREATE INDEX IF NOT EXISTS
+        cursor.execute("""
+        SELECT COUNT(*) FROM information_schema.statistics
+        WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s
+        """, (table, index_name))
+        if cursor.fetchone()[0] == 0:
+            cursor.execute(f"CREATE INDEX {index_name} ON {table} ({columns})")
+
+
+class SQLiteBackend(StorageBackend):
+    # Embedded engine for edge boxes, CI and load tests: no server, one database file
+
+    name = 'SQLite'
+    errors = (sqlite3.Error,)
+    # Raised for a closed connection; reopening a SQLite file is cheap
+    disconnect_errors = (sqlite3.ProgrammingError,)
+
+    def __init__(self, path, busy_timeout):
+        self.path = path
+        self.busy_timeout = busy_timeout
+
+    def connect(self):
+        conn = sqlite3.connect(
+            self.path,
+            timeout=self.busy_timeout,
+            detect_types=sqlite3.PARSE_DECLTYPES,
+            # Pooled connections move between request threads, one at a time
+            check_same_thread=False
+        )
+        # WAL lets readers run alongside the single writer, across processes too
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA foreign_keys=ON")
+        return conn
+
+    def ping(self, conn):
+        conn.execute("SELECT 1").fetchone()
+
+    def sql(self, query):
+        return query.replace('%s', '?')
+
+    def fetch_dicts(self, conn, query, params=()):
+        cursor = conn.execute(self.sql(query), params)
+        try:
+            columns = [description[0] for description in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+        finally:
+            cursor.close()
+
+    def upsert_product(self, cursor, name, url, platform):
+        cursor.execute("INSERT OR IGNORE INTO products (name, url, platform) VALUES (?, ?, ?)", (name, url, platform))
+        if cursor.rowcount == 1:
+            return cursor.lastrowid
+        cursor.execute("SELECT product_id FROM products WHERE url = ?", (url,))
+        return cursor.fetchone()[0]
+
+    def add_product_stats(self, cursor, rows):
+        cursor.executemany("""
+        INSERT INTO product_stats (product_id, review_count, fake_count, confidence_sum)
+        VALUES (?, ?, ?, ?)
+        ON CONFLICT (product_id) DO UPDATE SET
+            review_count = review_count + excluded.review_count,
+            fake_count = fake_count + excluded.fake_count,
+            confidence_sum = confidence_sum + excluded.confidence_sum,
+            updated_at = CURRENT_TIMESTAMP
+        """, rows)
+
+    def prepare(self):
+        # Embedded deployments have no separate setup step
+        self.create_schema(verbose=False)
+
+    def create_schema(self, verbose=True):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        connection = self.connect()
+        try:
+            for label, statement in SQLITE_TABLES:
+                connection.execute(statement)
+                if verbose:
+                    print(f"✅ {label} table created")
+            for index_name, columns in HISTORY_INDEXES:
+                connection.execute(f"CREATE INDEX IF NOT EXISTS {index_name} ON analysis_history ({columns})")
+            if verbose:
+                print("✅ Analysis history indexes created")
+            connection.execute(PRODUCT_STATS_BACKFILL)
+            connection.commit()
+        finally:
+            connection.close()
+
+
+def create_backend(config):
+    if config.DB_BACKEND == 'mysql':
+        return MySQLBackend(config.DB_HOST, config.DB_PORT, config.DB_USER, config.DB_PASSWORD, config.DB_NAME)
+    if config.DB_BACKEND == 'sqlite':
+        return SQLiteBackend(config.SQLITE_PATH, config.SQLITE_BUSY_TIMEOUT)
+    raise ValueError(f"Unknown DB_BACKEND: {config.DB_BACKEND}")
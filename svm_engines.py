@@ -0,0 +1,22 @@
+from sklearn.calibration import CalibratedClassifierCV
+from sklearn.linear_model import SGDClassifier
+from sklearn.svm import SVC, LinearSVC
+
+SVM_ENGINES = ('liblinear', 'sgd', 'libsvm')
+
+
+def build_svm(engine='liblinear', random_state=42, **params):
+    # Every engine exposes predict/predict_proba/classes_, which is all app.py relies on.
+    # params override the underlying estimator's defaults (C, alpha, ...), e.g. from sweep.py
+    if engine == 'libsvm':
+        # Kernel SVM with internal 5-fold Platt scaling; training grows super-linearly with rows
+        return SVC(**dict({'kernel': 'linear', 'probability': True}, **params))
+    if engine == 'liblinear':
+        base = LinearSVC(**dict({'C': 1.0, 'random_state': random_state}, **params))
+    elif engine == 'sgd':
+        base = SGDClassifier(**dict({'loss': 'hinge', 'alpha': 1e-5, 'random_state': random_state}, **params))
+    else:
+        raise ValueError(f"Unknown SVM engine: {engine}")
+    # Separate sigmoid calibration step. ensemble=False keeps a single linear model fitted on
+    # all rows (calibrated on cross-validated scores), so inference is one dot product
+    return CalibratedClassifierCV(base, method='sigmoid', cv=3, ensemble=False)
@@ -0,0 +1,148 @@
+import argparse
+import itertools
+import json
+import math
+import time
+
+import numpy as np
+from joblib import Parallel, delayed
+from sklearn.model_selection import StratifiedKFold
+
+from feature_cache import FEATURE_CACHE_DIR, load_dataset, split_dataset
+from sweep_tasks import cv_fold, evaluate, feature_set, featurize_setting
+
+# Searched by default; --grid takes a JSON file with the same two keys
+DEFAULT_GRID = {
+    'vectorizer': {
+        'max_features': [2000, 5000, 20000],
+        'ngram_range': [[1, 1], [1, 2]],
+        'sublinear_tf': [False, True]
+    },
+    'models': {
+        'lr': {'C': [0.1, 1.0, 10.0]},
+        'svm-liblinear': {'C': [0.1, 1.0]},
+        'svm-sgd': {'alpha': [1e-5, 1e-4]}
+    }
+}
+
+
+def expand(grid):
+    # Every combination of a parameter dict whose values are lists
+    keys = sorted(grid)
+    for values in itertools.product(*(grid[key] for key in keys)):
+        yield dict(zip(keys, values))
+
+
+def successive_halving(candidates, n_train, args, parallel):
+    # Every candidate is cross-validated on a small training subset; only the best 1/eta move on
+    # to a subset eta times larger, until finalists remain or the subsets reach the full training set
+    order = np.random.default_rng(args.seed).permutation(n_train)
+    rows = min(n_train, args.min_rows)
+    rung = 0
+    while True:
+        subset = np.sort(order[:rows])
+        labels = feature_set(candidates[0]['features']).y_train[subset]
+        folds = list(StratifiedKFold(args.cv, shuffle=True, random_state=args.seed).split(subset, labels))
+        started = time.perf_counter()
+        scores = parallel(
+            delayed(cv_fold)(c['features'], c['model'], c['params'], subset, train, test, args.seed)
+            for c in candidates for train, test in folds
+        )
+        for i, c in enumerate(candidates):
+            c['cv_accuracy'] = float(np.mean(scores[i * len(folds):(i + 1) * len(folds)]))
+            c['cv_rows'] = rows
+        print(f"  rung {rung}: {len(candidates)} candidates x {len(folds)} folds on {rows} rows "
+              f"({time.perf_counter() - started:.1f}s)")
+
+        candidates.sort(key=lambda c: c['cv_accuracy'], reverse=True)
+        if len(candidates) <= args.finalists or rows >= n_train:
+            return candidates
+        candidates = candidates[:max(args.finalists, math.ceil(len(candidates) / args.eta))]
+        rows = min(n_train, rows * args.eta)
+        rung += 1
+
+
+def print_leaderboard(rows):
+    print(f"\n{'#':>3} {'test acc':>9} {'cv acc':>8} {'p50 ms':>8} {'p99 ms':>8} {'size MB':>8}  model / vectorizer")
+    for i, r in enumerate(rows, 1):
+        print(f"{i:>3} {r['test_accuracy']:>9.4f} {r['cv_accuracy']:>8.4f} {r['latency_p50_ms']:>8.3f} "
+              f"{r['latency_p99_ms']:>8.3f} {r['size_bytes'] / 2 ** 20:>8.2f}  "
+              f"{r['model']} {json.dumps(r['params'])} / {json.dumps(r['vectorizer'])}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Sweep vectorizer and model settings with successive halving')
+    parser.add_argument('--data', default='large_dataset.csv')
+    parser.add_argument('--grid', help='JSON file with "vectorizer" and "models" grids (default: DEFAULT_GRID)')
+    parser.add_argument('--cv', type=int, default=3, help='Cross-validation folds per candidate')
+    parser.add_argument('--eta', type=int, default=3, help='Keep the best 1/eta of candidates at each rung')
+    parser.add_argument('--min-rows', type=int, default=500, help='Training rows at the first rung')
+    parser.add_argument('--finalists', type=int, default=8, help='Candidates fitted on all rows and ranked')
+    parser.add_argument('--jobs', type=int, default=-1, help='Worker processes (-1: all cores)')
+    parser.add_argument('--latency-samples', type=int, default=200)
+    parser.add_argument('--accuracy-floor', type=float, help='Recommend the fastest finalist at or above this')
+    parser.add_argument('--feature-cache-dir', default=FEATURE_CACHE_DIR)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', default='sweep_results.json')
+    args = parser.parse_args()
+
+    grid = DEFAULT_GRID
+    if args.grid:
+        with open(args.grid) as f:
+            grid = json.load(f)
+    test_size = 0.2
+    started = time.perf_counter()
+
+    with Parallel(n_jobs=args.jobs) as parallel:
+        # 1. One cached featurization per vectorizer setting, built concurrently
+        settings = list(expand(grid['vectorizer']))
+        print(f"Featurizing {len(settings)} vectorizer settings...")
+        built = parallel(
+            delayed(featurize_setting)(args.data, v, test_size, args.seed, args.feature_cache_dir) for v in settings
+        )
+        cached = sum(was_cached for _, was_cached in built)
+        print(f"  {cached} loaded from the cache, {len(settings) - cached} fitted")
+
+        candidates = [
+            {'vectorizer': v, 'features': path, 'model': kind, 'params': params}
+            for v, (path, _) in zip(settings, built)
+            for kind, model_grid in grid['models'].items()
+            for params in expand(model_grid)
+        ]
+
+        # 2. Successive halving with cross-validation folds spread over the workers
+        print(f"\nSuccessive halving over {len(candidates)} candidates...")
+        n_train = feature_set(built[0][0]).X_train.shape[0]
+        finalists = successive_halving(candidates, n_train, args, parallel)
+
+        # 3. Full fits of the finalists, with the serving cost of each
+        print(f"\nEvaluating {len(finalists)} finalists...")
+        X, y = load_dataset(args.data)
+        test_texts = split_dataset(X, y, test_size, args.seed)[1]
+        leaderboard = parallel(
+            delayed(evaluate)(c, test_texts[:args.latency_samples], args.seed)
+            for c in finalists
+        )
+
+    leaderboard.sort(key=lambda r: (-r['test_accuracy'], r['latency_p50_ms']))
+    print_leaderboard(leaderboard)
+
+    result = {'leaderboard': leaderboard, 'grid': grid, 'seconds': time.perf_counter() - started}
+    if args.accuracy_floor is not None:
+        eligible = [r for r in leaderboard if r['test_accuracy'] >= args.accuracy_floor]
+        result['recommended'] = min(eligible, key=lambda r: r['latency_p50_ms']) if eligible else None
+        if eligible:
+            best = result['recommended']
+            print(f"\nFastest finalist with test accuracy >= {args.accuracy_floor}: {best['model']} "
+                  f"{json.dumps(best['params'])} / {json.dumps(best['vectorizer'])} "
+                  f"({best['latency_p50_ms']:.3f} ms p50)")
+        else:
+            print(f"\nNo finalist reaches test accuracy {args.accuracy_floor}")
+
+    with open(args.output, 'w') as f:
+        json.dump(result, f, indent=2)
+    print(f"\nSweep finished in {result['seconds']:.1f}s; results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
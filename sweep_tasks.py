@@ -0,0 +1,75 @@
+import os
+import pickle
+import time
+from functools import lru_cache
+
+import numpy as np
+from sklearn.linear_model import LogisticRegression
+
+from feature_cache import feature_path, featurize, load_feature_set
+from svm_engines import build_svm
+
+# The tasks sweep.py hands to its worker processes. They live in an importable module because
+# loky workers look functions up by module name and cannot find them in a script's __main__.
+
+
+def vectorizer_params(params):
+    # JSON has no tuples; TfidfVectorizer wants one for ngram_range
+    params = dict(params)
+    if 'ngram_range' in params:
+        params['ngram_range'] = tuple(params['ngram_range'])
+    return params
+
+
+def build_model(kind, params, random_state=42):
+    if kind == 'lr':
+        return LogisticRegression(**dict({'max_iter': 1000}, **params))
+    if kind.startswith('svm-'):
+        return build_svm(kind[len('svm-'):], random_state, **params)
+    raise ValueError(f"Unknown model kind: {kind}")
+
+
+@lru_cache(maxsize=4)
+def feature_set(path):
+    # Each worker process opens a cached matrix once and keeps it for the following tasks
+    return load_feature_set(path)
+
+
+def featurize_setting(data, params, test_size, seed, cache_dir):
+    # Workers hand back only where the matrices are, not the matrices themselves
+    path = feature_path(data, vectorizer_params(params), test_size, seed, cache_dir)
+    if os.path.isdir(path):
+        return path, True
+    return featurize(data, vectorizer_params(params), test_size, seed, cache_dir).path, False
+
+
+def cv_fold(path, kind, params, rows, train, test, seed):
+    features = feature_set(path)
+    X, y = features.X_train[rows], features.y_train[rows]
+    model = build_model(kind, params, seed).fit(X[train], y[train])
+    return float(np.mean(model.predict(X[test]) == y[test]))
+
+
+def evaluate(candidate, latency_texts, seed):
+    # Full-training fit, then what serving would pay: held-out accuracy, per-review latency
+    # (vectorize + predict_proba, as /analyze does) and the pickled size of vectorizer + model
+    features = feature_set(candidate['features'])
+    model = build_model(candidate['model'], candidate['params'], seed)
+    started = time.perf_counter()
+    model.fit(features.X_train, features.y_train)
+    train_seconds = time.perf_counter() - started
+
+    timings = []
+    for text in latency_texts:
+        started = time.perf_counter()
+        model.predict_proba(features.vectorizer.transform([text]))
+        timings.append((time.perf_counter() - started) * 1000)
+
+    return dict(
+        candidate,
+        test_accuracy=float(np.mean(model.predict(features.X_test) == features.y_test)),
+        train_seconds=train_seconds,
+        latency_p50_ms=float(np.percentile(timings, 50)),
+        latency_p99_ms=float(np.percentile(timings, 99)),
+        size_bytes=len(pickle.dumps(features.vectorizer)) + len(pickle.dumps(model))
+    )
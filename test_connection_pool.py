@@ -0,0 +1,66 @@
+import os
+import tempfile
+import threading
+import time
+
+from database import ConnectionPool, PoolTimeout
+from storage import SQLiteBackend
+
+
+def make_pool(tmp, size, timeout):
+    return ConnectionPool(SQLiteBackend(os.path.join(tmp, 'pool.sqlite3'), 5), size, timeout, 30)
+
+
+def test_discard_wakes_waiter():
+    # A broken connection discarded while the pool is exhausted frees its slot for a blocked
+    # acquire() right away, instead of leaving the waiter to time out
+    with tempfile.TemporaryDirectory() as tmp:
+        pool = make_pool(tmp, size=2, timeout=5)
+        held = [pool.acquire(), pool.acquire()]
+        outcome = {}
+
+        def waiter():
+            started = time.perf_counter()
+            try:
+                outcome['conn'] = pool.acquire()
+            except PoolTimeout as e:
+                outcome['error'] = e
+            outcome['seconds'] = time.perf_counter() - started
+
+        thread = threading.Thread(target=waiter)
+        thread.start()
+        time.sleep(0.2)
+        assert thread.is_alive()
+        pool.release(held.pop(), broken=True)
+        thread.join(10)
+
+        assert 'error' not in outcome, outcome
+        assert outcome['seconds'] < 2, outcome['seconds']
+        assert pool.stats()['open'] == 2
+        print(f"Waiter got the discarded connection's slot after {outcome['seconds']:.2f}s")
+        pool.release(outcome['conn'])
+        pool.release(held.pop())
+        pool.close_all()
+        assert pool.stats()['open'] == 0
+
+
+def test_exhausted_pool_times_out():
+    with tempfile.TemporaryDirectory() as tmp:
+        pool = make_pool(tmp, size=1, timeout=0.2)
+        conn = pool.acquire()
+        started = time.perf_counter()
+        try:
+            pool.acquire()
+            raise AssertionError("acquire() on an exhausted pool should time out")
+        except PoolTimeout:
+            pass
+        assert 0.2 <= time.perf_counter() - started < 2
+        assert pool.stats()['timeouts'] == 1
+        pool.release(conn)
+        pool.close_all()
+
+
+if __name__ == "__main__":
+    test_discard_wakes_waiter()
+    test_exhausted_pool_times_out()
+    print("Connection pool hands freed slots to waiting threads.")
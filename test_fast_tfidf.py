@@ -0,0 +1,72 @@
+import time
+
+import joblib
+import pandas as pd
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from fast_tfidf import FastTfidfVectorizer, identical
+
+# Batch sizes covering both row-norm paths: Python sums for small batches, numpy for large ones
+BATCH_SIZES = (1, 7, 100, 5000)
+# Settings the saved vectorizer does not use, each fitted on the same data
+OTHER_SETTINGS = [
+    {'norm': 'l1'},
+    {'norm': None, 'use_idf': False},
+    {'sublinear_tf': True, 'smooth_idf': False},
+    {'binary': True, 'max_features': 300},
+    {'ngram_range': (1, 2), 'stop_words': 'english', 'max_features': 2000},
+    {'ngram_range': (2, 3), 'lowercase': False}
+]
+
+
+def load_texts():
+    texts = pd.read_csv('large_dataset.csv')['review_text'].fillna('').tolist()
+    # Inputs the dataset does not cover: empty and out-of-vocabulary text, non-ASCII, odd spacing
+    return texts + ["", "zzzz qqqq", "Café “quoted” review — naïve ΣΑΣ but fine…", "good\tgood\ngood  GOOD"]
+
+
+def check(vectorizer, texts, batch_sizes=BATCH_SIZES):
+    engine = FastTfidfVectorizer(vectorizer)
+    mismatches = []
+    for size in batch_sizes:
+        for start in range(0, len(texts), size):
+            batch = texts[start:start + size]
+            if not identical(engine.transform(batch), vectorizer.transform(batch)):
+                mismatches.append((size, start))
+    return mismatches
+
+
+def test_fast_tfidf_bit_identical():
+    texts = load_texts()
+    vectorizer = joblib.load('models/tfidf_vectorizer.pkl')
+    engine = FastTfidfVectorizer(vectorizer)
+    engine.transform(texts[:100])
+
+    start = time.perf_counter()
+    expected = vectorizer.transform(texts)
+    sklearn_time = time.perf_counter() - start
+    start = time.perf_counter()
+    actual = engine.transform(texts)
+    fast_time = time.perf_counter() - start
+    print(f"sklearn: {sklearn_time:.3f}s | fast: {fast_time:.3f}s | Documents: {len(texts)}")
+
+    assert identical(actual, expected)
+    mismatches = check(vectorizer, texts)
+    for size, start in mismatches[:10]:
+        print(f"Mismatch in the batch of {size} starting at {start}")
+    assert not mismatches
+
+
+def test_fast_tfidf_other_settings():
+    texts = load_texts()
+    for settings in OTHER_SETTINGS:
+        vectorizer = TfidfVectorizer(**settings).fit(texts)
+        mismatches = check(vectorizer, texts, BATCH_SIZES[1:])
+        print(f"{settings}: {len(mismatches)} mismatching batches")
+        assert not mismatches
+
+
+if __name__ == "__main__":
+    test_fast_tfidf_bit_identical()
+    test_fast_tfidf_other_settings()
+    print("Fast TF-IDF output is bit-identical to the saved vectorizer.")
@@ -0,0 +1,252 @@
+import hashlib
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import requests
+
+from review_fetcher import FetchError, ReviewFetcher, extract_reviews
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+# Path -> fixture page; the platform is read from the url, so each path names its marketplace
+PAGES = {
+    ('/amazon/product-reviews/B0FIXTURE', '1'): 'amazon_reviews_page1.html',
+    ('/amazon/product-reviews/B0FIXTURE', '2'): 'amazon_reviews_page2.html',
+    ('/flipkart/cotton-kurta/product-reviews/itmfixture', '1'): 'flipkart_reviews.html',
+    ('/meesho/steel-water-bottle/p/fixture', '1'): 'meesho_product.html',
+    ('/amazon/product-reviews/B0UTF8', '1'): 'amazon_reviews_utf8.html',
+    ('/amazon/product-reviews/B0REDIRECT', '1'): 'amazon_reviews_page1.html',
+}
+# Path, page -> Location of a redirect off the allowed hosts
+OFF_HOST = 'http://example.com/amazon/product-reviews/B0FIXTURE'
+REDIRECTS = {
+    ('/redirect', '1'): OFF_HOST,
+    ('/amazon/product-reviews/B0REDIRECT', '2'): OFF_HOST,
+}
+# Served with a bare text/html Content-Type, leaving the encoding to the page's <meta charset>
+NO_CHARSET_PAGES = {'amazon_reviews_utf8.html'}
+AMAZON_URL = '/amazon/product-reviews/B0FIXTURE'
+FLIPKART_URL = '/flipkart/cotton-kurta/product-reviews/itmfixture'
+MEESHO_URL = '/meesho/steel-water-bottle/p/fixture'
+
+
+def read_fixture(name):
+    with open(os.path.join(FIXTURE_DIR, name), 'rb') as f:
+        return f.read()
+
+
+class FixtureServer(ThreadingHTTPServer):
+    # Serves the saved review pages over keep-alive HTTP/1.1 with strong ETags, and counts
+    # requests and TCP connections
+    daemon_threads = True
+
+    def __init__(self, delay=0):
+        super().__init__(('127.0.0.1', 0), FixtureHandler)
+        self.delay = delay
+        self.requests = []
+        self.connections = 0
+        self.lock = threading.Lock()
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+
+    def url(self, path):
+        return f'http://127.0.0.1:{self.server_address[1]}{path}'
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def do_GET(self):
+        parts = urlsplit(self.path)
+        query = parse_qs(parts.query)
+        page = (query.get('pageNumber') or query.get('page') or ['1'])[0]
+        with self.server.lock:
+            self.server.requests.append((self.path, self.headers.get('If-None-Match')))
+        time.sleep(self.server.delay)
+
+        if (parts.path, page) in REDIRECTS:
+            self.reply(302, headers={'Location': REDIRECTS[parts.path, page]})
+            return
+        name = PAGES.get((parts.path, page))
+        if name is None:
+            self.reply(404, b'Not found')
+            return
+        body = read_fixture(name)
+        etag = '"%s"' % hashlib.sha256(body).hexdigest()[:16]
+        if self.headers.get('If-None-Match') == etag:
+            self.reply(304, headers={'ETag': etag})
+            return
+        content_type = 'text/html' if name in NO_CHARSET_PAGES else 'text/html; charset=utf-8'
+        self.reply(200, body, {'ETag': etag, 'Content-Type': content_type})
+
+    def reply(self, status, body=b'', headers=None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        if status != 304:
+            self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if status != 304:
+            self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def raises(exception, function, *args):
+    try:
+        function(*args)
+    except exception:
+        return True
+    return False
+
+
+def fixture_fetcher(**kwargs):
+    settings = dict(allowed_hosts=['127.0.0.1'], max_pages=2, workers=4, pool_size=4, timeout=5)
+    settings.update(kwargs)
+    return ReviewFetcher(**settings)
+
+
+def test_extractors():
+    amazon = extract_reviews(read_fixture('amazon_reviews_page1.html'), 'Amazon')
+    assert len(amazon) == 4
+    assert amazon[0].startswith('The sound quality is clear')
+    # Copy-pasted reviews stay; they are a fake-review signal
+    assert amazon[1] == amazon[2]
+
+    flipkart = extract_reviews(read_fixture('flipkart_reviews.html'), 'Flipkart')
+    assert len(flipkart) == 3
+    assert not any(review.endswith('READ MORE') for review in flipkart)
+    assert flipkart[0] == 'Fabric is soft and the print did not fade after three washes. Size chart is accurate.'
+
+    meesho = extract_reviews(read_fixture('meesho_product.html'), 'Meesho')
+    assert len(meesho) == 3
+    # Without the styled markup the JSON-LD reviews give the same texts
+    assert extract_reviews(read_fixture('meesho_product.html'), 'Other') == meesho
+    print(f"Extracted {len(amazon)} Amazon, {len(flipkart)} Flipkart and {len(meesho)} Meesho reviews")
+
+
+def test_concurrent_fetch_and_keep_alive():
+    server = FixtureServer(delay=0.2)
+    fetcher = fixture_fetcher(fresh_seconds=0)
+    urls = [server.url(AMAZON_URL), server.url(FLIPKART_URL), server.url(MEESHO_URL)]
+    try:
+        start = time.perf_counter()
+        results = fetcher.fetch_many(urls)
+        seconds = time.perf_counter() - start
+        # Five pages (Flipkart's missing page 2 is skipped) fetched four at a time: two rounds
+        # of the server's delay instead of five
+        assert len(server.requests) == 5
+        assert seconds < 4 * server.delay, seconds
+        assert [len(results[url]) for url in urls] == [6, 3, 3]
+
+        for _ in range(4):
+            fetcher.fetch_many(urls)
+        print(f"First pass in {seconds:.2f}s; {len(server.requests)} requests over {server.connections} connections")
+        assert server.connections <= 4 < len(server.requests)
+    finally:
+        fetcher.close()
+        server.stop()
+
+
+def test_etag_revalidation():
+    server = FixtureServer()
+    fetcher = fixture_fetcher(max_pages=1, fresh_seconds=60)
+    url = server.url(AMAZON_URL)
+    try:
+        first = fetcher.fetch_reviews(url)
+        # Fresh: served from the cache without a request
+        assert fetcher.fetch_reviews(url) == first
+        assert len(server.requests) == 1
+
+        fetcher.fresh_seconds = 0
+        assert fetcher.fetch_reviews(url) == first
+        assert len(server.requests) == 2
+        assert server.requests[1][1] is not None
+    finally:
+        fetcher.close()
+        server.stop()
+
+
+def test_page_encoding_without_header_charset():
+    server = FixtureServer()
+    fetcher = fixture_fetcher(max_pages=1)
+    try:
+        reviews = fetcher.fetch_reviews(server.url('/amazon/product-reviews/B0UTF8'))
+        assert reviews == ['Café très bien, la cafetière garde la chaleur longtemps.',
+                           'Schöne Verarbeitung, aber der Deckel klemmt – trotzdem 4 Sterne.'], reviews
+    finally:
+        fetcher.close()
+        server.stop()
+
+
+def test_disallowed_urls():
+    server = FixtureServer()
+    fetcher = fixture_fetcher()
+    try:
+        for url in ('http://example.com/amazon/product-reviews/B0FIXTURE', 'file:///etc/passwd'):
+            assert raises(ValueError, fetcher.fetch_reviews, url), url
+        # A redirect off the allowed hosts is the site's doing: the fetch fails
+        assert raises(FetchError, fetcher.fetch_reviews, server.url('/redirect'))
+        assert raises(requests.HTTPError, fetcher.fetch_reviews, server.url('/amazon/missing'))
+    finally:
+        fetcher.close()
+        server.stop()
+
+
+def test_later_page_redirected_off_host():
+    # Page 2 redirects off the allowed hosts; it is skipped like any other failed later page
+    server = FixtureServer()
+    fetcher = fixture_fetcher()
+    try:
+        url = server.url('/amazon/product-reviews/B0REDIRECT')
+        results = fetcher.fetch_many([url])
+        assert len(results[url]) == 4, results[url]
+    finally:
+        fetcher.close()
+        server.stop()
+
+
+def test_analyze_url():
+    # Scores the fetched reviews through the app; needs the trained models
+    import app
+    server = FixtureServer()
+    app.init_worker()
+    app.review_fetcher = fixture_fetcher()
+    client = app.app.test_client()
+    try:
+        response = client.post('/analyze', json={'url': server.url(AMAZON_URL)})
+        assert response.status_code == 200, response.get_json()
+        body = response.get_json()
+        assert body['count'] == 6
+
+        response = client.post('/analyze', json={'url': server.url('/amazon/missing')})
+        assert response.status_code == 502
+        response = client.post('/analyze', json={'url': 'http://example.com/amazon'})
+        assert response.status_code == 400
+        print(f"/analyze with a url: {body['count']} reviews scored")
+    finally:
+        app.review_fetcher.close()
+        server.stop()
+
+
+if __name__ == "__main__":
+    test_extractors()
+    test_concurrent_fetch_and_keep_alive()
+    test_etag_revalidation()
+    test_page_encoding_without_header_charset()
+    test_disallowed_urls()
+    test_later_page_redirected_off_host()
+    test_analyze_url()
+    print("Review fetching works against the fixture server.")
@@ -0,0 +1,81 @@
+import string
+import time
+
+import nltk
+import pandas as pd
+from nltk.corpus import stopwords
+from nltk.stem import WordNetLemmatizer
+from nltk.tag import pos_tag
+from nltk.tokenize import word_tokenize
+
+from preprocessing import Preprocessor, preprocess_parallel
+
+# The original per-document implementation from app.py, kept here as the reference
+lemmatizer = WordNetLemmatizer()
+stop_words_english = set(stopwords.words('english'))
+
+def get_wordnet_pos(treebank_tag):
+    if treebank_tag.startswith('J'):
+        return nltk.corpus.wordnet.ADJ
+    elif treebank_tag.startswith('V'):
+        return nltk.corpus.wordnet.VERB
+    elif treebank_tag.startswith('N'):
+        return nltk.corpus.wordnet.NOUN
+    elif treebank_tag.startswith('R'):
+        return nltk.corpus.wordnet.ADV
+    else:
+        return nltk.corpus.wordnet.NOUN
+
+def reference_preprocess_text(text):
+    if not isinstance(text, str):
+        return ""
+
+    text = text.lower()
+    text = text.translate(str.maketrans('', '', string.punctuation))
+    tokens = word_tokenize(text)
+    pos_tags = pos_tag(tokens)
+
+    lemmatized_tokens = []
+    for word, tag in pos_tags:
+        if word.isalpha() and word not in stop_words_english:
+            wordnet_tag = get_wordnet_pos(tag)
+            lemma = lemmatizer.lemmatize(word, pos=wordnet_tag)
+            lemmatized_tokens.append(lemma)
+
+    return " ".join(lemmatized_tokens)
+
+def test_preprocessing_parity():
+    texts = pd.read_csv('large_dataset.csv')['review_text'].tolist()
+    # Inputs the dataset does not cover: tokenizer special cases, non-ASCII text, non-strings
+    texts += [
+        "I cannot believe it's gonna work, wanna try?",
+        "Café “quoted” review — naïve but fine…",
+        "",
+        None
+    ]
+
+    start = time.perf_counter()
+    expected = [reference_preprocess_text(text) for text in texts]
+    reference_time = time.perf_counter() - start
+
+    preprocessor = Preprocessor()
+    start = time.perf_counter()
+    batched = preprocessor.preprocess_many(texts)
+    batched_time = time.perf_counter() - start
+
+    single = [preprocessor.preprocess(text) for text in texts]
+    parallel = preprocess_parallel(texts, workers=2, chunk_size=500)
+
+    mismatches = [i for i, (a, b) in enumerate(zip(expected, batched)) if a != b]
+    print(f"Reference: {reference_time:.2f}s | Batched: {batched_time:.2f}s | Documents: {len(texts)}")
+    print(f"Lemma cache: {preprocessor.cache_info()}")
+    for i in mismatches[:10]:
+        print(f"Mismatch at {i}: {texts[i]!r} -> {expected[i]!r} vs {batched[i]!r}")
+
+    assert not mismatches
+    assert single == expected
+    assert parallel == expected
+
+if __name__ == "__main__":
+    test_preprocessing_parity()
+    print("Preprocessing output matches the reference implementation.")
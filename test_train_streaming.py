@@ -0,0 +1,41 @@
+import os
+import tempfile
+
+import pandas as pd
+
+from train_streaming import StreamingTrainer
+
+SENTIMENTS = ['positive', 'negative', 'neutral']
+
+
+def write_dataset(path, labelled_rows, unlabelled_rows):
+    rows = [(f"review {i} is {SENTIMENTS[i % 3]} about the product", SENTIMENTS[i % 3]) for i in range(labelled_rows)]
+    rows += [(f"review {i} has no sentiment label", None) for i in range(unlabelled_rows)]
+    pd.DataFrame(rows, columns=['review_text', 'sentiment']).to_csv(path, index=False)
+
+
+def test_chunk_without_training_rows():
+    # The last chunk holds only unlabelled rows, as in the bundled large_dataset.csv with
+    # --chunk-rows 1000; both passes must skip it instead of hashing an empty batch
+    with tempfile.TemporaryDirectory() as tmp:
+        data = os.path.join(tmp, 'reviews.csv')
+        write_dataset(data, 40, 10)
+        trainer = StreamingTrainer(
+            data, os.path.join(tmp, 'models'), os.path.join(tmp, 'checkpoints'), chunk_rows=10,
+            n_features=2 ** 10, epochs=1, alpha=1e-4, holdout_fraction=0.2, max_holdout=100,
+            checkpoint_every=1, seed=42
+        )
+        trainer.load_checkpoint(restart=True)
+        trainer.idf_pass()
+        trainer.train_passes()
+
+        state = trainer.state
+        assert state['n_docs'] + state['holdout_seen'] == 40
+        assert state['rows_trained'] == state['n_docs']
+        assert state['epoch'] == 1
+        print(f"{state['n_docs']} training and {state['holdout_seen']} holdout rows; empty chunk skipped")
+
+
+if __name__ == "__main__":
+    test_chunk_without_training_rows()
+    print("Streaming training skips chunks without training rows.")
@@ -0,0 +1,58 @@
+import os
+import tempfile
+
+from database import Database
+from storage import SQLiteBackend
+from write_behind import MAX_SPLIT_WRITES, WriteBehindQueue
+
+
+def make_records(n, url='https://www.amazon.in/dp/B0WRITEBEHIND'):
+    return [
+        {'review_text': f'review number {i}', 'url': url, 'svm_pred': 'Real', 'lr_pred': 'Real',
+         'final_pred': 'Real', 'accuracy': 90.0}
+        for i in range(n)
+    ]
+
+
+def test_poisoned_record_is_dropped_alone():
+    # One record the database rejects must not take the rest of its batch with it
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(pool_size=1, backend=SQLiteBackend(os.path.join(tmp, 'wb.sqlite3'), 5))
+        records = make_records(50)
+        # Not a type SQLite can bind
+        records[17]['review_text'] = {'not': 'text'}
+        writer = WriteBehindQueue(db.save_analyses, 1000, 500, 0.05, 1)
+        for record in records:
+            assert writer.submit(record)
+        writer.close(10)
+
+        stats = writer.stats()
+        print(f"write-behind: {stats}")
+        assert stats['flushed'] == 49 and stats['failed'] == 1, stats
+        rows, _ = db.get_analysis_history_page(limit=100, fields=['review_text'])
+        stored = sorted(row['review_text'] for row in rows)
+        assert stored == sorted(r['review_text'] for i, r in enumerate(records) if i != 17)
+        db.close()
+
+
+def test_failing_flush_is_bounded():
+    # During an outage every write fails; splitting stops after MAX_SPLIT_WRITES attempts
+    calls = []
+
+    def flush(records):
+        calls.append(len(records))
+        return False
+
+    writer = WriteBehindQueue(flush, 1000, 500, 0.05, 1)
+    for record in make_records(500):
+        writer.submit(record)
+    writer.close(10)
+    stats = writer.stats()
+    assert stats['failed'] == 500 and stats['flushed'] == 0, stats
+    assert len(calls) <= 2 * MAX_SPLIT_WRITES * stats['batches'], (len(calls), stats)
+
+
+if __name__ == "__main__":
+    test_poisoned_record_is_dropped_alone()
+    test_failing_flush_is_bounded()
+    print("Write-behind drops only the records the database rejects.")
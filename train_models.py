@@ -1,92 +1,203 @@
-import pandas as pd
-import numpy as np
-from sklearn.model_selection import train_test_split
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.svm import SVC
+import argparse
+import multiprocessing
+import os
+import resource
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import joblib
 from sklearn.linear_model import LogisticRegression
-from models.lstm_model import LSTMModel
 from sklearn.metrics import classification_report
-import joblib
-import os
+
+from compact_model import export_compact
+from ensemble import export as export_ensemble
+from feature_cache import FEATURE_CACHE_DIR, featurize, load_dataset, load_feature_set, split_dataset
+from lstm_serving import export_numpy
+from svm_engines import SVM_ENGINES, build_svm
+
+MODELS = ('svm', 'lr', 'lstm')
+
+
+def reset_peak_rss():
+    # Starts a new peak for this process (Linux: writing 5 to clear_refs resets VmHWM to the
+    # current RSS). False where that is not possible; ru_maxrss never resets, and a child process
+    # inherits its parent's, so it cannot tell one stage's peak from an earlier one's.
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def peak_rss_mb():
+    # Peak since the last reset_peak_rss(), from VmHWM; otherwise the process's lifetime peak
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 2 ** 10
+    except OSError:
+        pass
+    # ru_maxrss is kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (2 ** 20 if sys.platform == 'darwin' else 2 ** 10)
+
+
+def stage_peak_rss_mb(was_reset):
+    # None when the peak would include memory used before the stage started
+    return peak_rss_mb() if was_reset else None
+
+
+def run_stage(name, task, *args):
+    was_reset = reset_peak_rss()
+    started = time.perf_counter()
+    result = {'stage': name, 'status': 'ok', 'report': None, 'error': None}
+    try:
+        result['report'] = task(*args)
+    except Exception as e:
+        result['status'] = 'failed'
+        result['error'] = ''.join(traceback.format_exception(type(e), e, e.__traceback__))
+    result['seconds'] = time.perf_counter() - started
+    result['peak_rss_mb'] = stage_peak_rss_mb(was_reset)
+    return result
+
+
+# --- Training tasks, one per model; each reopens the cached TF-IDF matrices itself ---
+
+def train_svm(features_path, model_dir, engine):
+    features = load_feature_set(features_path)
+    svm = build_svm(engine)
+    svm.fit(features.X_train, features.y_train)
+    joblib.dump(svm, os.path.join(model_dir, 'svm_model.pkl'))
+    return classification_report(features.y_test, svm.predict(features.X_test))
+
+
+def train_lr(features_path, model_dir):
+    features = load_feature_set(features_path)
+    lr = LogisticRegression(max_iter=1000)
+    lr.fit(features.X_train, features.y_train)
+    joblib.dump(lr, os.path.join(model_dir, 'logistic_regression_model.pkl'))
+    return classification_report(features.y_test, lr.predict(features.X_test))
+
+
+def train_lstm(data_path, model_dir, test_size, random_state):
+    # Imported here: TensorFlow is heavy and only this stage needs it
+    from models.lstm_model import LSTMModel
+    X, y = load_dataset(data_path)
+    X_train, X_test, y_train, y_test = split_dataset(X, y, test_size, random_state)
+    X_train_text, X_val, y_train_text, y_val = split_dataset(X_train, y_train, 0.2, random_state)
+
+    lstm_model = LSTMModel()
+    lstm_model.train(
+        X_train_text.tolist(),
+        y_train_text,
+        X_val.tolist(),
+        y_val,
+        epochs=5,
+        batch_size=32
+    )
+    lstm_classes, lstm_confidence = lstm_model.predict(X_test.tolist())
+    lstm_model.save(os.path.join(model_dir, 'lstm_model'), os.path.join(model_dir, 'lstm_tokenizer.json'))
+    try:
+        print(f"NumPy LSTM written to {export_numpy(model_dir, lstm_model)}")
+    except ValueError as e:
+        # Serving falls back to the framework model (LSTM_ENGINE=auto)
+        print(f"NumPy LSTM not exported: {e}")
+    return classification_report(y_test, lstm_classes)
+
+
+def print_stages(stages, total_seconds):
+    print(f"\n{'stage':<20} {'status':>8} {'seconds':>9} {'peak RSS MB':>12}")
+    for s in stages:
+        peak = f"{s['peak_rss_mb']:>12.0f}" if s['peak_rss_mb'] is not None else f"{'n/a':>12}"
+        print(f"{s['stage']:<20} {s['status']:>8} {s['seconds']:>9.2f} {peak}")
+    print(f"{'total (wall clock)':<20} {'':>8} {total_seconds:>9.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Train the TF-IDF, SVM, Logistic Regression and LSTM models')
+    parser.add_argument('--data', default='large_dataset.csv')
+    parser.add_argument('--model-dir', default='models')
+    parser.add_argument('--svm-engine', choices=SVM_ENGINES, default='liblinear',
+                        help='liblinear/sgd: linear SVM plus a sigmoid calibration step; '
+                             'libsvm: the original SVC(kernel=linear, probability=True)')
+    parser.add_argument('--max-features', type=int, default=5000, help='TF-IDF vocabulary size')
+    parser.add_argument('--models', default=','.join(MODELS), help='Comma-separated subset of svm,lr,lstm')
+    parser.add_argument('--workers', type=int, default=len(MODELS), help='Models trained at the same time')
+    parser.add_argument('--feature-cache-dir', default=FEATURE_CACHE_DIR)
+    parser.add_argument('--refit-features', action='store_true', help='Refit the vectorizer even when cached')
+    args = parser.parse_args()
+
+    selected = args.models.split(',')
+    unknown = set(selected) - set(MODELS)
+    if unknown:
+        parser.error(f"unknown models: {', '.join(sorted(unknown))}")
+    test_size, random_state = 0.2, 42
+
+    started = time.perf_counter()
+    os.makedirs(args.model_dir, exist_ok=True)
+    stages = []
+
+    # 1. TF-IDF features, fitted once per dataset and vectorizer settings
+    print("Featurizing dataset...")
+    was_reset = reset_peak_rss()
+    stage_started = time.perf_counter()
+    features = featurize(args.data, {'max_features': args.max_features}, test_size, random_state,
+                         args.feature_cache_dir, refresh=args.refit_features)
+    joblib.dump(features.vectorizer, os.path.join(args.model_dir, 'tfidf_vectorizer.pkl'))
+    print(f"TF-IDF features {'loaded from' if features.cached else 'fitted and cached in'} {features.path}")
+    stages.append({
+        'stage': 'featurize (cached)' if features.cached else 'featurize',
+        'status': 'ok',
+        'seconds': time.perf_counter() - stage_started,
+        'peak_rss_mb': stage_peak_rss_mb(was_reset)
+    })
+
+    # 2. The models are independent, so each trains in its own process
+    tasks = {
+        'svm': (train_svm, features.path, args.model_dir, args.svm_engine),
+        'lr': (train_lr, features.path, args.model_dir),
+        'lstm': (train_lstm, args.data, args.model_dir, test_size, random_state)
+    }
+    print(f"\nTraining {', '.join(selected)} in parallel...")
+    # spawn: forked children would inherit the parent's BLAS threads and TensorFlow must not
+    # be initialized across a fork
+    context = multiprocessing.get_context('spawn')
+    # A fresh process per stage returns each model's memory as soon as it is saved;
+    # max_tasks_per_child needs Python 3.11, older versions reuse the workers
+    recycle = {'max_tasks_per_child': 1} if sys.version_info >= (3, 11) else {}
+    with ProcessPoolExecutor(max_workers=max(1, min(args.workers, len(selected))), mp_context=context,
+                             **recycle) as pool:
+        futures = [pool.submit(run_stage, name, *tasks[name]) for name in selected]
+        for future in as_completed(futures):
+            result = future.result()
+            stages.append(result)
+            if result['status'] == 'ok':
+                print(f"\n{result['stage']} trained in {result['seconds']:.2f}s. Classification report:")
+                print(result['report'])
+            else:
+                print(f"\n{result['stage']} failed:\n{result['error']}")
+
+    # 3. Fused SVM + LR scorer for app.py, checked against both saved models on the test split,
+    # and the compact memory-mapped copy app.py prefers
+    trained = {s['stage'] for s in stages if s['status'] == 'ok'}
+    if {'svm', 'lr'} <= trained:
+        print("\nExporting ensemble scorer...")
+        was_reset = reset_peak_rss()
+        stage_started = time.perf_counter()
+        scorer, _ = export_ensemble(args.model_dir, features=features.X_test)
+        print(f"Compact models written to {export_compact(args.model_dir, vectorizer=features.vectorizer, scorer=scorer)}")
+        stages.append({'stage': 'ensemble export', 'status': 'ok',
+                       'seconds': time.perf_counter() - stage_started, 'peak_rss_mb': stage_peak_rss_mb(was_reset)})
+
+    print_stages(stages, time.perf_counter() - started)
+    if any(s['status'] != 'ok' for s in stages):
+        raise SystemExit(1)
+    print("\nAll models have been trained and saved successfully!")
 
 
-# Create models directory if it doesn't exist
-if not os.path.exists('models'):
-    os.makedirs('models')
-
-# Load the dataset
-print("Loading dataset...")
-df = pd.read_csv('large_dataset.csv')
-
-# Using the correct column names from the dataset
-X = df['review_text'].values
-y = df['sentiment'].values
-
-# Convert sentiment labels to numeric
-label_mapping = {'negative': 0, 'neutral': 1, 'positive': 2}
-y_numeric = np.array([label_mapping[label] for label in y])
-
-# Split the data
-X_train, X_test, y_train, y_test = train_test_split(X, y_numeric, test_size=0.2, random_state=42)
-X_train_text, X_val, y_train_text, y_val = train_test_split(X_train, y_train, test_size=0.2, random_state=42)
-
-# Convert numpy arrays to lists for LSTM
-print("\nPreparing data for LSTM...")
-X_train_text = X_train_text.tolist()
-X_val = X_val.tolist()
-X_test = X_test.tolist()
-
-# 1. Train TF-IDF Vectorizer
-print("\nTraining TF-IDF Vectorizer...")
-tfidf = TfidfVectorizer(max_features=5000)
-X_train_tfidf = tfidf.fit_transform(X_train)
-X_test_tfidf = tfidf.transform(X_test)
-
-# Save the vectorizer
-joblib.dump(tfidf, 'models/tfidf_vectorizer.pkl')
-print("TF-IDF Vectorizer saved.")
-
-# 2. Train SVM with probability estimates
-print("\nTraining SVM model...")
-svm = SVC(kernel='linear', probability=True)
-svm.fit(X_train_tfidf, y_train)
-svm_pred = svm.predict(X_test_tfidf)
-svm_proba = svm.predict_proba(X_test_tfidf)
-print("\nSVM Classification Report:")
-print(classification_report(y_test, svm_pred))
-joblib.dump(svm, 'models/svm_model.pkl')
-print("SVM model saved.")
-
-# 3. Train Logistic Regression
-print("\nTraining Logistic Regression model...")
-lr = LogisticRegression(max_iter=1000)
-lr.fit(X_train_tfidf, y_train)
-lr_pred = lr.predict(X_test_tfidf)
-lr_proba = lr.predict_proba(X_test_tfidf)
-print("\nLogistic Regression Classification Report:")
-print(classification_report(y_test, lr_pred))
-joblib.dump(lr, 'models/logistic_regression_model.pkl')
-print("Logistic Regression model saved.")
-
-# 4. Train LSTM Model
-print("\nTraining LSTM model...")
-lstm_model = LSTMModel()
-history = lstm_model.train(
-    X_train_text, 
-    y_train_text,
-    X_val,
-    y_val,
-    epochs=5,
-    batch_size=32
-)
-
-# Evaluate LSTM
-lstm_classes, lstm_confidence = lstm_model.predict(X_test)
-print("\nLSTM Classification Report:")
-print(classification_report(y_test, lstm_classes))
-
-# Save LSTM model
-lstm_model.save('models/lstm_model', 'models/lstm_tokenizer.json')
-print("LSTM model saved.")
-
-print("\nAll models have been trained and saved successfully!") 
\ No newline at end of file
+if __name__ == '__main__':
+    main()
\ No newline at end of file
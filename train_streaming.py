@@ -0,0 +1,318 @@
+import argparse
+import hashlib
+import json
+import os
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.calibration import CalibratedClassifierCV
+from sklearn.feature_extraction.text import HashingVectorizer, TfidfTransformer
+from sklearn.linear_model import SGDClassifier
+from sklearn.metrics import classification_report
+from sklearn.pipeline import make_pipeline
+
+from compact_model import export_compact
+from ensemble import export as export_ensemble
+
+LABEL_MAPPING = {'negative': 0, 'neutral': 1, 'positive': 2}
+CLASSES = np.array(sorted(LABEL_MAPPING.values()))
+CHECKPOINT_FILE = 'checkpoint.joblib'
+
+
+def iter_chunks(path, chunk_rows):
+    # Yields DataFrames of at most chunk_rows rows; only the two columns training needs are read
+    columns = ['review_text', 'sentiment']
+    if path.endswith('.parquet'):
+        # Imported here: Parquet input is optional
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_rows, columns=columns):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, usecols=columns, chunksize=chunk_rows)
+
+
+def labelled(chunk):
+    # Vectorized label mapping; rows with a missing or unknown sentiment are dropped
+    labels = chunk['sentiment'].map(LABEL_MAPPING)
+    keep = labels.notna().to_numpy()
+    texts = chunk['review_text'].fillna('').astype(str).to_numpy()[keep]
+    return texts, labels.to_numpy()[keep].astype(np.int64)
+
+
+def data_fingerprint(path):
+    stat = os.stat(path)
+    return {'path': os.path.abspath(path), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+class StreamingTrainer:
+    # Trains the vectorizer, SVM and LR without ever holding the dataset in memory:
+    #   1. idf pass: hash every chunk, count document frequencies, reservoir-sample the holdout
+    #   2. train passes: TF-IDF each chunk and partial_fit both SGD models, for N epochs
+    #   3. calibrate the SVM and evaluate both models on the holdout
+    # Memory is bounded by chunk_rows, n_features and max_holdout. State is checkpointed every
+    # few chunks so an interrupted run resumes where it stopped.
+
+    def __init__(self, data, model_dir, checkpoint_dir, chunk_rows, n_features, epochs, alpha,
+                 holdout_fraction, max_holdout, checkpoint_every, seed):
+        self.data = data
+        self.model_dir = model_dir
+        self.checkpoint_dir = checkpoint_dir
+        self.chunk_rows = chunk_rows
+        self.n_features = n_features
+        self.epochs = epochs
+        self.alpha = alpha
+        self.holdout_fraction = holdout_fraction
+        self.max_holdout = max_holdout
+        self.checkpoint_every = checkpoint_every
+        self.seed = seed
+        self.hasher = HashingVectorizer(n_features=n_features, alternate_sign=False, norm=None)
+        self.state = None
+
+    # --- Checkpoints ---
+
+    def fingerprint(self):
+        # Anything that changes which rows land in which chunk or split invalidates a checkpoint.
+        # epochs is left out so a finished run can be extended with more passes.
+        settings = {
+            'data': data_fingerprint(self.data),
+            'chunk_rows': self.chunk_rows,
+            'n_features': self.n_features,
+            'alpha': self.alpha,
+            'holdout_fraction': self.holdout_fraction,
+            'max_holdout': self.max_holdout,
+            'seed': self.seed
+        }
+        return hashlib.sha256(json.dumps(settings, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+
+    def new_state(self):
+        return {
+            'fingerprint': self.fingerprint(),
+            'stage': 'idf',
+            'epoch': 0,
+            # Chunks of the current pass already processed
+            'chunk': 0,
+            'n_docs': 0,
+            'doc_freq': np.zeros(self.n_features, dtype=np.int64),
+            'holdout_texts': [],
+            'holdout_labels': [],
+            'holdout_seen': 0,
+            'rows_trained': 0,
+            'svm': SGDClassifier(loss='hinge', alpha=self.alpha, random_state=self.seed),
+            'lr': SGDClassifier(loss='log_loss', alpha=self.alpha, random_state=self.seed)
+        }
+
+    @property
+    def checkpoint_path(self):
+        return os.path.join(self.checkpoint_dir, CHECKPOINT_FILE)
+
+    def load_checkpoint(self, restart):
+        if restart or not os.path.exists(self.checkpoint_path):
+            self.state = self.new_state()
+            return
+        state = joblib.load(self.checkpoint_path)
+        if state['fingerprint'] != self.fingerprint():
+            raise SystemExit(f"{self.checkpoint_path} belongs to a different dataset or settings; "
+                             "pass --restart to discard it")
+        self.state = state
+        print(f"Resuming from checkpoint: stage={state['stage']} epoch={state['epoch']} chunk={state['chunk']}")
+
+    def save_checkpoint(self):
+        os.makedirs(self.checkpoint_dir, exist_ok=True)
+        # Atomic replace: a kill during the dump leaves the previous checkpoint intact
+        tmp_path = f'{self.checkpoint_path}.tmp'
+        joblib.dump(self.state, tmp_path)
+        os.replace(tmp_path, self.checkpoint_path)
+
+    # --- Passes ---
+
+    def chunks(self):
+        # Skips what the checkpoint already covers; chunk boundaries are stable for a fingerprint
+        for index, chunk in enumerate(iter_chunks(self.data, self.chunk_rows)):
+            if index < self.state['chunk']:
+                continue
+            texts, labels = labelled(chunk)
+            yield index, texts, labels
+            self.state['chunk'] = index + 1
+            if self.state['chunk'] % self.checkpoint_every == 0:
+                self.save_checkpoint()
+
+    def holdout_mask(self, index, n):
+        # Seeded per chunk, so every pass and every resumed run draws the same split
+        rng = np.random.default_rng([self.seed, index])
+        return rng.random(n) < self.holdout_fraction
+
+    def idf_pass(self):
+        print("\nPass 1: document frequencies and holdout sample...")
+        state = self.state
+        started, rows = time.perf_counter(), 0
+        for index, texts, labels in self.chunks():
+            rows += len(texts)
+            holdout = self.holdout_mask(index, len(texts))
+            self.sample_holdout(index, texts[holdout], labels[holdout])
+            # A chunk of unlabelled or holdout rows only: HashingVectorizer rejects empty input
+            if holdout.all():
+                continue
+            counts = self.hasher.transform(texts[~holdout])
+            state['doc_freq'] += np.bincount(counts.indices, minlength=self.n_features)
+            state['n_docs'] += counts.shape[0]
+            self.report(index, rows, started)
+        state['stage'] = 'train'
+        state['chunk'] = 0
+        self.save_checkpoint()
+
+    def sample_holdout(self, index, texts, labels):
+        # Reservoir sample (algorithm R): a uniform holdout of at most max_holdout rows
+        state = self.state
+        rng = np.random.default_rng([self.seed, index, 1])
+        for text, label in zip(texts, labels):
+            state['holdout_seen'] += 1
+            if len(state['holdout_texts']) < self.max_holdout:
+                state['holdout_texts'].append(text)
+                state['holdout_labels'].append(label)
+                continue
+            slot = rng.integers(state['holdout_seen'])
+            if slot < self.max_holdout:
+                state['holdout_texts'][slot] = text
+                state['holdout_labels'][slot] = label
+
+    def vectorizer(self):
+        # Same smoothed idf as TfidfVectorizer's defaults, over the hashed feature space
+        tfidf = TfidfTransformer()
+        tfidf.idf_ = np.log((1 + self.state['n_docs']) / (1 + self.state['doc_freq'])) + 1
+        tfidf.n_features_in_ = self.n_features
+        return make_pipeline(self.hasher, tfidf)
+
+    def train_passes(self):
+        state = self.state
+        vectorizer = self.vectorizer()
+        while state['epoch'] < self.epochs:
+            print(f"\nPass {state['epoch'] + 2}: training epoch {state['epoch'] + 1}/{self.epochs}...")
+            started, rows = time.perf_counter(), 0
+            for index, texts, labels in self.chunks():
+                rows += len(texts)
+                train = ~self.holdout_mask(index, len(texts))
+                if not train.any():
+                    continue
+                features = vectorizer.transform(texts[train])
+                labels = labels[train]
+                # SGD wants shuffled rows; the order is seeded by epoch and chunk
+                order = np.random.default_rng([self.seed, index, 2, state['epoch']]).permutation(len(labels))
+                state['svm'].partial_fit(features[order], labels[order], classes=CLASSES)
+                state['lr'].partial_fit(features[order], labels[order], classes=CLASSES)
+                state['rows_trained'] += len(labels)
+                self.report(index, rows, started)
+            state['epoch'] += 1
+            state['chunk'] = 0
+            self.save_checkpoint()
+        return vectorizer
+
+    def report(self, index, rows, started):
+        # rows counts what this run has read in the current pass, so resumed passes report honestly
+        if (index + 1) % self.checkpoint_every == 0:
+            elapsed = time.perf_counter() - started
+            print(f"  chunk {index + 1}: {rows} rows read ({rows / max(elapsed, 1e-9):.0f} rows/s)")
+
+    # --- Finish ---
+
+    def finish(self, vectorizer):
+        texts = np.array(self.state['holdout_texts'], dtype=object)
+        labels = np.array(self.state['holdout_labels'], dtype=np.int64)
+        if len(texts) < 2:
+            raise SystemExit("Holdout sample is too small to calibrate and evaluate; raise --holdout-fraction")
+        # Half the holdout fits the SVM's sigmoid calibration, the other half scores both models
+        order = np.random.default_rng([self.seed, 3]).permutation(len(texts))
+        calibration, test = order[:len(order) // 2], order[len(order) // 2:]
+
+        svm = CalibratedClassifierCV(self.state['svm'], method='sigmoid', cv='prefit')
+        svm.fit(vectorizer.transform(texts[calibration]), labels[calibration])
+        lr = self.state['lr']
+
+        test_features = vectorizer.transform(texts[test])
+        print("\nSVM Classification Report:")
+        print(classification_report(labels[test], svm.predict(test_features), zero_division=0))
+        print("Logistic Regression (SGD) Classification Report:")
+        print(classification_report(labels[test], lr.predict(test_features), zero_division=0))
+
+        os.makedirs(self.model_dir, exist_ok=True)
+        joblib.dump(vectorizer, os.path.join(self.model_dir, 'tfidf_vectorizer.pkl'))
+        joblib.dump(svm, os.path.join(self.model_dir, 'svm_model.pkl'))
+        joblib.dump(lr, os.path.join(self.model_dir, 'logistic_regression_model.pkl'))
+        print(f"Models saved to {self.model_dir}")
+        scorer, _ = export_ensemble(self.model_dir, texts[test].tolist())
+        print(f"Compact models written to {export_compact(self.model_dir, vectorizer=vectorizer, scorer=scorer)}")
+
+    def run(self, restart=False):
+        self.load_checkpoint(restart)
+        print(f"Estimated working memory, on top of the interpreter and libraries: {self.memory_estimate_mb():.0f} MB")
+        if self.state['stage'] == 'idf':
+            self.idf_pass()
+        vectorizer = self.train_passes()
+        self.finish(vectorizer)
+
+    def memory_estimate_mb(self):
+        bytes_per_row = estimate_bytes_per_row(self.data, self.hasher)
+        return (fixed_bytes(self.n_features) + (self.chunk_rows + self.max_holdout) * bytes_per_row) / 2 ** 20
+
+
+def fixed_bytes(n_features):
+    # Memory that does not depend on the chunk size: document frequencies, both models' weights,
+    # and the dense copies the fused scorer export makes of them
+    return n_features * 8 * (1 + 4 * len(CLASSES))
+
+
+def estimate_bytes_per_row(path, hasher, sample_rows=1000):
+    # A raw text plus its sparse row held about three times over (hashed, TF-IDF, shuffled copy)
+    texts, _ = labelled(next(iter_chunks(path, sample_rows)))
+    if len(texts) == 0:
+        return 1
+    nnz = hasher.transform(texts).nnz / len(texts)
+    text_bytes = sum(len(text.encode('utf-8')) + 50 for text in texts) / len(texts)
+    return int(text_bytes + 3 * 12 * nnz)
+
+
+def chunk_rows_for_budget(path, hasher, n_features, max_holdout, memory_mb):
+    bytes_per_row = estimate_bytes_per_row(path, hasher)
+    available = memory_mb * 2 ** 20 - fixed_bytes(n_features) - max_holdout * bytes_per_row
+    if available < 1000 * bytes_per_row:
+        raise SystemExit(f"--memory-mb {memory_mb} is too small for --n-features and --max-holdout")
+    return int(available // bytes_per_row)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Out-of-core training of the TF-IDF, SVM and LR models')
+    parser.add_argument('--data', default='large_dataset.csv', help='CSV or .parquet with review_text and sentiment')
+    parser.add_argument('--model-dir', default='models')
+    parser.add_argument('--checkpoint-dir', default='checkpoints/streaming')
+    parser.add_argument('--chunk-rows', type=int, default=50000)
+    parser.add_argument('--memory-mb', type=int,
+                        help='Cap the chunk size so the estimated peak memory stays under this budget')
+    parser.add_argument('--n-features', type=int, default=2 ** 18, help='Hashed feature space size')
+    parser.add_argument('--epochs', type=int, default=5)
+    parser.add_argument('--alpha', type=float, default=1e-5, help='SGD regularization strength')
+    parser.add_argument('--holdout-fraction', type=float, default=0.2)
+    parser.add_argument('--max-holdout', type=int, default=50000, help='Holdout rows kept in memory at most')
+    parser.add_argument('--checkpoint-every', type=int, default=10, help='Chunks between checkpoints')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--restart', action='store_true', help='Ignore an existing checkpoint')
+    args = parser.parse_args()
+
+    chunk_rows = args.chunk_rows
+    if args.memory_mb:
+        hasher = HashingVectorizer(n_features=args.n_features, alternate_sign=False, norm=None)
+        budget_rows = chunk_rows_for_budget(args.data, hasher, args.n_features, args.max_holdout, args.memory_mb)
+        chunk_rows = min(chunk_rows, budget_rows)
+        print(f"Chunk size {chunk_rows} rows for a {args.memory_mb} MB budget")
+
+    trainer = StreamingTrainer(
+        args.data, args.model_dir, args.checkpoint_dir, chunk_rows, args.n_features, args.epochs,
+        args.alpha, args.holdout_fraction, args.max_holdout, args.checkpoint_every, args.seed
+    )
+    started = time.perf_counter()
+    trainer.run(restart=args.restart)
+    print(f"\nStreaming training finished in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
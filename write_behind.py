@@ -0,0 +1,124 @@
+import logging
+import queue
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Writes spent at most on one failed batch while splitting it to isolate the rejected records;
+# one bad record in a batch of 500 takes about 2 * log2(500) = 18
+MAX_SPLIT_WRITES = 40
+
+
+class WriteBehindQueue:
+    # Takes analysis records off the request path: handlers enqueue them and a background
+    # thread hands them to flush() in batches, on a size or time trigger
+
+    def __init__(self, flush, max_queue, batch_size, flush_interval, put_timeout):
+        self._flush = flush
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+
+        self.enqueued = 0
+        self.rejected = 0
+        self.flushed = 0
+        self.failed = 0
+        self.batches = 0
+
+        self._thread = threading.Thread(target=self._run, name='write-behind', daemon=True)
+        self._thread.start()
+
+    def submit(self, record):
+        # Blocks for at most put_timeout when the queue is full; False tells the caller
+        # to write the record itself
+        if self._stopping.is_set():
+            return False
+        try:
+            self._queue.put(record, timeout=self.put_timeout)
+        except queue.Full:
+            with self._lock:
+                self.rejected += 1
+            return False
+        with self._lock:
+            self.enqueued += 1
+        return True
+
+    def _run(self):
+        while not (self._stopping.is_set() and self._queue.empty()):
+            batch = self._next_batch()
+            if batch:
+                self._write(batch)
+
+    def _next_batch(self):
+        try:
+            batch = [self._queue.get(timeout=self.flush_interval)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or self._stopping.is_set():
+                # Drain without waiting once the deadline passes or shutdown starts
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+                continue
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch):
+        # A batch is one transaction of unrelated requests' records, so a failed one is split in
+        # halves and retried: a record the database rejects is dropped alone. The splits stop
+        # after MAX_SPLIT_WRITES attempts, so an outage costs a bounded number of writes per batch.
+        parts = [batch]
+        attempts = flushed = failed = 0
+        while parts:
+            part = parts.pop()
+            attempts += 1
+            if self._try_flush(part):
+                flushed += len(part)
+            elif len(part) == 1 or attempts >= MAX_SPLIT_WRITES:
+                failed += len(part)
+            else:
+                middle = len(part) // 2
+                # First half on top, so records are still written in submission order
+                parts += [part[middle:], part[:middle]]
+        if failed:
+            logger.error("Write-behind dropped %d of %d records after %d writes", failed, len(batch), attempts)
+        with self._lock:
+            self.batches += 1
+            self.flushed += flushed
+            self.failed += failed
+
+    def _try_flush(self, records):
+        try:
+            return self._flush(records)
+        except Exception as e:
+            logger.error("Error in write-behind flush: %s", e)
+            return False
+
+    def close(self, timeout=None):
+        # Stops accepting records and waits for everything already queued to be written
+        self._stopping.set()
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            logger.warning("Write-behind queue still had %d records at shutdown", self._queue.qsize())
+
+    def stats(self):
+        with self._lock:
+            return {
+                'queued': self._queue.qsize(),
+                'enqueued': self.enqueued,
+                'rejected': self.rejected,
+                'flushed': self.flushed,
+                'failed': self.failed,
+                'batches': self.batches
+            }